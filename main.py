@@ -17,10 +17,7 @@ import webbrowser
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.chess_analyzer import XiangqiAnalyzer
-from src.stream_processor import RTMPStreamProcessor, EmulatorCapture, create_screen_capture
-from src.tunnel_service import TunnelManager, create_ngrok_tunnel, create_frp_tunnel
-from web.app import app, socketio, init_app
+# 分析器、流处理、内网穿透和Web模块在实际使用时才导入，缩短启动时间
 
 # 配置日志
 logging.basicConfig(
@@ -50,7 +47,7 @@ class XiangqiAnalyzerService:
         self.stream_processor = None
         self.emulator_capture = None
         self.capture_thread = None
-        self.analysis_thread = None
+        self.pipeline = None  # 检测 -> 引擎 分级流水线
         self.running = False
         self.latest_result = None
         
@@ -63,6 +60,10 @@ class XiangqiAnalyzerService:
             'source_value': '',
             'think_time': 2000,
             'analysis_interval': 3,
+            'stream_backend': 'opencv',
+            'stream_size': None,
+            'stream_process': False,
+            'screen_auto_roi': True,
             'enable_tunnel': False,
             'tunnel_type': 'ngrok',
             'tunnel_config': {}
@@ -100,6 +101,8 @@ class XiangqiAnalyzerService:
     
     def initialize_analyzer(self) -> bool:
         """初始化分析器"""
+        from src.chess_analyzer import XiangqiAnalyzer
+        
         try:
             if not self.config['engine_path']:
                 logger.error("未配置Pikafish引擎路径")
@@ -122,36 +125,93 @@ class XiangqiAnalyzerService:
             logger.error(f"初始化分析器失败: {e}")
             return False
     
+    def analyze_video(self, video_path: str, output_path: str = None, sample_interval: float = 1.0,
+                      workers: int = None) -> bool:
+        """
+        离线分析录像文件：并行解码检测，输出局面/着法序列和每个局面的引擎分析
+
+        Args:
+            video_path: 视频文件路径
+            output_path: 结果JSON路径（默认与视频同名的 .json）
+            sample_interval: 采样间隔（秒）
+            workers: 工作进程数（默认CPU核心数）
+        """
+        import json
+        from src.video_analysis import VideoAnalyzer
+        
+        try:
+            video_analyzer = VideoAnalyzer(
+                pose_model_path=self.config['pose_model_path'],
+                classifier_model_path=self.config['classifier_model_path'],
+                engine_path=self.config['engine_path'],
+                workers=workers
+            )
+            result = video_analyzer.analyze(video_path, sample_interval=sample_interval,
+                                            think_time=self.config['think_time'])
+            
+            output_path = output_path or str(Path(video_path).with_suffix('.json'))
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            
+            logger.info(f"着法: {' '.join(move or '?' for move in result['moves'])}")
+            logger.info(f"分析结果已保存: {output_path}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"视频分析失败: {e}")
+            return False
+    
     def start_capture(self) -> bool:
         """启动捕获"""
+        from src.stream_processor import EmulatorCapture, create_screen_capture, create_stream_processor
+        from src.pipeline import StagedPipeline
+        
         try:
             if self.config['source_type'] == 'stream':
                 if not self.config['source_value']:
                     logger.error("未配置流地址")
                     return False
                 
-                self.stream_processor = RTMPStreamProcessor(self.config['source_value'])
+                # 每个分析周期只解码一帧
+                interval = self.config['analysis_interval']
+                separate_process = self.config.get('stream_process', False)
+                if self.config.get('stream_backend') == 'ffmpeg':
+                    size = self.config.get('stream_size')
+                    self.stream_processor = create_stream_processor(
+                        self.config['source_value'], backend='ffmpeg',
+                        separate_process=separate_process,
+                        output_size=tuple(size) if size else None,
+                        output_fps=1 / interval
+                    )
+                else:
+                    self.stream_processor = create_stream_processor(
+                        self.config['source_value'], separate_process=separate_process,
+                        sample_interval=interval
+                    )
                 if not self.stream_processor.start():
                     return False
             
             elif self.config['source_type'] == 'emulator':
-                from core.stream_processor import EmulatorCapture
                 emulator_name = self.config.get('source_value', 'MuMu')
                 self.emulator_capture = EmulatorCapture(emulator_name)
             
             elif self.config['source_type'] == 'screen':
-                self.screen_capture = create_screen_capture()
+                self.screen_capture = create_screen_capture(self.config.get('screen_auto_roi', True))
             
             self.running = True
             
+            # 启动检测、引擎流水线：下一帧的检测与上一帧的引擎搜索重叠执行，
+            # 级间队列只保留最新一项，跟不上时丢弃旧帧
+            self.pipeline = StagedPipeline(
+                [('detect', self._detect_stage), ('engine', self._engine_stage)],
+                queue_size=1, on_result=self._on_result
+            )
+            self.pipeline.start()
+            
             # 启动捕获线程
             self.capture_thread = Thread(target=self._capture_loop, daemon=True)
             self.capture_thread.start()
             
-            # 启动分析线程
-            self.analysis_thread = Thread(target=self._analysis_loop, daemon=True)
-            self.analysis_thread.start()
-            
             logger.info("✅ 捕获已启动")
             return True
             
@@ -170,19 +230,25 @@ class XiangqiAnalyzerService:
         if self.capture_thread:
             self.capture_thread.join(timeout=2)
         
-        if self.analysis_thread:
-            self.analysis_thread.join(timeout=2)
+        if self.pipeline:
+            self.pipeline.stop()
         
         logger.info("✅ 捕获已停止")
     
     def _capture_loop(self):
-        """捕获循环"""
+        """捕获循环：按分析间隔取帧，提交给检测、引擎流水线"""
+        last_stream_seq = 0
+        
         while self.running:
             try:
                 frame = None
+                captured_at = time.time()
                 
                 if self.config['source_type'] == 'stream' and self.stream_processor:
-                    frame = self.stream_processor.get_latest_frame()
+                    frame, seq, captured_at = self.stream_processor.get_latest()
+                    if seq == last_stream_seq:
+                        frame = None
+                    last_stream_seq = seq
                 
                 elif self.config['source_type'] == 'emulator' and self.emulator_capture:
                     frame = self.emulator_capture.capture()
@@ -200,13 +266,9 @@ class XiangqiAnalyzerService:
                     else:
                         frame = self.screen_capture.capture_window()
                 
-                # 处理捕获的帧
-                if frame is not None and self.analyzer:
-                    result = self.analyzer.analyze_image(frame, self.config['think_time'])
-                    
-                    if result:
-                        self.latest_result = result
-                        logger.info(f"分析完成 - 最佳走法: {result['best_move']}")
+                # 提交给流水线，不等待分析完成
+                if frame is not None and self.pipeline:
+                    self.pipeline.submit(frame, captured_at)
                 
                 time.sleep(self.config['analysis_interval'])
                 
@@ -214,14 +276,27 @@ class XiangqiAnalyzerService:
                 logger.error(f"捕获循环出错: {e}")
                 time.sleep(1)
     
-    def _analysis_loop(self):
-        """分析循环"""
-        # 这个循环可以与捕获循环合并
-        # 这里保留用于扩展功能
-        pass
+    def _detect_stage(self, frame):
+        """流水线检测级：返回平滑后提交的检测结果"""
+        if not self.analyzer:
+            return None
+        return self.analyzer.detect_frame(frame)
+    
+    def _engine_stage(self, detect_result):
+        """流水线引擎级：布局变化时启动引擎搜索"""
+        return self.analyzer.evaluate_frame(detect_result, self.config['think_time'])
+    
+    def _on_result(self, result: dict, captured_at: float):
+        """流水线产出结果"""
+        # 采集到出结果的端到端延迟
+        self.latest_result = dict(result, capture_latency=round(time.time() - captured_at, 3))
+        logger.info(f"分析完成 - 最佳走法: {result['best_move']}，"
+                    f"延迟 {self.latest_result['capture_latency']:.2f}s")
     
     def start_tunnel(self) -> bool:
         """启动内网穿透"""
+        from src.tunnel_service import create_ngrok_tunnel, create_frp_tunnel
+        
         try:
             if not self.config.get('enable_tunnel', False):
                 logger.info("内网穿透未启用")
@@ -274,6 +349,12 @@ class XiangqiAnalyzerService:
             'latest_result': self.latest_result
         }
         
+        if self.stream_processor:
+            status['stream_health'] = self.stream_processor.get_health()
+        
+        if self.pipeline:
+            status['pipeline'] = self.pipeline.get_stats()
+        
         if self.tunnel_manager:
             status['tunnel_status'] = self.tunnel_manager.get_status()
         
@@ -322,6 +403,9 @@ def parse_arguments():
   
   # 启用内网穿透
   python main.py --enable-tunnel --tunnel-token your_token
+  
+  # 离线分析录像（每秒采样一帧）
+  python main.py --analyze-video game.mp4 --sample-interval 1
         """
     )
     
@@ -359,6 +443,18 @@ def parse_arguments():
     parser.add_argument('--debug', action='store_true',
                         help='启用调试模式')
     
+    parser.add_argument('--analyze-video',
+                        help='离线分析视频文件后退出（不启动Web服务器）')
+    
+    parser.add_argument('--output', '-o',
+                        help='离线分析结果JSON路径 (默认: 与视频同名)')
+    
+    parser.add_argument('--sample-interval', type=float, default=1.0,
+                        help='离线分析的采样间隔秒数 (默认: 1.0)')
+    
+    parser.add_argument('--workers', type=int,
+                        help='离线分析的工作进程数 (默认: CPU核心数)')
+    
     return parser.parse_args()
 
 
@@ -372,6 +468,10 @@ def create_default_config():
         'source_value': '',
         'think_time': 2000,
         'analysis_interval': 3,
+        'stream_backend': 'opencv',
+        'stream_size': None,
+        'stream_process': False,
+        'screen_auto_roi': True,
         'enable_tunnel': False,
         'tunnel_type': 'ngrok',
         'tunnel_config': {
@@ -435,6 +535,11 @@ def main():
     if args.tunnel_type:
         service.config['tunnel_type'] = args.tunnel_type
     
+    # 离线视频分析模式
+    if args.analyze_video:
+        ok = service.analyze_video(args.analyze_video, args.output, args.sample_interval, args.workers)
+        sys.exit(0 if ok else 1)
+    
     # 设置信号处理器
     setup_signal_handlers()
     
@@ -452,7 +557,8 @@ def main():
     if service.config['enable_tunnel']:
         service.start_tunnel()
     
-    # 初始化应用
+    # 初始化应用（检测器和引擎在后台线程预热）
+    from web.app import app, socketio, init_app
     init_app()
     
     # 启动Web服务器
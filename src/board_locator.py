@@ -0,0 +1,109 @@
+"""
+棋盘区域定位
+在整屏/整窗截图中快速找到棋盘所在的矩形区域，之后只截取该区域
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import List, Optional, Tuple
+
+from .lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+
+def _line_positions(profile: np.ndarray, threshold: float) -> np.ndarray:
+    """返回投影中超过阈值的各连续段的中心位置（一条线膨胀后占好几行/列）"""
+    above = np.concatenate(([False], profile >= threshold, [False]))
+    changes = np.flatnonzero(above[1:] != above[:-1])
+    return (changes[0::2] + changes[1::2] - 1) / 2
+
+
+def _is_grid(positions: np.ndarray, span: int, intervals: int, min_lines: int) -> bool:
+    """线条数量足够，且相邻线的典型间距接近 span / intervals（排除杂乱的界面边框）"""
+    if len(positions) < min_lines:
+        return False
+    gap = float(np.median(np.diff(positions)))
+    step = span / intervals
+    return 0.6 * step <= gap <= 1.5 * step
+
+
+def _merge_river(boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """
+    把被河界隔开的上下两半合并为一个候选区域
+
+    河界处没有竖线，边线又常被兵卒遮住，两半棋盘在连通域里往往是分开的。
+    左右基本对齐、上下间距不超过两个格子（约宽度的 1/4，边缘的线段可能被棋子截短）的两个区域视为同一棋盘；
+    原有区域也保留为候选，由调用方按线条数量筛选。
+    """
+    merged = list(boxes)
+    for i, first in enumerate(boxes):
+        for second in boxes[i + 1:]:
+            upper, lower = sorted((first, second), key=lambda box: box[1])
+            (x1, y1, w1, h1), (x2, y2, w2, h2) = upper, lower
+            overlap = min(x1 + w1, x2 + w2) - max(x1, x2)
+            gap = y2 - (y1 + h1)
+            if overlap >= 0.8 * max(w1, w2) and gap <= max(w1, w2) / 4:
+                left, top = min(x1, x2), y1
+                merged.append((left, top, max(x1 + w1, x2 + w2) - left, max(y1 + h1, y2 + h2) - top))
+    return merged
+
+
+def find_board_roi(image: np.ndarray, margin: float = 0.12,
+                   min_size_ratio: float = 0.1) -> Optional[Tuple[int, int, int, int]]:
+    """
+    定位棋盘区域
+
+    棋盘由 10 条横线和 9 条竖线组成。先用边缘图加长条形态学开运算只保留长直线，
+    再在横竖线组成的连通区域（上下两半按河界合并）中，选择横线至少 8 条、竖线至少 5 条（河界处竖线断开）的最大区域。
+
+    Args:
+        image: BGR 截图
+        margin: 在网格外框基础上向外扩展的比例（包含压在边线上的棋子和棋盘边框）
+        min_size_ratio: 网格短边至少占截图短边的比例
+
+    Returns:
+        (x, y, width, height)，相对于 image；未找到时返回 None
+    """
+    height, width = image.shape[:2]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    # 先平滑再求边缘：噪声会让一像素宽的棋盘线边缘变成锯齿，长条开运算后整条线消失
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 30, 90)
+
+    min_side = int(min(height, width) * min_size_ratio)
+    length = max(10, min_side // 3)
+    horizontal = cv2.morphologyEx(edges, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (length, 1)))
+    vertical = cv2.morphologyEx(edges, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, length)))
+
+    # 膨胀把同一条线两侧的边缘并成一条，也把被棋子打断的线段连起来
+    kernel = np.ones((5, 5), np.uint8)
+    horizontal = cv2.dilate(horizontal, kernel)
+    vertical = cv2.dilate(vertical, kernel)
+    grid = horizontal | vertical
+    count, _, stats, _ = cv2.connectedComponentsWithStats(grid)
+    boxes = [tuple(int(v) for v in box[:4]) for box in stats[1:count] if box[2] >= min_side // 2]
+
+    best = None
+    for x, y, w, h in _merge_river(boxes):
+        if w < min_side or h < min_side or not 0.6 <= w / h <= 1.4:
+            continue
+        if best is not None and w * h <= best[2] * best[3]:
+            continue
+
+        rows = np.count_nonzero(horizontal[y:y + h, x:x + w], axis=1)
+        cols = np.count_nonzero(vertical[y:y + h, x:x + w], axis=0)
+        if _is_grid(_line_positions(rows, 0.3 * w), h, 9, 6) and _is_grid(_line_positions(cols, 0.2 * h), w, 8, 5):
+            best = (x, y, w, h)
+
+    if best is None:
+        return None
+
+    x, y, w, h = best
+    pad_x, pad_y = int(w * margin), int(h * margin)
+    left, top = max(0, x - pad_x), max(0, y - pad_y)
+    right, bottom = min(width, x + w + pad_x), min(height, y + h + pad_y)
+    return left, top, right - left, bottom - top
@@ -0,0 +1,268 @@
+"""
+合成棋盘渲染器
+根据FEN生成带标注的象棋棋盘图像，用于在没有真实截图时做端到端基准测试
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .chess_validator import CATEGORY_MAP_REVERSE
+from .lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+INITIAL_FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR"
+
+# 常见系统中的中文字体，找不到时退化为用字母绘制棋子
+CJK_FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "C:/Windows/Fonts/msyh.ttc",
+]
+
+
+def fen_to_grid(fen: str) -> List[List[str]]:
+    """
+    将FEN棋盘部分展开为10x9网格（第0行为FEN第一行，即图像最上方）
+
+    Args:
+        fen: FEN字符串，可带行棋方等后缀
+
+    Returns:
+        10x9 网格，空位为 '.'
+    """
+    rows = fen.split()[0].split('/')
+    if len(rows) != 10:
+        raise ValueError(f"FEN行数错误: {fen}")
+
+    grid = []
+    for row in rows:
+        cells = []
+        for ch in row:
+            if ch.isdigit():
+                cells.extend('.' * int(ch))
+            else:
+                cells.append(ch)
+        if len(cells) != 9:
+            raise ValueError(f"FEN列数错误: {row}")
+        grid.append(cells)
+    return grid
+
+
+def grid_to_fen(grid: List[List[str]]) -> str:
+    """将10x9网格压缩为FEN棋盘部分"""
+    fen_rows = []
+    for row in grid:
+        fen_row = ""
+        empty_count = 0
+        for cell in row:
+            if cell == '.':
+                empty_count += 1
+            else:
+                if empty_count:
+                    fen_row += str(empty_count)
+                    empty_count = 0
+                fen_row += cell
+        if empty_count:
+            fen_row += str(empty_count)
+        fen_rows.append(fen_row)
+    return "/".join(fen_rows)
+
+
+def random_position(rng: random.Random, max_removed: int = 20, max_moved: int = 6) -> str:
+    """
+    生成随机局面：从初始局面随机吃掉若干棋子，并把若干棋子挪到随机空位
+
+    局面不保证合法，只用于检测/识别基准。
+
+    Args:
+        rng: 随机数生成器
+        max_removed: 最多移除的棋子数
+        max_moved: 最多移动的棋子数
+
+    Returns:
+        FEN棋盘部分
+    """
+    grid = fen_to_grid(INITIAL_FEN)
+    occupied = [(i, j) for i in range(10) for j in range(9) if grid[i][j] not in '.kK']
+
+    for i, j in rng.sample(occupied, rng.randint(0, min(max_removed, len(occupied)))):
+        grid[i][j] = '.'
+
+    for _ in range(rng.randint(0, max_moved)):
+        pieces = [(i, j) for i in range(10) for j in range(9) if grid[i][j] not in '.kK']
+        empties = [(i, j) for i in range(10) for j in range(9) if grid[i][j] == '.']
+        if not pieces or not empties:
+            break
+        (si, sj), (di, dj) = rng.choice(pieces), rng.choice(empties)
+        grid[di][dj], grid[si][sj] = grid[si][sj], '.'
+
+    return grid_to_fen(grid)
+
+
+class BoardRenderer:
+    """合成棋盘渲染器"""
+
+    def __init__(self, font_path: Optional[str] = None):
+        """
+        初始化渲染器
+
+        Args:
+            font_path: 中文字体路径（为空时自动查找常见系统字体）
+        """
+        self.font_path = font_path or next(
+            (path for path in CJK_FONT_CANDIDATES if Path(path).exists()), None
+        )
+        if self.font_path is None:
+            logger.warning("未找到中文字体，棋子将以字母绘制")
+        self._fonts = {}
+
+    def render(self, fen: str, size: Tuple[int, int] = (720, 800), noise: float = 0.0,
+               perspective: float = 0.0, lighting: float = 0.0,
+               seed: Optional[int] = None) -> Tuple[np.ndarray, Dict]:
+        """
+        渲染棋盘图像
+
+        Args:
+            fen: FEN字符串（大写为红方，第一行在图像上方）
+            size: 输出图像尺寸 (宽, 高)
+            noise: 高斯噪声标准差（像素值，0~255）
+            perspective: 透视扰动强度（相对图像尺寸，0~0.2 比较合理）
+            lighting: 光照不均强度（0~1）
+            seed: 随机种子
+
+        Returns:
+            (BGR图像, 标注字典)，标注包含 fen 和棋盘四角坐标 corners
+            （左上、右上、右下、左下）
+        """
+        rng = np.random.default_rng(seed)
+        width, height = size
+        grid = fen_to_grid(fen)
+
+        # 棋盘在画布上占据的区域，四周留出边框
+        margin_x, margin_y = width * 0.08, height * 0.07
+        step_x = (width - 2 * margin_x) / 8
+        step_y = (height - 2 * margin_y) / 9
+        piece_radius = int(min(step_x, step_y) * 0.45)
+
+        image = self._draw_board(width, height, margin_x, margin_y, step_x, step_y)
+        image = self._draw_pieces(image, grid, margin_x, margin_y, step_x, step_y, piece_radius)
+
+        corners = np.array([
+            [margin_x, margin_y],
+            [width - margin_x, margin_y],
+            [width - margin_x, height - margin_y],
+            [margin_x, height - margin_y],
+        ], dtype=np.float32)
+
+        if perspective > 0:
+            image, corners = self._apply_perspective(image, corners, perspective, rng)
+        if lighting > 0:
+            image = self._apply_lighting(image, lighting, rng)
+        if noise > 0:
+            noisy = image.astype(np.float32) + rng.normal(0, noise, image.shape)
+            image = np.clip(noisy, 0, 255).astype(np.uint8)
+
+        return image, {'fen': grid_to_fen(grid), 'corners': corners.tolist()}
+
+    def _draw_board(self, width, height, margin_x, margin_y, step_x, step_y) -> np.ndarray:
+        """绘制棋盘底色、网格、河界和九宫"""
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:] = (120, 180, 222)  # 木色背景（BGR）
+
+        line_color = (30, 50, 70)
+        thickness = max(1, int(min(step_x, step_y) / 30))
+
+        def point(row, col):
+            return int(round(margin_x + col * step_x)), int(round(margin_y + row * step_y))
+
+        for row in range(10):
+            cv2.line(image, point(row, 0), point(row, 8), line_color, thickness)
+        for col in range(9):
+            if col in (0, 8):
+                cv2.line(image, point(0, col), point(9, col), line_color, thickness)
+            else:
+                # 河界处竖线断开
+                cv2.line(image, point(0, col), point(4, col), line_color, thickness)
+                cv2.line(image, point(5, col), point(9, col), line_color, thickness)
+
+        for top in (0, 7):
+            cv2.line(image, point(top, 3), point(top + 2, 5), line_color, thickness)
+            cv2.line(image, point(top, 5), point(top + 2, 3), line_color, thickness)
+
+        cv2.rectangle(image, point(0, 0), point(9, 8), line_color, thickness * 2)
+        return image
+
+    def _draw_pieces(self, image, grid, margin_x, margin_y, step_x, step_y, radius) -> np.ndarray:
+        """绘制棋子"""
+        from PIL import Image, ImageDraw
+
+        for i, row in enumerate(grid):
+            for j, piece in enumerate(row):
+                if piece == '.':
+                    continue
+                center = (int(round(margin_x + j * step_x)), int(round(margin_y + i * step_y)))
+                color = (40, 40, 200) if piece.isupper() else (30, 30, 30)
+                cv2.circle(image, center, radius, (170, 215, 240), -1, cv2.LINE_AA)
+                cv2.circle(image, center, radius, color, max(2, radius // 10), cv2.LINE_AA)
+
+        canvas = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        draw = ImageDraw.Draw(canvas)
+        font = self._font(int(radius * 1.2))
+
+        for i, row in enumerate(grid):
+            for j, piece in enumerate(row):
+                if piece == '.':
+                    continue
+                text = CATEGORY_MAP_REVERSE[piece][1] if self.font_path else piece.upper()
+                fill = (200, 40, 40) if piece.isupper() else (30, 30, 30)
+                center = (margin_x + j * step_x, margin_y + i * step_y)
+                draw.text(center, text, font=font, fill=fill, anchor='mm')
+
+        return cv2.cvtColor(np.asarray(canvas), cv2.COLOR_RGB2BGR)
+
+    def _font(self, size: int):
+        """按字号缓存字体"""
+        from PIL import ImageFont
+
+        if size not in self._fonts:
+            if self.font_path:
+                self._fonts[size] = ImageFont.truetype(self.font_path, size)
+            else:
+                self._fonts[size] = ImageFont.load_default(size)
+        return self._fonts[size]
+
+    def _apply_perspective(self, image, corners, strength, rng):
+        """随机扰动四角做透视变换"""
+        height, width = image.shape[:2]
+        src = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+        jitter = rng.uniform(-strength, strength, (4, 2)) * [width, height]
+        dst = (src + jitter).astype(np.float32)
+
+        matrix = cv2.getPerspectiveTransform(src, dst)
+        warped = cv2.warpPerspective(image, matrix, (width, height),
+                                     borderMode=cv2.BORDER_CONSTANT, borderValue=(60, 60, 60))
+        warped_corners = cv2.perspectiveTransform(corners.reshape(-1, 1, 2), matrix).reshape(-1, 2)
+        return warped, warped_corners
+
+    def _apply_lighting(self, image, strength, rng):
+        """叠加线性光照梯度和随机亮度"""
+        height, width = image.shape[:2]
+        angle = rng.uniform(0, 2 * np.pi)
+        xs = np.linspace(-1, 1, width, dtype=np.float32)
+        ys = np.linspace(-1, 1, height, dtype=np.float32)
+        gradient = np.cos(angle) * xs[None, :] + np.sin(angle) * ys[:, None]
+        gain = 1.0 + strength * 0.5 * gradient + rng.uniform(-strength, strength) * 0.3
+        lit = image.astype(np.float32) * gain[:, :, None]
+        return np.clip(lit, 0, 255).astype(np.uint8)
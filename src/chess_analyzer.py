@@ -3,17 +3,27 @@
 整合棋盘检测和Pikafish引擎分析
 """
 
-import cv2
-import numpy as np
+from __future__ import annotations
+
 import subprocess
 import os
+import queue
 import sys
+import threading
 from pathlib import Path
 from typing import Tuple, List, Optional, Dict
 import time
 import logging
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from .chess_validator import ChessboardValidator, CATEGORY_MAP, CATEGORY_MAP_REVERSE
+from .layout_smoother import LayoutSmoother
+from .lazy_import import lazy_import
+from .metrics import CACHE_REQUESTS, ENGINE_CRASHES, ENGINE_RESTARTS, STAGE_SECONDS
+
+# 重量级依赖延迟导入，首次使用时才加载
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,18 +32,39 @@ logger = logging.getLogger(__name__)
 project_root = Path(__file__).parent.parent
 core_package_path = project_root / "Chinese_Chess_Recognition"
 
-# 将 Chinese_Chess_Recognition 添加到 sys.path，使其内部的绝对导入能工作
-if str(core_package_path) not in sys.path:
-    sys.path.insert(0, str(core_package_path))
+# 第三方检测器在首次创建 ChessboardDetector 时才导入
+CORE_AVAILABLE = None
+OriginalDetector = None
+_core_lock = threading.Lock()
+
+
+def _load_core() -> bool:
+    """
+    导入 Chinese_Chess_Recognition 核心模块（只执行一次）
+
+    Returns:
+        核心模块是否可用
+    """
+    global CORE_AVAILABLE, OriginalDetector
+
+    with _core_lock:
+        if CORE_AVAILABLE is not None:
+            return CORE_AVAILABLE
+
+        # 将 Chinese_Chess_Recognition 添加到 sys.path，使其内部的绝对导入能工作
+        if str(core_package_path) not in sys.path:
+            sys.path.insert(0, str(core_package_path))
+
+        try:
+            from core.chessboard_detector import ChessboardDetector as _OriginalDetector
+            OriginalDetector = _OriginalDetector
+            CORE_AVAILABLE = True
+        except Exception as e:
+            CORE_AVAILABLE = False
+            logger.error(f"导入失败: {e}")
+            logger.exception("详细堆栈信息:")
 
-# 现在可以安全导入
-try:
-    from core.chessboard_detector import ChessboardDetector as OriginalDetector
-    CORE_AVAILABLE = True
-except Exception as e:
-    CORE_AVAILABLE = False
-    logger.error(f"导入失败: {e}")
-    logger.exception("详细堆栈信息:")
+        return CORE_AVAILABLE
 
 
 class PikafishEngine:
@@ -105,6 +136,7 @@ class PikafishEngine:
         """确保引擎存活，否则自动重启"""
         if self.process is None or self.process.poll() is not None:
             logger.warning("检测到引擎进程异常，尝试自动重启...")
+            ENGINE_RESTARTS.inc()
             try:
                 self._start_engine()
             except Exception as e:
@@ -122,6 +154,7 @@ class PikafishEngine:
         else:
             # 引擎已死，标记崩溃
             self.crash_count += 1
+            ENGINE_CRASHES.inc()
             raise RuntimeError("引擎进程已终止")
 
     def _wait_for_response(self, target: str = None, max_time: float = None) -> List[str]:
@@ -145,6 +178,7 @@ class PikafishEngine:
             # 检查进程是否存活
             if self.process.poll() is not None:
                 self.crash_count += 1  # 检测到崩溃，计数+1
+                ENGINE_CRASHES.inc()
                 raise RuntimeError("引擎进程意外终止")
 
             line = self.process.stdout.readline().strip()
@@ -157,7 +191,8 @@ class PikafishEngine:
 
         raise TimeoutError(f"引擎响应超时（{max_time}秒）")
 
-    def get_best_move(self, fen: str, think_time: int = 8000, depth: int = None) -> dict:
+    def get_best_move(self, fen: str, think_time: int = 8000, depth: int = None,
+                      turn: Optional[str] = None) -> dict:
         """
         获取最佳走法，增加健壮性处理
 
@@ -165,6 +200,7 @@ class PikafishEngine:
             fen: FEN格式棋盘字符串（不含轮到哪方，需要手动添加）
             think_time: 思考时间（毫秒）
             depth: 搜索深度（可选，如果设置则覆盖think_time）
+            turn: 行棋方 'w'/'b'（可选；不指定时按棋盘朝向判断用户执棋颜色）
 
         Returns:
             dict: 包含best_move, score, pv等信息
@@ -184,14 +220,17 @@ class PikafishEngine:
             self._send_command("isready")
             self._wait_for_response("readyok")
 
-            # 自动判断执棋颜色
-            rows = fen.split('/')
-            my_color_is_red = any('K' in row for row in rows[:5])
-            if my_color_is_red:
-                logger.info("用户执红棋")
+            if turn in ('w', 'b'):
+                engine_turn = turn
             else:
-                logger.info("用户执黑棋")
-            engine_turn = 'w' if my_color_is_red else 'b'
+                # 自动判断执棋颜色
+                rows = fen.split('/')
+                my_color_is_red = any('K' in row for row in rows[:5])
+                if my_color_is_red:
+                    logger.info("用户执红棋")
+                else:
+                    logger.info("用户执黑棋")
+                engine_turn = 'w' if my_color_is_red else 'b'
 
             full_fen = f"{fen} {engine_turn} - - 0 1"
             self._send_command(f"position fen {full_fen}")
@@ -295,13 +334,17 @@ class ChessboardDetector:
             full_classifier_model_path: 棋子分类模型路径
         """
         try:
-            if not CORE_AVAILABLE:
+            if not _load_core():
                 raise RuntimeError("无法初始化：Chinese_Chess_Recognition 模块不可用")
 
+            self.pose_model_path = pose_model_path
+            self.full_classifier_model_path = full_classifier_model_path
             self.detector = OriginalDetector(
                 pose_model_path=pose_model_path,
                 full_classifier_model_path=full_classifier_model_path
             )
+            # detect_many 的各工作线程独占的检测器实例（第一个即 self.detector），按需创建后保留
+            self._detectors = [self.detector]
 
             # 初始化校验器
             self.validator = ChessboardValidator()
@@ -329,60 +372,127 @@ class ChessboardDetector:
             # 返回模拟数据用于测试
             return self._generate_mock_result(image)
         
+        return self._detect_with(self.detector, image)
+
+    def _detect_with(self, detector, image: np.ndarray) -> Optional[Dict]:
+        """用指定的原始检测器实例检测一张图片"""
         try:
-            result = self.detector.pred_detect_board_and_classifier(image)
+            with STAGE_SECONDS.time(stage='detect'):
+                result = detector.pred_detect_board_and_classifier(image)
             if result is None:
                 return None
-                
-            original_with_keypoints, transformed_board, cell_labels_str, scores, time_info = result
 
-            # 1. 解析为二维完整名称
-            layout_2d_short = [list(row) for row in cell_labels_str.strip().split('\n')]
-            layout_2d_full = [[CATEGORY_MAP_REVERSE.get(p, '点') for p in row]
-                              for row in layout_2d_short]
+            with STAGE_SECONDS.time(stage='validate'):
+                return self._postprocess(result)
 
-            # 2. 调用校验器（只检测，不修改）
-            validation_report = self.validator.validate_per_cell_red(
-                transformed_board, layout_2d_full, scores
-            )
+        except Exception as e:
+            logger.error(f"检测失败: {e}")
+            return None
 
-            # 3. 如果开关打开，执行硬翻转
-            # import pdb; pdb.set_trace()
-            corrected_layout = layout_2d_full
-            corrected_scores = scores
-            flip_records = validation_report['recommend_flip']
+    def detect_many(self, images: List[np.ndarray], workers: int = 4) -> List[Optional[Dict]]:
+        """
+        并发检测多张图片（离线分析多张截图时使用）
 
-            if self.enable_red_flip and flip_records:
-                # 执行翻转
-                corrected_layout = [row[:] for row in layout_2d_full]  # 深拷贝
-                corrected_scores = [row.copy() for row in scores]
+        所有图片一次提交给线程池，空闲的工作线程立即取下一张，不按批等待。
+        原始检测器（Chinese_Chess_Recognition 子模块）未声明线程安全，每个工作线程
+        独占一个检测器实例：首次使用 workers 个线程时额外加载 workers-1 份模型，之后复用。
+        校验器无状态，可在线程间共享。与 detect 一样，同一检测器不要在多个线程中同时调用。
 
-                for flip in flip_records:
-                    i, j = flip['pos']
-                    corrected_layout[i][j] = flip['to']
-                    corrected_scores[i][j] = scores[i][j] * 0.6  # 降低置信度
+        Args:
+            images: 输入图像列表
+            workers: 并发线程数（即检测器实例数）
 
-                logger.info(f"🔄 已硬翻转{len(flip_records)}个棋子")
+        Returns:
+            检测结果列表，与 images 一一对应，失败的位置为 None
+        """
+        if workers < 1:
+            raise ValueError(f"workers必须大于0: {workers}")
 
-                # 转回 short 格式
-                layout_2d_short = [[CATEGORY_MAP.get(p, '.') for p in row]
-                                   for row in corrected_layout]
-                cell_labels_str = '\n'.join([''.join(row) for row in layout_2d_short])
-                scores = corrected_scores
+        if not images:
+            return []
+
+        if self.detector is None:
+            return [self._generate_mock_result(image) for image in images]
+
+        workers = min(workers, len(images))
+        while len(self._detectors) < workers:
+            self._detectors.append(OriginalDetector(
+                pose_model_path=self.pose_model_path,
+                full_classifier_model_path=self.full_classifier_model_path
+            ))
+
+        idle = queue.Queue()
+        for detector in self._detectors[:workers]:
+            idle.put(detector)
+
+        def detect_one(image):
+            # 线程数与实例数相同，总能立即取到空闲实例
+            detector = idle.get()
+            try:
+                return self._detect_with(detector, image)
+            finally:
+                idle.put(detector)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detect_many") as executor:
+            results = list(executor.map(detect_one, images))
+
+        logger.info(f"批量检测完成: {sum(r is not None for r in results)}/{len(images)} 成功")
+        return results
+
+    def _postprocess(self, result: Tuple) -> Dict:
+        """
+        解析原始检测输出，执行颜色校验和翻转
+
+        Args:
+            result: pred_detect_board_and_classifier 的返回值
+
+        Returns:
+            检测结果字典
+        """
+        original_with_keypoints, transformed_board, cell_labels_str, scores, time_info = result
+
+        # 1. 解析为二维完整名称
+        layout_2d_short = [list(row) for row in cell_labels_str.strip().split('\n')]
+        layout_2d_full = [[CATEGORY_MAP_REVERSE.get(p, '点') for p in row]
+                          for row in layout_2d_short]
+
+        # 2. 调用校验器（只检测，不修改）
+        validation_report = self.validator.validate_per_cell_red(
+            transformed_board, layout_2d_full, scores
+        )
+
+        # 3. 如果开关打开，执行硬翻转
+        corrected_layout = layout_2d_full
+        corrected_scores = scores
+        flip_records = validation_report['recommend_flip']
+
+        if self.enable_red_flip and flip_records:
+            # 执行翻转
+            corrected_layout = [row[:] for row in layout_2d_full]  # 深拷贝
+            corrected_scores = [row.copy() for row in scores]
+
+            for flip in flip_records:
+                i, j = flip['pos']
+                corrected_layout[i][j] = flip['to']
+                corrected_scores[i][j] = scores[i][j] * 0.6  # 降低置信度
+
+            logger.info(f"🔄 已硬翻转{len(flip_records)}个棋子")
+
+            # 转回 short 格式
+            layout_2d_short = [[CATEGORY_MAP.get(p, '.') for p in row]
+                               for row in corrected_layout]
+            cell_labels_str = '\n'.join([''.join(row) for row in layout_2d_short])
+            scores = corrected_scores
+
+        return {
+            'original_with_keypoints': original_with_keypoints,
+            'transformed_board': transformed_board,
+            'cell_labels_str': cell_labels_str,
+            'scores': scores,
+            'time_info': time_info,
+            'validation_report': validation_report if self.validator else None
+        }
 
-            return {
-                'original_with_keypoints': original_with_keypoints,
-                'transformed_board': transformed_board,
-                'cell_labels_str': cell_labels_str,
-                'scores': scores,
-                'time_info': time_info,
-                'validation_report': validation_report if self.validator else None
-            }
-            
-        except Exception as e:
-            logger.error(f"检测失败: {e}")
-            return None
-    
     def _generate_mock_result(self, image: np.ndarray) -> Dict:
         """生成模拟检测结果用于测试"""
         logger.info("使用模拟检测器")
@@ -415,11 +525,29 @@ class ChessboardDetector:
         }
 
 
+class FrameState:
+    """
+    连续帧分析的状态
+
+    每路视频源持有一个：多帧投票平滑器 + 上一次提交布局的分析结果。
+    多路视频源共享同一个分析器时，各自传入自己的 FrameState，互不干扰。
+    """
+
+    def __init__(self, smoother: Optional[LayoutSmoother] = None):
+        self.smoother = smoother or LayoutSmoother()
+        self.last_result = None
+
+    def reset(self):
+        """清空状态（切换信号源时调用）"""
+        self.smoother.reset()
+        self.last_result = None
+
+
 class XiangqiAnalyzer:
     """中国象棋分析器主类"""
     
     def __init__(self, engine_path: str, pose_model_path: str, classifier_model_path: str, 
-                 detector_inverted: bool = True):
+                 detector_inverted: bool = True, smoother: Optional[LayoutSmoother] = None):
         """
         初始化分析器
         
@@ -428,6 +556,7 @@ class XiangqiAnalyzer:
             pose_model_path: 姿态检测模型路径
             classifier_model_path: 棋子分类模型路径
             detector_inverted: 检测器是否反转
+            smoother: 连续帧分析使用的布局平滑器（默认创建一个）
         """
         self.engine_path = engine_path
         self.detector_inverted = detector_inverted
@@ -435,15 +564,37 @@ class XiangqiAnalyzer:
         # 初始化检测器
         self.detector = ChessboardDetector(pose_model_path, classifier_model_path)
         
-        # 初始化引擎（延迟初始化，需要时再启动）
+        # 初始化引擎（延迟初始化，需要时再启动）；后台预热和分析线程可能同时启动，用锁保证只启动一个进程
         self.engine = None
+        self._engine_lock = threading.Lock()
+        self._closed = False
+
+        # 连续帧分析：多帧投票平滑，布局未变化时复用上一次引擎结果
+        self.frame_state = FrameState(smoother)
         
         logger.info("✅ 象棋分析器初始化完成")
     
     def _ensure_engine_started(self):
-        """确保引擎已启动"""
-        if self.engine is None:
-            self.engine = PikafishEngine(self.engine_path)
+        """确保引擎已启动（线程安全；分析器关闭后不再启动）"""
+        if self.engine is not None:
+            return
+        with self._engine_lock:
+            if self._closed:
+                raise RuntimeError("分析器已关闭")
+            if self.engine is None:
+                self.engine = PikafishEngine(self.engine_path)
+
+    def warm_up(self):
+        """
+        预热检测器和引擎
+
+        启动引擎进程，并用一张空白图片跑一次检测，让ONNX会话完成首次推理的
+        内存分配，避免第一次真实分析时承担这部分开销。
+        """
+        start = time.time()
+        self._ensure_engine_started()
+        self.detector.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+        logger.info(f"🔥 预热完成，用时 {time.time() - start:.2f}s")
     
     def analyze_image(self, image: np.ndarray, think_time: int = 2000) -> Optional[Dict]:
         """
@@ -465,42 +616,131 @@ class XiangqiAnalyzer:
                 logger.error("棋盘检测失败")
                 return None
 
-            # 解析布局
-            pgn_rows = detect_result['cell_labels_str'].strip().split('\n')
-            layout_pgn = [list(row.strip()) for row in pgn_rows]
-            fen = self._board_layout_to_fen(layout_pgn)
-            
-            # 启动引擎并分析
-            self._ensure_engine_started()
-            logger.info(f"🤖 引擎分析中（{think_time}ms）...")
-            
-            analysis = self.engine.get_best_move(fen, think_time=think_time)
+            return self._analyze_detection(detect_result, think_time)
             
-            if analysis.get("error"):
-                logger.error(f"引擎分析失败: {analysis['error']}")
+        except Exception as e:
+            logger.error(f"分析失败: {e}")
+            return None
+
+    def analyze_frame(self, image: np.ndarray, think_time: int = 2000,
+                      state: Optional[FrameState] = None) -> Optional[Dict]:
+        """
+        分析连续视频帧
+
+        检测结果先经过多帧投票平滑，只有新布局被提交时才启动引擎搜索；
+        布局未变化时直接复用上一次的分析结果，避免为识别抖动产生的
+        虚假局面浪费引擎时间。
+
+        Args:
+            image: 输入图像
+            think_time: 引擎思考时间（毫秒）
+            state: 该视频源的连续帧状态（默认使用分析器自带的状态）
+
+        Returns:
+            分析结果字典；尚未形成稳定布局时返回 None
+        """
+        state = state or self.frame_state
+        try:
+            detect_result = self.detect_frame(image, state)
+            if detect_result is None:
                 return None
-            
-            # 组装最终结果
-            final_result = {
-                'timestamp': datetime.now().isoformat(),
-                'fen': fen,
-                'layout_pgn': layout_pgn,
-                'layout_2d': [[CATEGORY_MAP_REVERSE.get(cell, cell) for cell in row] for row in layout_pgn],
-                'scores': detect_result['scores'],
-                'detect_time': detect_result['time_info'],
-                'best_move': analysis['best_move'],
-                'score': analysis['score'],
-                'original_with_keypoints': detect_result['original_with_keypoints'],
-                'transformed_board': detect_result['transformed_board'],
-                'confidence': np.mean(detect_result['scores'])
-            }
-            
-            logger.info(f"✅ 分析完成 - 最佳走法: {final_result['best_move']}")
-            return final_result
-            
+            return self.evaluate_frame(detect_result, think_time, state)
+
         except Exception as e:
             logger.error(f"分析失败: {e}")
             return None
+
+    def detect_frame(self, image: np.ndarray, state: Optional[FrameState] = None) -> Optional[Dict]:
+        """
+        连续帧分析的检测阶段：检测棋盘并经过多帧投票平滑
+
+        与 evaluate_frame 分开调用时，下一帧的检测可以与上一帧的引擎搜索在不同线程中重叠执行。
+
+        Args:
+            image: 输入图像
+            state: 该视频源的连续帧状态（默认使用分析器自带的状态）
+
+        Returns:
+            平滑后提交的检测结果；尚未形成稳定布局时返回 None
+        """
+        state = state or self.frame_state
+        return state.smoother.update(self.detector.detect(image))
+
+    def evaluate_frame(self, detect_result: Dict, think_time: int = 2000,
+                       state: Optional[FrameState] = None) -> Optional[Dict]:
+        """
+        连续帧分析的引擎阶段：布局未变化时复用上一次结果，否则启动引擎搜索
+
+        Args:
+            detect_result: detect_frame 返回的检测结果
+            think_time: 引擎思考时间（毫秒）
+            state: 该视频源的连续帧状态（默认使用分析器自带的状态）
+
+        Returns:
+            分析结果字典
+        """
+        state = state or self.frame_state
+        layout_pgn = [list(row.strip()) for row in detect_result['cell_labels_str'].strip().split('\n')]
+        last = state.last_result
+        if last is not None and last['fen'] == self._board_layout_to_fen(layout_pgn):
+            CACHE_REQUESTS.inc(cache='frame_result', result='hit')
+            return last
+        CACHE_REQUESTS.inc(cache='frame_result', result='miss')
+
+        result = self._analyze_detection(detect_result, think_time)
+        if result is not None:
+            state.last_result = result
+        return result
+
+    def reset_frames(self):
+        """清空连续帧分析的状态（切换信号源时调用）"""
+        self.frame_state.reset()
+
+    def _analyze_detection(self, detect_result: Dict, think_time: int) -> Optional[Dict]:
+        """
+        根据检测结果生成FEN并调用引擎分析
+
+        Args:
+            detect_result: 检测结果字典
+            think_time: 引擎思考时间（毫秒）
+
+        Returns:
+            分析结果字典
+        """
+        # 解析布局
+        with STAGE_SECONDS.time(stage='fen'):
+            pgn_rows = detect_result['cell_labels_str'].strip().split('\n')
+            layout_pgn = [list(row.strip()) for row in pgn_rows]
+            fen = self._board_layout_to_fen(layout_pgn)
+        
+        # 启动引擎并分析
+        self._ensure_engine_started()
+        logger.info(f"🤖 引擎分析中（{think_time}ms）...")
+        
+        with STAGE_SECONDS.time(stage='engine'):
+            analysis = self.engine.get_best_move(fen, think_time=think_time)
+        
+        if analysis.get("error"):
+            logger.error(f"引擎分析失败: {analysis['error']}")
+            return None
+        
+        # 组装最终结果
+        final_result = {
+            'timestamp': datetime.now().isoformat(),
+            'fen': fen,
+            'layout_pgn': layout_pgn,
+            'layout_2d': [[CATEGORY_MAP_REVERSE.get(cell, cell) for cell in row] for row in layout_pgn],
+            'scores': detect_result['scores'],
+            'detect_time': detect_result['time_info'],
+            'best_move': analysis['best_move'],
+            'score': analysis['score'],
+            'original_with_keypoints': detect_result['original_with_keypoints'],
+            'transformed_board': detect_result['transformed_board'],
+            'confidence': np.mean(detect_result['scores'])
+        }
+        
+        logger.info(f"✅ 分析完成 - 最佳走法: {final_result['best_move']}")
+        return final_result
     
     def _board_layout_to_fen(self, layout_pgn: List[List[str]]) -> str:
         """将10x9的PGN布局转换为FEN格式字符串"""
@@ -589,10 +829,12 @@ class XiangqiAnalyzer:
         return "\n".join(output)
     
     def quit(self):
-        """释放资源"""
-        if self.engine:
-            self.engine.quit()
-            self.engine = None
+        """释放资源（等待正在进行的引擎启动完成后一并关闭）"""
+        with self._engine_lock:
+            self._closed = True
+            engine, self.engine = self.engine, None
+        if engine:
+            engine.quit()
         logger.info("分析器已关闭")
 
 
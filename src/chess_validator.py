@@ -1,7 +1,11 @@
-import cv2
-import numpy as np
 import logging
 
+from .lazy_import import lazy_import
+
+# 重量级依赖延迟导入，首次使用时才加载
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
 logger = logging.getLogger(__name__)
 
 # 棋子映射
@@ -0,0 +1,243 @@
+"""
+分析任务队列
+上传的图片不再占用请求线程：提交后立即返回任务ID，由分析器池在后台处理，
+结果通过轮询或回调（Socket.IO 事件）获取
+"""
+
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """一个分析任务"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, payload: Any, owner: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.owner = owner          # 提交者（如 Socket.IO 的 sid），用于推送结果
+        self.state = self.QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (self.DONE, self.FAILED)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待任务结束，返回是否已结束"""
+        return self._done.wait(timeout)
+
+
+class JobQueue:
+    """
+    分析任务队列
+
+    每个工作线程独占一个由 analyzer_factory 创建的分析器（首次取到任务时创建），
+    按提交顺序处理任务。排队加运行中的任务数达到 max_jobs 时拒绝新任务，
+    避免请求堆积到超时。已结束的任务保留最近 keep_finished 个供轮询。
+    """
+
+    def __init__(self, analyzer_factory: Callable[[], Any], handler: Callable[[Any, Any], Any],
+                 workers: int = 1, max_jobs: int = 16, keep_finished: int = 200,
+                 on_finish: Optional[Callable[[Job], None]] = None, initial_estimate: float = 3.0):
+        """
+        初始化任务队列
+
+        Args:
+            analyzer_factory: 无参函数，返回一个分析器（每个工作线程调用一次）
+            handler: 处理函数 (分析器, 任务数据) -> 结果；抛出异常或返回 None 视为失败
+            workers: 工作线程（分析器）数量
+            max_jobs: 排队加运行中的任务上限
+            keep_finished: 保留的已结束任务数
+            on_finish: 任务结束（成功或失败）时的回调
+            initial_estimate: 尚无历史数据时单个任务耗时的估计（秒），用于预计等待时间
+        """
+        self.analyzer_factory = analyzer_factory
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_jobs = max_jobs
+        self.keep_finished = keep_finished
+        self.on_finish = on_finish
+        self.avg_duration = initial_estimate   # 任务耗时的指数滑动平均
+
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._running: List[Job] = []
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        self._generation = 0    # reset_analyzers 后递增，工作线程据此重建分析器
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """启动工作线程"""
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, daemon=True, name=f'job-worker-{index}')
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 2.0):
+        """停止工作线程（正在处理的任务会处理完，还在排队的任务直接失败，等待者不会一直等下去）"""
+        with self._cond:
+            self._stopped = True
+            abandoned = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        for job in abandoned:
+            job.error = '任务队列已停止'
+            self._finish(job)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def reset_analyzers(self):
+        """配置（模型/引擎路径）变化后调用：各工作线程在处理下一个任务前用 analyzer_factory 重建分析器"""
+        with self._cond:
+            self._generation += 1
+
+    @property
+    def stopped(self) -> bool:
+        """队列是否已停止（不再接受任务）"""
+        return self._stopped
+
+    def submit(self, payload: Any, owner: Optional[str] = None) -> Optional[Job]:
+        """
+        提交任务
+
+        Returns:
+            任务；排队加运行中的任务已达上限或队列已停止时返回 None
+        """
+        with self._cond:
+            if self._stopped or len(self._queue) + len(self._running) >= self.max_jobs:
+                self.rejected += 1
+                return None
+            job = Job(payload, owner)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._cond.notify()
+        self.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """按ID查找任务"""
+        return self._jobs.get(job_id)
+
+    def status(self, job: Job) -> Dict:
+        """任务状态：排队位置、预计完成时间（秒）、结果或错误"""
+        with self._cond:
+            position = self._queue.index(job) if job.state == Job.QUEUED and job in self._queue else None
+            running = [time.time() - j.started_at for j in self._running]
+
+        status = {'job_id': job.id, 'state': job.state, 'submitted_at': job.submitted_at}
+        if job.state == Job.QUEUED and position is not None:
+            status['position'] = position + 1
+            status['eta'] = round(self._eta(position, running), 2)
+        elif job.state == Job.RUNNING:
+            status['eta'] = round(max(0.0, self.avg_duration - (time.time() - job.started_at)), 2)
+        elif job.state == Job.DONE:
+            status['result'] = job.result
+            status['duration'] = round(job.finished_at - job.started_at, 3)
+        elif job.state == Job.FAILED:
+            status['error'] = job.error
+        return status
+
+    def _eta(self, position: int, running: List[float]) -> float:
+        """排在第 position 位（从 0 开始）的任务预计多久后完成"""
+        # 各工作线程最早空闲的时间，依次把前面排队的任务分配给最早空闲的线程
+        free_at = sorted([max(0.0, self.avg_duration - elapsed) for elapsed in running]
+                         + [0.0] * (self.workers - len(running)))[:self.workers]
+        for _ in range(position):
+            free_at[0] += self.avg_duration
+            free_at.sort()
+        return free_at[0] + self.avg_duration
+
+    def get_stats(self) -> Dict:
+        """队列统计"""
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'queued': len(self._queue),
+                'running': len(self._running),
+                'max_jobs': self.max_jobs,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_duration': round(self.avg_duration, 3)
+            }
+
+    def _worker_loop(self):
+        """工作线程：取任务、用自己的分析器处理"""
+        analyzer = None
+        generation = None
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stopped)
+                if self._stopped:
+                    break
+                job = self._queue.popleft()
+                job.state = Job.RUNNING
+                job.started_at = time.time()
+                self._running.append(job)
+
+            try:
+                if analyzer is not None and generation != self._generation:
+                    logger.info("配置已变化，重建任务分析器")
+                    if hasattr(analyzer, 'quit'):
+                        analyzer.quit()
+                    analyzer = None
+                if analyzer is None:
+                    generation = self._generation
+                    analyzer = self.analyzer_factory()
+                job.result = self.handler(analyzer, job.payload)
+                if job.result is None:
+                    job.error = '分析失败'
+            except Exception as e:
+                logger.error(f"任务 {job.id} 处理失败: {e}")
+                job.error = str(e)
+            self._finish(job)
+
+        if analyzer is not None and hasattr(analyzer, 'quit'):
+            analyzer.quit()
+
+    def _finish(self, job: Job):
+        """记录任务结束，清理过多的已结束任务"""
+        job.finished_at = time.time()
+        job.state = Job.FAILED if job.error else Job.DONE
+        job.payload = None
+        with self._cond:
+            if job in self._running:
+                self._running.remove(job)
+            if job.state == Job.DONE:
+                self.completed += 1
+                self.avg_duration = 0.7 * self.avg_duration + 0.3 * (job.finished_at - job.started_at)
+            else:
+                self.failed += 1
+            finished = [j for j in self._jobs.values() if j.finished]
+            for old in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self._jobs[old.id]
+        job._done.set()
+
+        if self.on_finish:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.error(f"任务结束回调出错: {e}")
@@ -0,0 +1,162 @@
+"""
+棋盘布局时间平滑
+对连续帧的识别结果做多帧投票，过滤分类器在个别格子上的抖动
+"""
+
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LayoutSmoother:
+    """
+    多帧投票平滑器
+
+    每个格子在最近 window 帧中按置信度累计投票，得票最高的棋子为该格的候选结果。
+    当前帧的布局与已提交布局不同时，满足以下任一条件即提交新布局：
+    1. 最近 fast_frames 帧的原始识别结果都是同一新布局，且每个变化格子在这些帧中的平均置信度
+       不低于 confidence_margin（旧棋子在这些帧中已不出现，置信度即新旧棋子的得票差）；
+    2. 投票得到的候选布局连续出现 persist_frames 帧（低置信度的变化走这条路径）。
+    """
+
+    def __init__(self, window: int = 5, persist_frames: int = 3, confidence_margin: float = 0.8,
+                 fast_frames: int = 2):
+        """
+        初始化平滑器
+
+        Args:
+            window: 参与投票的帧数
+            persist_frames: 投票得到的新布局需要连续出现的帧数
+            confidence_margin: 高置信度快速提交的平均置信度阈值（0~1）
+            fast_frames: 高置信度快速提交需要连续出现的原始帧数
+        """
+        if window < 1 or persist_frames < 1 or fast_frames < 1:
+            raise ValueError("window、persist_frames 和 fast_frames 必须大于0")
+
+        self.window = window
+        self.persist_frames = persist_frames
+        self.confidence_margin = confidence_margin
+        self.fast_frames = fast_frames
+
+        self.history = deque(maxlen=window)
+        self.committed_layout: Optional[List[List[str]]] = None
+        self.committed_result: Optional[Dict] = None
+        self.pending_layout: Optional[List[List[str]]] = None
+        self.pending_count = 0
+
+    def reset(self):
+        """清空历史和已提交布局"""
+        self.history.clear()
+        self.committed_layout = None
+        self.committed_result = None
+        self.pending_layout = None
+        self.pending_count = 0
+
+    def update(self, detect_result: Optional[Dict]) -> Optional[Dict]:
+        """
+        输入一帧检测结果，返回平滑后的结果
+
+        Args:
+            detect_result: ChessboardDetector.detect 的返回值
+
+        Returns:
+            以已提交布局为准的检测结果字典，额外包含 layout_changed 字段；
+            尚未提交任何布局时返回 None
+        """
+        if detect_result is None:
+            return self._current(changed=False)
+
+        layout = [list(row.strip()) for row in detect_result['cell_labels_str'].strip().split('\n')]
+        self.history.append((layout, detect_result['scores']))
+
+        if layout != self.committed_layout and self._clears_margin(layout):
+            logger.info("📌 提交新布局（高置信度）")
+            # 只保留新布局的帧，避免旧布局的历史把投票结果拉回去
+            while len(self.history) > self.fast_frames:
+                self.history.popleft()
+            return self._commit(layout, detect_result)
+
+        votes = self._vote()
+        voted_layout = [[max(cell, key=cell.get) for cell in row] for row in votes]
+
+        if voted_layout == self.committed_layout:
+            self.pending_layout = None
+            self.pending_count = 0
+            self.committed_result = detect_result
+            return self._current(changed=False)
+
+        if voted_layout == self.pending_layout:
+            self.pending_count += 1
+        else:
+            self.pending_layout = voted_layout
+            self.pending_count = 1
+
+        if self.pending_count >= self.persist_frames:
+            logger.info(f"📌 提交新布局（连续{self.pending_count}帧）")
+            return self._commit(voted_layout, detect_result)
+
+        return self._current(changed=False)
+
+    def _commit(self, layout: List[List[str]], detect_result: Dict) -> Optional[Dict]:
+        """提交新布局"""
+        self.committed_layout = layout
+        self.committed_result = detect_result
+        self.pending_layout = None
+        self.pending_count = 0
+        return self._current(changed=True)
+
+    def _vote(self) -> List[List[Dict[str, float]]]:
+        """按置信度累计每个格子的投票"""
+        rows = len(self.history[-1][0])
+        cols = len(self.history[-1][0][0]) if rows else 0
+        votes = [[{} for _ in range(cols)] for _ in range(rows)]
+
+        for layout, scores in self.history:
+            if len(layout) != rows:
+                continue
+            for i in range(rows):
+                for j in range(min(cols, len(layout[i]))):
+                    label = layout[i][j]
+                    votes[i][j][label] = votes[i][j].get(label, 0.0) + _cell_score(scores, i, j, cols)
+
+        return votes
+
+    def _clears_margin(self, layout: List[List[str]]) -> bool:
+        """最近 fast_frames 帧（尚无已提交布局时只看当前帧）是否都识别为该布局，且变化格子的平均置信度都超过阈值"""
+        frames = 1 if self.committed_layout is None else self.fast_frames
+        recent = list(self.history)[-frames:]
+        if len(recent) < frames or any(recent_layout != layout for recent_layout, _ in recent):
+            return False
+
+        for i, row in enumerate(layout):
+            cols = len(row)
+            for j, label in enumerate(row):
+                if self.committed_layout and label == self.committed_layout[i][j]:
+                    continue
+                confidence = sum(_cell_score(scores, i, j, cols) for _, scores in recent) / frames
+                if confidence < self.confidence_margin:
+                    return False
+        return True
+
+    def _current(self, changed: bool) -> Optional[Dict]:
+        """组装以已提交布局为准的结果"""
+        if self.committed_layout is None or self.committed_result is None:
+            return None
+
+        result = dict(self.committed_result)
+        result['cell_labels_str'] = '\n'.join(''.join(row) for row in self.committed_layout)
+        result['layout_changed'] = changed
+        return result
+
+
+def _cell_score(scores, i: int, j: int, cols: int) -> float:
+    """读取格子置信度，兼容二维和展平的一维分数"""
+    try:
+        row = scores[i]
+        if hasattr(row, '__len__'):
+            return float(row[j])
+        return float(scores[i * cols + j])
+    except (IndexError, TypeError):
+        return 1.0
@@ -0,0 +1,45 @@
+"""
+延迟导入工具
+cv2、numpy 等重量级模块在首次访问属性时才真正导入，缩短启动时间
+"""
+
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """模块代理：首次访问属性时导入真实模块"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_name = name
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        """导入并缓存真实模块"""
+        if self._lazy_module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self._lazy_name)
+        return self._lazy_module
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    返回延迟导入的模块代理
+
+    Args:
+        name: 模块名，如 'cv2'
+
+    Returns:
+        模块代理对象，用法与真实模块相同
+    """
+    return LazyModule(name)
@@ -0,0 +1,228 @@
+"""
+运行指标
+Prometheus 文本格式的计数器、仪表和直方图，不依赖 prometheus_client；
+各模块在处理路径上记录耗时和事件，Web界面的 /metrics 输出全部指标
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# 直方图默认分桶（秒）：覆盖从毫秒级的序列化到数秒的引擎搜索
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """指标基类：名称、说明、标签名，按标签值分组保存数据"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(样本名, 标签, 值) 列表"""
+        raise NotImplementedError
+
+    @property
+    def family(self) -> str:
+        """HELP/TYPE 行使用的名称"""
+        return self.name
+
+    def render(self) -> List[str]:
+        """Prometheus 文本格式的行"""
+        lines = [f'# HELP {self.family} {self.documentation}', f'# TYPE {self.family} {self.kind}']
+        for name, labels, value in self.samples():
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """直接设置累计值（用于导出其他对象自己维护的累计计数）"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    @property
+    def family(self) -> str:
+        return self.name + '_total'
+
+    def samples(self):
+        with self._lock:
+            if not self.labelnames and not self._values:
+                return [(self.family, {}, 0)]
+            return [(self.family, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """可增可减的当前值（队列深度、客户端数等）"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            if not self.labelnames and not self._values:
+                return [(self.name, {}, 0)]
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """耗时分布：累计分桶计数、总和与次数"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    result.append((self.name + '_bucket', {**labels, 'le': _format_value(bound)}, cumulative))
+                result.append((self.name + '_sum', labels, total))
+                result.append((self.name + '_count', labels, count))
+        return result
+
+
+class Registry:
+    """指标注册表；输出前先调用各采集函数，把其他对象的统计同步到仪表中"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """注册输出前调用的采集函数"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """全部指标的 Prometheus 文本格式"""
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# 处理路径上的耗时
+CAPTURE_SECONDS = REGISTRY.histogram(
+    'xiangqi_capture_seconds', '取一帧画面的耗时（屏幕截图或视频流解码）', ['source'])
+STAGE_SECONDS = REGISTRY.histogram(
+    'xiangqi_stage_seconds', '分析各阶段的耗时：detect/validate/fen/engine/serialize', ['stage'])
+
+# 引擎
+ENGINE_CRASHES = REGISTRY.counter('xiangqi_engine_crashes', '检测到的引擎进程崩溃次数')
+ENGINE_RESTARTS = REGISTRY.counter('xiangqi_engine_restarts', '引擎进程异常后的自动重启次数')
+
+# 缓存、队列和客户端（输出前由采集函数同步）
+CACHE_REQUESTS = REGISTRY.counter('xiangqi_cache_requests', '缓存查找次数', ['cache', 'result'])
+CACHE_HIT_RATIO = REGISTRY.gauge('xiangqi_cache_hit_ratio', '缓存命中率', ['cache'])
+QUEUE_DEPTH = REGISTRY.gauge('xiangqi_queue_depth', '队列中等待或处理中的元素数', ['queue'])
+CLIENTS = REGISTRY.gauge('xiangqi_clients', '已连接的客户端数', ['kind'])
+
+
+def record_cache(cache: str, hits: float, misses: float):
+    """同步某个缓存的累计命中/未命中次数和命中率"""
+    CACHE_REQUESTS.set_total(hits, cache=cache, result='hit')
+    CACHE_REQUESTS.set_total(misses, cache=cache, result='miss')
+    lookups = hits + misses
+    CACHE_HIT_RATIO.set(hits / lookups if lookups else 0.0, cache=cache)
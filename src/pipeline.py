@@ -0,0 +1,230 @@
+"""
+分级流水线
+采集 -> 检测 -> 引擎 各级在独立线程中运行，级间用有界队列连接，
+下一帧的检测可以与上一帧的引擎搜索重叠执行
+"""
+
+import time
+import logging
+import threading
+import weakref
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import QUEUE_DEPTH, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# 运行中的流水线，输出 /metrics 前把各级队列深度同步到 xiangqi_queue_depth{queue="pipeline_<级名>"}
+_running_pipelines = weakref.WeakSet()
+
+
+class DropOldestQueue:
+    """
+    有界队列，满时丢弃最旧的元素
+
+    实时分析只关心最新的帧：下游跟不上时，积压的旧帧直接丢弃而不是阻塞上游。
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self.maxsize = max(1, maxsize)
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item: Any) -> bool:
+        """
+        放入元素
+
+        Returns:
+            是否因队列已满丢弃了最旧的元素
+        """
+        with self._cond:
+            dropped = len(self._items) >= self.maxsize
+            if dropped:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        return dropped
+
+    def get(self, timeout: Optional[float] = None) -> Tuple[bool, Any]:
+        """
+        取出最早的元素
+
+        Returns:
+            (是否取到, 元素)；超时返回 (False, None)
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return False, None
+            return True, self._items.popleft()
+
+    def clear(self):
+        """清空队列"""
+        with self._cond:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class Stage:
+    """流水线中的一级：输入队列 + 处理函数 + 统计"""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], queue_size: int = 1):
+        self.name = name
+        self.func = func
+        self.queue = DropOldestQueue(queue_size)
+        self.thread: Optional[threading.Thread] = None
+
+        self.processed = 0          # 已处理的元素数
+        self.passed = 0             # 产生输出（交给下一级）的元素数
+        self.errors = 0             # 处理出错的元素数
+        self.last_latency = None    # 最近一次处理耗时（秒）
+        self.avg_latency = None     # 处理耗时的指数滑动平均
+        self.avg_wait = None        # 在输入队列中等待时间的指数滑动平均
+
+    def record(self, wait: float, latency: float):
+        """记录一次处理的排队时间和耗时"""
+        self.processed += 1
+        self.last_latency = latency
+        self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+        self.avg_wait = wait if self.avg_wait is None else 0.8 * self.avg_wait + 0.2 * wait
+
+    def stats(self) -> Dict:
+        """该级的统计快照"""
+        return {
+            'name': self.name,
+            'queue_depth': len(self.queue),
+            'queue_size': self.queue.maxsize,
+            'processed': self.processed,
+            'passed': self.passed,
+            'dropped': self.queue.dropped,
+            'errors': self.errors,
+            'last_latency': self.last_latency,
+            'avg_latency': self.avg_latency,
+            'avg_wait': self.avg_wait
+        }
+
+
+class StagedPipeline:
+    """
+    分级流水线执行器
+
+    每级一个线程，从自己的输入队列取元素，处理函数返回 None 表示该元素到此为止
+    （例如检测未形成稳定布局），否则把返回值放入下一级的队列；最后一级的输出交给 on_result。
+    级间队列有界且丢弃最旧的元素，慢的一级只会处理最新的输入，不会让延迟无限累积。
+
+    元素在流水线中携带提交时间，on_result 收到 (输出, 提交时间)，
+    据此可以统计从采集到出结果的端到端延迟。
+    """
+
+    def __init__(self, stages: List[Tuple[str, Callable[[Any], Any]]], queue_size: int = 1,
+                 on_result: Optional[Callable[[Any, float], None]] = None):
+        """
+        初始化流水线
+
+        Args:
+            stages: [(名称, 处理函数), ...]，按执行顺序排列
+            queue_size: 每级输入队列的容量
+            on_result: 最后一级产生输出时的回调 (输出, 提交时间)
+        """
+        self.stages = [Stage(name, func, queue_size) for name, func in stages]
+        self.on_result = on_result
+        self.running = False
+        self.submitted = 0
+        self.completed = 0
+        self.last_latency = None    # 最近一个元素从提交到出结果的时间（秒）
+
+    def start(self):
+        """启动各级线程"""
+        if self.running:
+            return
+        self.running = True
+        _running_pipelines.add(self)
+        for index, stage in enumerate(self.stages):
+            stage.thread = threading.Thread(target=self._run_stage, args=(index,), daemon=True,
+                                            name=f'pipeline-{stage.name}')
+            stage.thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """停止各级线程（正在处理的元素会处理完）"""
+        self.running = False
+        _running_pipelines.discard(self)
+        for stage in self.stages:
+            if stage.thread:
+                stage.thread.join(timeout=timeout)
+                stage.thread = None
+            stage.queue.clear()
+            QUEUE_DEPTH.set(0, queue=f'pipeline_{stage.name}')
+
+    def submit(self, item: Any, submitted_at: Optional[float] = None) -> bool:
+        """
+        向第一级提交元素
+
+        Args:
+            item: 输入元素（如采集到的帧）
+            submitted_at: 提交时间（如帧的采集时间 time.time()），为空时取当前时间
+
+        Returns:
+            是否因第一级积压丢弃了更早的元素
+        """
+        self.submitted += 1
+        submitted_at = time.time() if submitted_at is None else submitted_at
+        return self.stages[0].queue.put((item, submitted_at, time.time()))
+
+    def _run_stage(self, index: int):
+        """一级的工作线程"""
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        while self.running:
+            ok, entry = stage.queue.get(timeout=0.1)
+            if not ok:
+                continue
+
+            item, submitted_at, enqueued_at = entry
+            start = time.time()
+            try:
+                output = stage.func(item)
+            except Exception as e:
+                stage.errors += 1
+                logger.error(f"流水线 {stage.name} 处理出错: {e}")
+                output = None
+            stage.record(start - enqueued_at, time.time() - start)
+
+            if output is None:
+                continue
+            stage.passed += 1
+
+            if next_stage is not None:
+                next_stage.queue.put((output, submitted_at, time.time()))
+            else:
+                self.completed += 1
+                self.last_latency = time.time() - submitted_at
+                if self.on_result:
+                    try:
+                        self.on_result(output, submitted_at)
+                    except Exception as e:
+                        logger.error(f"流水线结果回调出错: {e}")
+
+    def get_stats(self) -> Dict:
+        """各级队列深度、处理耗时、丢弃数，以及端到端统计"""
+        return {
+            'running': self.running,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'last_latency': self.last_latency,
+            'stages': [stage.stats() for stage in self.stages]
+        }
+
+
+def _collect_queue_depths():
+    """把运行中流水线的各级队列深度同步到指标"""
+    for pipeline in list(_running_pipelines):
+        for stage in pipeline.stages:
+            QUEUE_DEPTH.set(len(stage.queue), queue=f'pipeline_{stage.name}')
+
+
+REGISTRY.add_collector(_collect_queue_depths)
@@ -0,0 +1,294 @@
+"""
+实时预览推送
+按客户端的实测往返时间自适应调整预览的分辨率和JPEG质量，画面未变化时不推送；
+以及所有观看者共享编码结果的 MJPEG 帧源
+"""
+
+from __future__ import annotations
+
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from .lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# 预览档位：(宽, 高, JPEG质量)，从高到低
+PREVIEW_LEVELS: Tuple[Tuple[int, int, int], ...] = (
+    (640, 480, 80),
+    (480, 360, 75),
+    (320, 240, 70),
+    (240, 180, 55),
+    (160, 120, 40),
+)
+DEFAULT_LEVEL = 2
+
+
+def frame_signature(frame: np.ndarray) -> np.ndarray:
+    """缩成 32x24 的灰度图作为画面签名，用于判断画面是否变化"""
+    small = cv2.resize(frame, (32, 24), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.int16)
+
+
+def encode_preview(frame: np.ndarray, level: int) -> bytes:
+    """按档位缩放并编码为JPEG"""
+    width, height, quality = PREVIEW_LEVELS[level]
+    small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    _, buffer = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+class PreviewClient:
+    """一个预览客户端的档位和链路统计"""
+
+    def __init__(self, sid: str, level: int = DEFAULT_LEVEL):
+        self.sid = sid
+        self.level = level
+        self.signature = None       # 上次推送给该客户端的画面签名
+        self.in_flight = False      # 是否有预览已发送、尚未收到确认
+        self.sent_at = 0.0
+        self.sent_bytes = 0
+        self.rtt = None             # 发送到确认的往返时间的指数滑动平均（秒）
+        self.bandwidth = None       # 估计带宽的指数滑动平均（字节/秒）
+        self.fast_acks = 0          # 连续的快速确认次数（达到阈值后提高档位）
+        self.sent = 0
+        self.skipped = 0            # 因上一帧未确认而跳过的帧数
+        self.timeouts = 0
+
+    def status(self) -> Dict:
+        """该客户端的状态快照"""
+        width, height, quality = PREVIEW_LEVELS[self.level]
+        return {
+            'sid': self.sid,
+            'size': [width, height],
+            'quality': quality,
+            'rtt': self.rtt,
+            'bandwidth': self.bandwidth,
+            'sent': self.sent,
+            'skipped': self.skipped,
+            'timeouts': self.timeouts
+        }
+
+
+class PreviewBroadcaster:
+    """
+    自适应预览推送
+
+    - 画面签名与上次推送给该客户端的差异低于 change_threshold 时不推送（新连接的客户端总会收到一帧）；
+    - 预览以二进制JPEG发送（Socket.IO 二进制附件），不再做 base64 编码；
+    - 每个客户端同一时刻最多一帧在途：上一帧未确认时跳过，链路慢时不会在隧道中积压；
+    - 往返时间超过推送间隔的一半时降低档位，连续多次低于推送间隔的 15% 时提高档位；
+    - 同一帧同一档位只编码一次，由该档位的所有客户端共享。
+    """
+
+    def __init__(self, send: Callable[[str, Dict, Callable], None], change_threshold: float = 2.0,
+                 ack_timeout: float = 5.0, upgrade_after: int = 3):
+        """
+        初始化推送器
+
+        Args:
+            send: 发送函数 (sid, 数据, 确认回调)
+            change_threshold: 画面签名的平均灰度差异阈值，低于该值视为未变化
+            ack_timeout: 等待确认的最长时间（秒），超时视为丢失并降低档位
+            upgrade_after: 连续多少次快速确认后提高档位
+        """
+        self.send = send
+        self.change_threshold = change_threshold
+        self.ack_timeout = ack_timeout
+        self.upgrade_after = upgrade_after
+        self.clients: Dict[str, PreviewClient] = {}
+        self._lock = threading.Lock()
+        self.interval = 0.5
+        self.unchanged = 0          # 因画面未变化而未推送的帧数
+        self.encoded = 0            # 实际编码次数
+
+    def add_client(self, sid: str):
+        """注册客户端"""
+        with self._lock:
+            self.clients[sid] = PreviewClient(sid)
+
+    def remove_client(self, sid: str):
+        """移除客户端"""
+        with self._lock:
+            self.clients.pop(sid, None)
+
+    def publish(self, frame: np.ndarray, seq: int, interval: Optional[float] = None) -> int:
+        """
+        推送一帧预览
+
+        Args:
+            frame: BGR 图像
+            seq: 帧序号（与分析结果的 frame_seq 对应）
+            interval: 当前推送间隔（秒），用于判断链路快慢
+
+        Returns:
+            实际发送的客户端数
+        """
+        if interval:
+            self.interval = interval
+        if not self.clients:
+            return 0
+        signature = frame_signature(frame)
+
+        now = time.time()
+        targets = []
+        unchanged = 0
+        with self._lock:
+            for client in self.clients.values():
+                if (client.signature is not None
+                        and float(np.mean(np.abs(signature - client.signature))) <= self.change_threshold):
+                    unchanged += 1
+                    continue
+                if client.in_flight:
+                    if now - client.sent_at < self.ack_timeout:
+                        client.skipped += 1
+                        continue
+                    # 确认超时：视为丢失，降低档位
+                    client.in_flight = False
+                    client.timeouts += 1
+                    client.fast_acks = 0
+                    client.level = min(client.level + 1, len(PREVIEW_LEVELS) - 1)
+                targets.append(client)
+
+        if unchanged and not targets:
+            self.unchanged += 1
+        if not targets:
+            return 0
+
+        encoded = {}
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+        for client in targets:
+            level = client.level
+            if level not in encoded:
+                encoded[level] = encode_preview(frame, level)
+                self.encoded += 1
+            width, height, quality = PREVIEW_LEVELS[level]
+            payload = {'image': encoded[level], 'seq': seq, 'width': width, 'height': height,
+                       'quality': quality, 'timestamp': timestamp}
+
+            with self._lock:
+                client.signature = signature
+                client.in_flight = True
+                client.sent_at = time.time()
+                client.sent_bytes = len(encoded[level])
+                client.sent += 1
+            try:
+                self.send(client.sid, payload, self._ack_callback(client.sid, client.sent_at))
+            except Exception as e:
+                logger.error(f"推送预览失败: {e}")
+                with self._lock:
+                    client.in_flight = False
+        return len(targets)
+
+    def _ack_callback(self, sid: str, sent_at: float) -> Callable:
+        def callback(*args):
+            self.acknowledge(sid, sent_at)
+        return callback
+
+    def acknowledge(self, sid: str, sent_at: float):
+        """客户端确认收到预览：更新往返时间和带宽估计，调整档位"""
+        with self._lock:
+            client = self.clients.get(sid)
+            if client is None or not client.in_flight or client.sent_at != sent_at:
+                return
+            client.in_flight = False
+            rtt = max(time.time() - sent_at, 1e-4)
+            bandwidth = client.sent_bytes / rtt
+            client.rtt = rtt if client.rtt is None else 0.7 * client.rtt + 0.3 * rtt
+            client.bandwidth = bandwidth if client.bandwidth is None else 0.7 * client.bandwidth + 0.3 * bandwidth
+
+            if rtt > 0.5 * self.interval:
+                client.fast_acks = 0
+                if client.level < len(PREVIEW_LEVELS) - 1:
+                    client.level += 1
+                    logger.info(f"📉 预览降档 {client.sid}: {PREVIEW_LEVELS[client.level][:2]}，往返 {rtt:.2f}s")
+            elif rtt < 0.15 * self.interval:
+                client.fast_acks += 1
+                if client.fast_acks >= self.upgrade_after and client.level > 0:
+                    client.level -= 1
+                    client.fast_acks = 0
+            else:
+                client.fast_acks = 0
+
+    def get_stats(self) -> Dict:
+        """推送统计"""
+        with self._lock:
+            clients = [client.status() for client in self.clients.values()]
+        return {'unchanged': self.unchanged, 'encoded': self.encoded, 'clients': clients}
+
+
+class MJPEGSource:
+    """
+    共享的 MJPEG 帧源
+
+    跟随采集线程发布到 FrameSlot 的最新帧，每帧最多编码一次，所有观看者共享同一份JPEG。
+    没有观看者时不编码。
+    """
+
+    boundary = 'frame'
+
+    def __init__(self, slot, max_width: int = 640, quality: int = 75):
+        """
+        初始化帧源
+
+        Args:
+            slot: 采集线程发布帧的 FrameSlot
+            max_width: 输出宽度上限（按比例缩小，不放大）
+            quality: JPEG质量
+        """
+        self.slot = slot
+        self.max_width = max_width
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._jpeg = b''
+        self.encoded = 0
+        self.viewers = 0
+
+    def jpeg(self, frame: np.ndarray, seq: int) -> bytes:
+        """序号为 seq 的帧的JPEG，已编码过则直接返回缓存"""
+        with self._lock:
+            if seq != self._seq:
+                height, width = frame.shape[:2]
+                if width > self.max_width:
+                    frame = cv2.resize(frame, (self.max_width, round(height * self.max_width / width)),
+                                       interpolation=cv2.INTER_AREA)
+                _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                self._jpeg, self._seq = buffer.tobytes(), seq
+                self.encoded += 1
+            return self._jpeg
+
+    def stream(self, active: Callable[[], bool] = lambda: True, timeout: float = 1.0):
+        """
+        multipart/x-mixed-replace 响应体生成器：每有新帧输出一个JPEG分段
+
+        Args:
+            active: 返回 False 时结束（例如服务停止）
+            timeout: 等待新帧的超时（秒），超时后重新检查 active
+        """
+        with self._lock:
+            self.viewers += 1
+        try:
+            seq = 0
+            while active():
+                frame, new_seq, _ = self.slot.wait_newer(seq, timeout=timeout)
+                if frame is None:
+                    continue
+                seq = new_seq
+                data = self.jpeg(frame, seq)
+                yield (f'--{self.boundary}\r\nContent-Type: image/jpeg\r\n'
+                       f'Content-Length: {len(data)}\r\n\r\n').encode() + data + b'\r\n'
+        finally:
+            with self._lock:
+                self.viewers -= 1
+
+    def get_stats(self) -> Dict:
+        """观看者数和编码次数"""
+        return {'viewers': self.viewers, 'encoded': self.encoded, 'seq': self._seq}
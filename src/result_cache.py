@@ -0,0 +1,154 @@
+"""
+分析结果缓存
+同一张截图经常被多次上传，按内容哈希缓存已编码好的响应，重复上传时不再运行检测和引擎
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+
+def bytes_key(data: bytes) -> str:
+    """上传文件原始字节的哈希"""
+    return 'bytes:' + hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def pixels_key(image: np.ndarray) -> str:
+    """
+    解码后像素的哈希
+
+    同一画面重新保存（不同的文件格式、元数据或无损压缩参数）时字节不同，但像素相同。
+    """
+    digest = hashlib.blake2b(str(image.shape).encode(), digest_size=16)
+    digest.update(np.ascontiguousarray(image).data)
+    return 'pixels:' + digest.hexdigest()
+
+
+class ResultCache:
+    """
+    有界的 LRU 结果缓存
+
+    一个结果可以登记在多个键下（如原始字节哈希和像素哈希），按结果计数和计算大小；
+    条目数超过 max_entries 或总大小超过 max_bytes 时淘汰最久未使用的结果。
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最多缓存的结果数
+            max_bytes: 缓存结果的总大小上限（字节，按调用方给出的大小计算）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()   # 编号 -> (结果, 大小, 键)
+        self._keys: Dict[str, int] = {}
+        self._next_id = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, keys: Iterable[str], count_miss: bool = True,
+               valid: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """
+        依次查找多个键，只计一次命中或未命中
+
+        命中时刷新该结果的使用时间，并把其余的键也登记到该结果上，下次可以直接用更便宜的键命中。
+
+        Args:
+            keys: 候选键
+            count_miss: 未命中时是否计数（分两步查找时第一步不计，避免一次请求计两次未命中）
+            valid: 检查结果是否仍可用（如引用的图像已被淘汰）；不可用的结果从缓存中删除，按未命中处理
+        """
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                entry_id = self._keys.get(key)
+                if entry_id is None:
+                    continue
+                value, size, entry_keys = self._entries[entry_id]
+                if valid is not None and not valid(value):
+                    self._drop(entry_id)
+                    continue
+                self._entries.move_to_end(entry_id)
+                for other in keys:
+                    if other not in self._keys:
+                        self._keys[other] = entry_id
+                        entry_keys.add(other)
+                self.hits += 1
+                return value
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def put(self, keys: Iterable[str], value: Any, size: int = 0):
+        """
+        缓存结果
+
+        Args:
+            keys: 该结果的所有键
+            value: 结果（调用方不应再修改）
+            size: 结果大小（字节），用于总大小上限
+        """
+        keys = set(keys)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            for key in keys:
+                self._discard_key(key)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (value, size, keys)
+            for key in keys:
+                self._keys[key] = entry_id
+            self.bytes += size
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, entry_id: int):
+        """删除一个结果及其所有键"""
+        _, size, entry_keys = self._entries.pop(entry_id)
+        self.bytes -= size
+        for key in entry_keys:
+            self._keys.pop(key, None)
+
+    def _discard_key(self, key: str):
+        """把键从原来的结果上摘下；结果不再有键时删除"""
+        entry_id = self._keys.pop(key, None)
+        if entry_id is None:
+            return
+        _, size, entry_keys = self._entries[entry_id]
+        entry_keys.discard(key)
+        if not entry_keys:
+            del self._entries[entry_id]
+            self.bytes -= size
+
+    def clear(self):
+        """清空缓存（例如模型或引擎配置改变后）"""
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+            self.bytes = 0
+
+    def get_stats(self) -> Dict:
+        """条目数、大小和命中率"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
@@ -0,0 +1,193 @@
+"""
+分析结果的精简序列化
+结果按固定的字段表转换为基本类型（不再递归遍历整个结果），用 orjson 编码（未安装时使用标准库 json）；
+图像不再以 base64 内嵌在 JSON 中，而是登记到 ImageStore，按ID和所需宽度单独获取，编码结果缓存复用
+"""
+
+from __future__ import annotations
+
+import re
+import json
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 结果中发送给客户端的文本字段（按顺序）
+RESULT_FIELDS = ('timestamp', 'fen', 'best_move', 'score', 'confidence', 'detect_time',
+                 'layout_pgn', 'layout_2d', 'scores', 'frame_seq', 'capture_latency')
+# 结果中的图像字段，通过 ImageStore 单独提供
+IMAGE_FIELDS = ('original_with_keypoints', 'transformed_board')
+# 可请求的图像宽度，请求的宽度向上取到其中之一，限制每张图的编码版本数
+IMAGE_WIDTHS = (160, 320, 640, 1280)
+
+
+def safe_float(value, default=0.0):
+    """确保值是浮点数"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = re.search(r'(\d+\.?\d*)', value)
+        return float(match.group(1)) if match else default
+    if isinstance(value, (list, tuple)) and len(value) == 1:  # 可能是单元素数组
+        return safe_float(value[0], default)
+    if hasattr(value, 'item') and getattr(value, 'size', 1) == 1:  # numpy 标量
+        return float(value.item())
+    return default
+
+
+def result_summary(result: Dict) -> Dict:
+    """
+    分析结果的文本部分（只含基本类型，可直接编码为JSON）
+
+    只处理 RESULT_FIELDS 中的字段：置信度矩阵用一次 tolist() 整体转换，
+    检测时间和置信度保证为数字（前端直接调用 toFixed），图像字段不包含在内。
+    """
+    summary = {}
+    for field in RESULT_FIELDS:
+        if field not in result:
+            continue
+        value = result[field]
+        if field in ('detect_time', 'confidence'):
+            value = safe_float(value, 0.0)
+        elif field == 'scores':
+            value = np.asarray(value, dtype=np.float64).round(4).tolist()
+        elif hasattr(value, 'item') and getattr(value, 'size', 0) == 1:
+            value = value.item()
+        summary[field] = value
+    return summary
+
+
+def _json_default(obj):
+    """标准库 json 遇到 numpy 类型时的转换"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'无法序列化 {type(obj).__name__}')
+
+
+def dumps(obj: Any) -> bytes:
+    """编码为 UTF-8 JSON；安装了 orjson 时使用 orjson（直接支持 numpy 数组）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, default=_json_default).encode('utf-8')
+
+
+class ImageStore:
+    """
+    结果图像存储
+
+    登记时每张图编码一次JPEG（宽度不超过最大档），之后按请求的宽度从该JPEG缩小编码并缓存，
+    同一张图同一宽度只编码一次。按总字节数淘汰最早登记的结果。
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, quality: int = 85):
+        """
+        初始化存储
+
+        Args:
+            max_bytes: 所有已编码图像的总大小上限（字节）
+            quality: JPEG质量
+        """
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, tuple]]" = OrderedDict()
+        self.bytes = 0
+        self.encoded = 0
+        self.served = 0
+        self.expired = 0
+
+    def _encode(self, image: np.ndarray, width: int) -> bytes:
+        """缩小到不超过 width 并编码为JPEG"""
+        height, original_width = image.shape[:2]
+        if original_width > width:
+            image = cv2.resize(image, (width, round(height * width / original_width)),
+                               interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        self.encoded += 1
+        return buffer.tobytes()
+
+    def add(self, result: Dict) -> Optional[str]:
+        """
+        登记结果中的图像
+
+        Returns:
+            图像ID；结果中没有图像时返回 None
+        """
+        images = {name: (min(result[name].shape[1], IMAGE_WIDTHS[-1]),
+                         self._encode(result[name], IMAGE_WIDTHS[-1]))
+                  for name in IMAGE_FIELDS if result.get(name) is not None}
+        if not images:
+            return None
+
+        image_id = uuid.uuid4().hex
+        with self._lock:
+            # 每张图：(登记版本的宽度, {宽度: JPEG})，宽度 0 表示登记时的版本
+            self._entries[image_id] = {name: (width, {0: data}) for name, (width, data) in images.items()}
+            self.bytes += sum(len(data) for _, data in images.values())
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self.bytes -= sum(len(data) for _, versions in old.values() for data in versions.values())
+        return image_id
+
+    def has(self, image_id: str) -> bool:
+        """图像是否仍在存储中"""
+        return image_id in self._entries
+
+    def get(self, image_id: str, name: str, width: Optional[int] = None) -> Optional[bytes]:
+        """
+        获取图像的JPEG
+
+        Args:
+            image_id: 图像ID
+            name: 图像字段名
+            width: 所需宽度（向上取到 IMAGE_WIDTHS 中的一档），为空时返回登记时的版本
+
+        Returns:
+            JPEG数据；图像不存在或已被淘汰时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(image_id, {}).get(name)
+            if entry is None:
+                self.expired += 1
+                return None
+            self.served += 1
+            base_width, versions = entry
+            if width:
+                width = next((w for w in IMAGE_WIDTHS if w >= width), IMAGE_WIDTHS[-1])
+            if not width or width >= base_width:
+                return versions[0]
+            if width in versions:
+                return versions[width]
+            base = versions[0]
+
+        # 从登记时的JPEG缩小，在锁外编码
+        data = self._encode(cv2.imdecode(np.frombuffer(base, np.uint8), cv2.IMREAD_COLOR), width)
+        with self._lock:
+            if image_id in self._entries and width not in versions:
+                versions[width] = data
+                self.bytes += len(data)
+        return data
+
+    def get_stats(self) -> Dict:
+        """存储的结果数、大小和编码次数"""
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'encoded': self.encoded,
+            'served': self.served,
+            'expired': self.expired,
+            'encoder': 'orjson' if orjson is not None else 'json'
+        }
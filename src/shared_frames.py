@@ -0,0 +1,385 @@
+"""
+跨进程帧传输
+采集在独立进程中运行，通过 multiprocessing.shared_memory 环形缓冲区发布帧，
+分析进程直接从共享内存复制帧，不经过管道序列化，采集不再与Web服务器、识别器争抢GIL
+"""
+
+from __future__ import annotations
+
+import time
+import logging
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+from .lazy_import import lazy_import
+from .stream_processor import FrameSlot, FrameSource, create_stream_processor
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# 控制区：[最新序号, 解码请求标志, 写端已关闭标志, 各槽位序号...]
+_LATEST, _REQUEST, _CLOSED, _SLOTS = 0, 1, 2, 3
+
+
+class SharedFrameRing:
+    """
+    共享内存环形帧缓冲
+
+    内存布局：int64 控制区 + float64 采集时间 + float64 流时间戳（PTS，未知为 NaN）
+    + num_slots 个固定尺寸的帧槽位。写端把第 seq 帧写入槽位 seq % num_slots：
+    写入前把槽位序号置为 -seq，写完再置为 seq，最后更新最新序号。
+
+    读端把槽位复制出来，复制完成后再检查一次槽位序号：序号未变说明复制期间写端没有覆盖该槽位，
+    得到的是一份完整的帧；否则重新读取。返回的帧归调用方所有，可以长期持有。
+    最近 num_slots 帧同时作为按时间点取帧的历史（closest）。只支持一个写端。
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, shape: Tuple[int, ...], num_slots: int, owner: bool):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.num_slots = num_slots
+        self.owner = owner
+
+        ctrl_size = (_SLOTS + num_slots) * 8
+        self._ctrl = np.ndarray((_SLOTS + num_slots,), dtype=np.int64, buffer=shm.buf)
+        self._stamps = np.ndarray((num_slots,), dtype=np.float64, buffer=shm.buf, offset=ctrl_size)
+        self._pts = np.ndarray((num_slots,), dtype=np.float64, buffer=shm.buf, offset=ctrl_size + num_slots * 8)
+        self._frames = np.ndarray((num_slots,) + self.shape, dtype=np.uint8, buffer=shm.buf,
+                                  offset=ctrl_size + num_slots * 16)
+        if not owner:
+            self._frames.flags.writeable = False
+
+    @staticmethod
+    def _size(shape: Tuple[int, ...], num_slots: int) -> int:
+        return (_SLOTS + num_slots) * 8 + num_slots * 16 + num_slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...], num_slots: int = 8) -> 'SharedFrameRing':
+        """创建缓冲区（写端调用，负责最终 unlink）"""
+        shm = shared_memory.SharedMemory(create=True, size=cls._size(shape, num_slots))
+        ring = cls(shm, shape, num_slots, owner=True)
+        ring._ctrl[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, shape: Tuple[int, ...], num_slots: int = 8) -> 'SharedFrameRing':
+        """
+        连接已有的缓冲区（读端调用）
+
+        采集进程由读端进程 spawn，二者共用同一个 resource_tracker：连接时的登记与创建方的登记合并，
+        创建方 unlink 时一并注销；采集进程异常退出时，由 resource_tracker 在退出时清理。
+        """
+        return cls(shared_memory.SharedMemory(name=name), shape, num_slots, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def publish(self, frame: np.ndarray, timestamp: Optional[float] = None, pts: Optional[float] = None) -> int:
+        """
+        写入新帧
+
+        Args:
+            frame: 图像，尺寸必须与缓冲区一致
+            timestamp: 采集时间（time.time()），为空时取当前时间
+            pts: 流时间戳（秒），未知时为空
+
+        Returns:
+            新帧序号
+        """
+        if frame.shape != self.shape:
+            raise ValueError(f"帧尺寸 {frame.shape} 与缓冲区 {self.shape} 不一致")
+
+        seq = int(self._ctrl[_LATEST]) + 1
+        slot = seq % self.num_slots
+        self._ctrl[_SLOTS + slot] = -seq
+        self._frames[slot] = frame
+        self._stamps[slot] = time.time() if timestamp is None else timestamp
+        self._pts[slot] = float('nan') if pts is None else pts
+        self._ctrl[_SLOTS + slot] = seq
+        self._ctrl[_LATEST] = seq
+        return seq
+
+    def _read(self, seq: int) -> Optional[Tuple[np.ndarray, float]]:
+        """复制序号为 seq 的帧及其采集时间；该帧已被覆盖或正在被覆盖时返回 None"""
+        slot = seq % self.num_slots
+        if self._ctrl[_SLOTS + slot] != seq:
+            return None
+        frame, timestamp = self._frames[slot].copy(), float(self._stamps[slot])
+        # 复制期间写端绕回了该槽位，副本可能是新旧两帧拼起来的
+        if self._ctrl[_SLOTS + slot] != seq:
+            return None
+        return frame, timestamp
+
+    def latest(self) -> Tuple[Optional[np.ndarray], int, float]:
+        """返回 (最新帧的副本, 序号, 采集时间)，尚无帧时帧为 None、序号为 0"""
+        while True:
+            seq = int(self._ctrl[_LATEST])
+            if seq == 0:
+                return None, 0, 0.0
+            read = self._read(seq)
+            if read is not None:
+                return read[0], seq, read[1]
+
+    def latest_seq(self) -> int:
+        """最新帧的序号（不复制帧），尚无帧时为 0"""
+        return int(self._ctrl[_LATEST])
+
+    def pts(self, seq: int) -> Optional[float]:
+        """序号为 seq 的帧的流时间戳，已被覆盖或未知时返回 None"""
+        slot = seq % self.num_slots
+        value = float(self._pts[slot])
+        if seq <= 0 or self._ctrl[_SLOTS + slot] != seq or value != value:
+            return None
+        return value
+
+    def closest(self, target: float, clock: str = 'capture') -> Tuple[Optional[np.ndarray], int, float]:
+        """
+        缓冲区中时间最接近 target 的帧（与 FrameSlot.closest 相同）
+
+        Args:
+            target: 目标时间
+            clock: 'capture' 按采集时间比较，'pts' 按流时间戳比较（PTS 未知的帧退回采集时间）
+
+        Returns:
+            (帧的副本, 序号, 采集时间)；没有帧时返回 (None, 0, 0.0)
+        """
+        while True:
+            candidates = []
+            for slot in range(self.num_slots):
+                seq = int(self._ctrl[_SLOTS + slot])
+                if seq <= 0:
+                    continue
+                stamp = self.pts(seq) if clock == 'pts' else None
+                candidates.append((abs((float(self._stamps[slot]) if stamp is None else stamp) - target), seq))
+            if not candidates:
+                return None, 0, 0.0
+            seq = min(candidates)[1]
+            read = self._read(seq)
+            if read is not None:
+                return read[0], seq, read[1]
+
+    def wait_newer(self, seq: int, timeout: Optional[float] = None,
+                   poll_interval: float = 0.002) -> Tuple[Optional[np.ndarray], int, float]:
+        """
+        等待序号大于 seq 的帧（跨进程没有条件变量，以 poll_interval 轮询控制区）
+
+        Returns:
+            (帧的副本, 序号, 采集时间)；超时或写端已关闭时返回 (None, seq, 0.0)
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self._ctrl[_LATEST] <= seq:
+            if self.closed or (deadline is not None and time.time() >= deadline):
+                return None, seq, 0.0
+            time.sleep(poll_interval)
+        return self.latest()
+
+    def valid(self, seq: int) -> bool:
+        """序号为 seq 的帧是否仍完整保存在缓冲区中"""
+        return seq > 0 and self._ctrl[_SLOTS + seq % self.num_slots] == seq
+
+    def request(self):
+        """读端请求写端尽快提供新帧（按需解码时使用）"""
+        self._ctrl[_REQUEST] = 1
+
+    def take_request(self) -> bool:
+        """写端检查并清除解码请求"""
+        if self._ctrl[_REQUEST]:
+            self._ctrl[_REQUEST] = 0
+            return True
+        return False
+
+    @property
+    def closed(self) -> bool:
+        """写端是否已关闭"""
+        return bool(self._ctrl[_CLOSED])
+
+    def mark_closed(self):
+        self._ctrl[_CLOSED] = 1
+
+    def close(self):
+        """释放本进程的映射，创建方同时删除共享内存"""
+        # 先释放指向共享内存的数组，否则 SharedMemory.close() 会因缓冲区仍被引用而失败
+        self._ctrl = self._stamps = self._pts = self._frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            logger.warning("仍有数组引用共享内存，映射将在其释放后回收")
+        if self.owner:
+            self.shm.unlink()
+
+
+def _capture_main(stream_url: str, backend: str, kwargs: dict, num_slots: int, conn, stop_event):
+    """
+    采集进程入口：打开流，把每一帧写入共享内存环形缓冲区
+
+    通过 conn 回传 ('ready', 共享内存名, 帧尺寸, 帧率) 或 ('error', 原因)，
+    之后每秒回传一次 ('health', 流健康统计)，由父进程的接收线程持续读取，管道不会写满阻塞采集。
+    """
+    processor = create_stream_processor(stream_url, backend=backend, **kwargs)
+    if not processor.start():
+        conn.send(('error', f'无法打开视频流: {stream_url}'))
+        return
+
+    frame, seq, timestamp = processor.get_latest()
+    ring = SharedFrameRing.create(frame.shape, num_slots)
+    try:
+        ring.publish(frame, timestamp, processor.frame_slot.pts(seq))
+        conn.send(('ready', ring.name, frame.shape, processor.fps))
+        health_sent = time.time()
+
+        while not stop_event.is_set() and processor.is_running():
+            if ring.take_request():
+                processor.request_frame()
+
+            if time.time() - health_sent >= 1.0:
+                conn.send(('health', processor.get_health()))
+                health_sent = time.time()
+
+            # 直接等待帧槽，不触发按需解码请求（只转发读端的请求）
+            frame, seq, timestamp = processor.frame_slot.wait_newer(seq, timeout=0.02)
+            if frame is None:
+                continue
+            processor.last_read_seq = seq
+
+            # 分辨率变化（如重连后）时缩放到缓冲区尺寸
+            if frame.shape != ring.shape:
+                frame = cv2.resize(frame, (ring.shape[1], ring.shape[0]))
+            ring.publish(frame, timestamp, processor.frame_slot.pts(seq))
+    finally:
+        ring.mark_closed()
+        processor.stop()
+        ring.close()
+
+
+class SharedStreamCapture(FrameSource):
+    """
+    独立进程的流采集
+
+    接口与 RTMPStreamProcessor 一致（start / get_latest / wait_for_frame / get_frame_at_interval /
+    get_frame_near / frame_slot / fps / stop ...），解码在子进程中进行，帧经共享内存传回，
+    读取时复制一份交给调用方。按时间点取帧的历史为共享内存中的 num_slots 帧。
+    """
+
+    def __init__(self, stream_url: str, backend: str = 'opencv', num_slots: int = 8,
+                 start_timeout: float = 15.0, **kwargs):
+        """
+        初始化
+
+        Args:
+            stream_url: 流地址
+            backend: 子进程中使用的流处理后端（'opencv' / 'ffmpeg'）
+            num_slots: 共享内存槽位数
+            start_timeout: 等待子进程打开流的超时（秒）
+            **kwargs: 传给子进程中流处理器的参数
+        """
+        self.stream_url = stream_url
+        self.backend = backend
+        self.num_slots = num_slots
+        self.start_timeout = start_timeout
+        self.kwargs = kwargs
+
+        self.process = None
+        self.ring: Optional[SharedFrameRing] = None
+        self.frame_slot = FrameSlot()   # 启动后换成 ring（读接口相同），停止后恢复为空
+        self.fps = 0
+        self.last_read_seq = 0
+        self.last_interval_seq = 0
+        self.last_interval_time = 0.0
+        self._stop_event = None
+        self._conn = None
+        self._health_thread = None
+        self._health = {}
+
+    def start(self) -> bool:
+        """启动采集进程并连接共享内存"""
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        self._stop_event = context.Event()
+        self.process = context.Process(
+            target=_capture_main, name='stream-capture', daemon=True,
+            args=(self.stream_url, self.backend, self.kwargs, self.num_slots, child_conn, self._stop_event)
+        )
+        self.process.start()
+        child_conn.close()
+
+        try:
+            if not parent_conn.poll(self.start_timeout):
+                raise RuntimeError("等待采集进程超时")
+            message = parent_conn.recv()
+        except (EOFError, RuntimeError) as e:
+            logger.error(f"采集进程启动失败: {e}")
+            self.stop()
+            return False
+
+        if message[0] != 'ready':
+            logger.error(f"采集进程启动失败: {message[1]}")
+            self.stop()
+            return False
+
+        _, name, shape, self.fps = message
+        self._start_health_receiver(parent_conn)
+        self.ring = self.frame_slot = SharedFrameRing.attach(name, shape, self.num_slots)
+        logger.info(f"✅ 采集进程已启动 (pid={self.process.pid})，共享内存 {name} {shape}")
+        return True
+
+    def request_frame(self):
+        """请求采集进程解码下一帧"""
+        if self.ring is not None:
+            self.ring.request()
+
+    def _start_health_receiver(self, conn):
+        """启动接收线程持续读取采集进程回传的消息，避免无人查询状态时管道写满、子进程阻塞在 send"""
+        self._conn = conn
+        self._health_thread = threading.Thread(target=self._receive_health, args=(conn,),
+                                               name='stream-health', daemon=True)
+        self._health_thread.start()
+
+    def _receive_health(self, conn):
+        """接收线程：只保留最近一次健康统计，子进程退出（管道关闭）时结束"""
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            if message[0] == 'health':
+                self._health = message[1]
+
+    def get_health(self) -> dict:
+        """采集进程最近一次回传的流健康统计"""
+        health = dict(self._health)
+        if not self.is_running():
+            health['state'] = 'stopped'
+        return health
+
+    def is_running(self) -> bool:
+        """采集进程是否仍在运行"""
+        return (self.process is not None and self.process.is_alive()
+                and self.ring is not None and not self.ring.closed)
+
+    def stop(self):
+        """停止采集进程并释放共享内存"""
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self.process is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=1)
+            self.process = None
+        if self._health_thread is not None:
+            # 子进程退出后管道关闭，接收线程随之结束
+            self._health_thread.join(timeout=1)
+            self._health_thread = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+            self.frame_slot = FrameSlot()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        logger.info("✅ 采集进程已停止")
@@ -3,76 +3,416 @@ RTMP流处理器
 支持从RTMP/RTSP等视频流中截取图像
 """
 
-import cv2
-import numpy as np
+from __future__ import annotations
+
+import importlib
 import threading
-import queue
 import time
+import random
 import logging
-from typing import Optional, Tuple, Callable
+from collections import deque
+from typing import Callable, List, Optional, Tuple
 from pathlib import Path
 
+from .lazy_import import lazy_import
+from .metrics import CAPTURE_SECONDS
+
+# 重量级依赖延迟导入，首次使用时才加载
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
 logger = logging.getLogger(__name__)
 
 
-class RTMPStreamProcessor:
+class FrameSlot:
+    """
+    单槽最新帧缓冲
+
+    只保存最新一帧及其序号和采集时间。读取最新帧不加锁、O(1)；
+    需要等待新帧的消费者通过条件变量阻塞，不会忙等。
+    帧以引用方式共享，消费者不应原地修改返回的图像。
+
+    history > 1 时额外保留最近若干帧及其流时间戳（PTS），用于按时间点取帧。
+    """
+
+    def __init__(self, history: int = 1):
+        self._cond = threading.Condition()
+        # (帧, 序号, 采集时间)，整体替换，读取时无需加锁
+        self._latest: Tuple[Optional[np.ndarray], int, float] = (None, 0, 0.0)
+        # 最近的 (帧, 序号, 采集时间, PTS)
+        self._history = deque(maxlen=max(1, history))
+        # 发布新帧后调用的回调（如多路流调度器唤醒等待中的工作线程）
+        self._listeners: List[Callable[[], None]] = []
+
+    def publish(self, frame: np.ndarray, timestamp: Optional[float] = None, pts: Optional[float] = None) -> int:
+        """
+        发布新帧
+
+        Args:
+            frame: 视频帧
+            timestamp: 采集时间（time.time()），为空时取当前时间
+            pts: 流时间戳（秒），未知时为空
+
+        Returns:
+            新帧序号
+        """
+        with self._cond:
+            seq = self._latest[1] + 1
+            self._latest = (frame, seq, time.time() if timestamp is None else timestamp)
+            self._history.append(self._latest + (pts,))
+            self._cond.notify_all()
+        # 在锁外调用，回调可以获取自己的锁
+        for listener in self._listeners:
+            listener()
+        return seq
+
+    def add_listener(self, listener: Callable[[], None]):
+        """注册发布新帧后调用的无参回调（在发布线程中调用，应当很快返回）"""
+        self._listeners = self._listeners + [listener]
+
+    def remove_listener(self, listener: Callable[[], None]):
+        """注销回调"""
+        self._listeners = [item for item in self._listeners if item is not listener]
+
+    def pts(self, seq: int) -> Optional[float]:
+        """序号为 seq 的帧的流时间戳，不在历史中或未知时返回 None"""
+        for entry in reversed(self._history):
+            if entry[1] == seq:
+                return entry[3]
+        return None
+
+    def closest(self, target: float, clock: str = 'capture') -> Tuple[Optional[np.ndarray], int, float]:
+        """
+        历史中时间最接近 target 的帧
+
+        Args:
+            target: 目标时间
+            clock: 'capture' 按采集时间（time.time()）比较，'pts' 按流时间戳比较
+                （PTS 未知的帧退回采集时间）
+
+        Returns:
+            (帧, 序号, 采集时间)；没有帧时返回 (None, 0, 0.0)
+        """
+        with self._cond:
+            entries = [entry for entry in self._history if entry[0] is not None]
+        if not entries:
+            return None, 0, 0.0
+
+        def stamp(entry):
+            return entry[3] if clock == 'pts' and entry[3] is not None else entry[2]
+
+        frame, seq, timestamp, _ = min(entries, key=lambda entry: abs(stamp(entry) - target))
+        return frame, seq, timestamp
+
+    def latest(self) -> Tuple[Optional[np.ndarray], int, float]:
+        """返回 (最新帧, 序号, 采集时间)，尚无帧时帧为 None、序号为 0"""
+        return self._latest
+
+    def latest_seq(self) -> int:
+        """最新帧的序号（不取帧），尚无帧时为 0"""
+        return self._latest[1]
+
+    def wait_newer(self, seq: int, timeout: Optional[float] = None) -> Tuple[Optional[np.ndarray], int, float]:
+        """
+        等待序号大于 seq 的帧
+
+        Args:
+            seq: 已经处理过的帧序号
+            timeout: 最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            (帧, 序号, 采集时间)；超时返回 (None, seq, 0.0)
+        """
+        latest = self._latest
+        if latest[1] > seq:
+            return latest
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._latest[1] > seq, timeout):
+                return None, seq, 0.0
+            return self._latest
+
+    def clear(self):
+        """丢弃当前帧（序号保持递增）"""
+        with self._cond:
+            self._latest = (None, self._latest[1], 0.0)
+            self._history.clear()
+
+
+class StreamHealth:
+    """
+    流连接状态机和健康统计
+
+    状态：idle（未启动）-> connecting（首次连接）-> streaming（正常出帧）
+    -> reconnecting（读取失败，退避等待后重连）-> streaming ... -> stopped。
+    从第一次读取失败到重新出帧的时间记为一次卡顿（stall）。
+    """
+
+    IDLE = 'idle'
+    CONNECTING = 'connecting'
+    STREAMING = 'streaming'
+    RECONNECTING = 'reconnecting'
+    STOPPED = 'stopped'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = self.IDLE
+        self.state_since = time.time()
+        self.reconnects = 0           # 重连尝试次数
+        self.reconnect_failures = 0   # 重连失败次数
+        self.stalls = 0               # 卡顿次数
+        self.stall_total = 0.0        # 累计卡顿时长（秒）
+        self.stall_longest = 0.0      # 最长一次卡顿（秒）
+        self.stall_started = None     # 当前卡顿的开始时间
+        self.last_frame_at = None
+
+    def set_state(self, state: str):
+        """切换状态"""
+        with self._lock:
+            if state != self.state:
+                self.state = state
+                self.state_since = time.time()
+
+    def frame_ok(self, now: float):
+        """成功读到一帧：结束卡顿，回到 streaming"""
+        self.last_frame_at = now
+        if self.state == self.STREAMING:
+            return
+
+        with self._lock:
+            if self.stall_started is not None:
+                duration = now - self.stall_started
+                self.stall_total += duration
+                self.stall_longest = max(self.stall_longest, duration)
+                self.stall_started = None
+            self.state = self.STREAMING
+            self.state_since = now
+
+    def read_failed(self, now: float):
+        """读取失败：开始（或延续）一次卡顿"""
+        with self._lock:
+            if self.stall_started is None:
+                self.stall_started = now
+                self.stalls += 1
+            if self.state != self.RECONNECTING:
+                self.state = self.RECONNECTING
+                self.state_since = now
+
+    def reconnected(self, ok: bool):
+        """记录一次重连尝试"""
+        with self._lock:
+            self.reconnects += 1
+            if not ok:
+                self.reconnect_failures += 1
+
+    def to_dict(self) -> dict:
+        """状态快照"""
+        now = time.time()
+        with self._lock:
+            current_stall = now - self.stall_started if self.stall_started is not None else 0.0
+            return {
+                'state': self.state,
+                'state_duration': now - self.state_since,
+                'reconnects': self.reconnects,
+                'reconnect_failures': self.reconnect_failures,
+                'stalls': self.stalls,
+                'stall_total': self.stall_total + current_stall,
+                'stall_longest': max(self.stall_longest, current_stall),
+                'current_stall': current_stall,
+                'last_frame_age': now - self.last_frame_at if self.last_frame_at else None
+            }
+
+
+class FrameSource:
+    """
+    帧读取接口：最新帧、等待新帧、按间隔取帧、按时间点取帧
+
+    子类提供 frame_slot（FrameSlot 或读接口相同的对象）和 request_frame()，
+    并初始化 last_read_seq、last_interval_seq、last_interval_time。
+    """
+
+    def add_frame_listener(self, listener: Callable[[], None]) -> bool:
+        """
+        注册新帧回调
+
+        Returns:
+            是否支持（帧槽在其他进程中时无法回调，调用方需要自行轮询）
+        """
+        add = getattr(self.frame_slot, 'add_listener', None)
+        if add is None:
+            return False
+        add(listener)
+        return True
+
+    def _mark_read(self, latest: Tuple) -> Tuple[Optional[np.ndarray], int, float]:
+        """记录消费者读取到的帧序号"""
+        if latest[1] > self.last_read_seq:
+            self.last_read_seq = latest[1]
+        return latest
+    
+    def get_latest_frame(self) -> Optional[np.ndarray]:
+        """获取最新的视频帧"""
+        return self.get_latest()[0]
+    
+    def get_latest(self) -> Tuple[Optional[np.ndarray], int, float]:
+        """获取最新帧及其序号和采集时间"""
+        return self._mark_read(self.frame_slot.latest())
+    
+    def latest_seq(self) -> int:
+        """最新帧的序号：不复制帧，也不计为已读取（调度时判断是否有新帧）"""
+        return self.frame_slot.latest_seq()
+    
+    def wait_for_frame(self, after_seq: int, timeout: Optional[float] = None) -> Tuple[Optional[np.ndarray], int, float]:
+        """
+        等待比 after_seq 更新的帧
+        
+        Args:
+            after_seq: 已经处理过的帧序号
+            timeout: 最长等待时间（秒）
+            
+        Returns:
+            (帧, 序号, 采集时间)；超时返回 (None, after_seq, 0.0)
+        """
+        if self.frame_slot.latest()[1] <= after_seq:
+            self.request_frame()
+        return self._mark_read(self.frame_slot.wait_newer(after_seq, timeout))
+    
+    def _stamp(self, seq: int, timestamp: float, clock: str) -> float:
+        """按指定时钟取帧的时间：'capture' 为采集时间，'pts' 为流时间戳（未知时退回采集时间）"""
+        if clock == 'pts':
+            pts = self.frame_slot.pts(seq)
+            if pts is not None:
+                return pts
+        return timestamp
+    
+    def get_frame_at_interval(self, interval_seconds: float, clock: str = 'capture') -> Optional[np.ndarray]:
+        """
+        按固定间隔获取帧（每 N 秒一帧）
+        
+        返回的帧与上次返回的帧之间至少相隔 interval_seconds，最新帧还不够新时最多等待一个间隔。
+        
+        Args:
+            interval_seconds: 间隔时间（秒）
+            clock: 'capture' 按采集时间计算间隔，'pts' 按流时间戳计算
+                （回放文件等读取速度与实际时长不一致的源应使用 'pts'）
+            
+        Returns:
+            视频帧或None
+        """
+        frame, seq, timestamp = self.get_latest()
+        
+        if self.last_interval_seq:
+            deadline = time.time() + interval_seconds
+            while (frame is None or seq <= self.last_interval_seq
+                   or self._stamp(seq, timestamp, clock) - self.last_interval_time < interval_seconds):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                frame, seq, timestamp = self.wait_for_frame(seq, remaining)
+                if frame is None:
+                    return None
+        
+        if frame is not None:
+            self.last_interval_seq = seq
+            self.last_interval_time = self._stamp(seq, timestamp, clock)
+        return frame
+    
+    def get_frame_near(self, target: float, clock: str = 'capture',
+                       timeout: float = 1.0) -> Tuple[Optional[np.ndarray], int, float]:
+        """
+        获取时间最接近 target 的帧
+        
+        target 晚于最新帧时，最多等待 timeout 秒直到出现不早于 target 的帧；
+        target 早于最新帧时，从最近 history_size 帧中选取。
+        
+        Args:
+            target: 目标时间（clock='capture' 时为 time.time() 时间，'pts' 时为流时间戳秒数）
+            clock: 'capture' 或 'pts'
+            timeout: 等待未来帧的最长时间（秒）
+            
+        Returns:
+            (帧, 序号, 采集时间)；没有帧时返回 (None, 0, 0.0)
+        """
+        frame, seq, timestamp = self.get_latest()
+        deadline = time.time() + timeout
+        while frame is None or self._stamp(seq, timestamp, clock) < target:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            newer = self.wait_for_frame(seq, remaining)
+            if newer[0] is None:
+                break
+            frame, seq, timestamp = newer
+        
+        return self._mark_read(self.frame_slot.closest(target, clock))
+
+
+class RTMPStreamProcessor(FrameSource):
     """RTMP/RTSP流处理器"""
+
+    # 重连退避：第 n 次连续失败后等待 min(上限, 基数 * 2^(n-1)) 的 50%~100%（随机抖动）
+    backoff_base = 0.5
+    backoff_max = 30.0
     
-    def __init__(self, stream_url: str, buffer_size: int = 5):
+    def __init__(self, stream_url: str, buffer_size: int = 1, sample_interval: Optional[float] = None,
+                 history_size: int = 1):
         """
         初始化流处理器
         
         Args:
             stream_url: RTMP/RTSP流地址
-            buffer_size: 图像缓冲区大小
+            buffer_size: 保留参数，兼容旧调用（现在只缓存最新一帧）
+            sample_interval: 采样间隔（秒）。设置后进入按需解码模式：每帧只 grab()
+                推进流位置，到达采样间隔或有消费者等待新帧时才 retrieve() 解码
+            history_size: 保留最近多少帧供 get_frame_near 按时间点选取
         """
         self.stream_url = stream_url
         self.buffer_size = buffer_size
+        self.sample_interval = sample_interval
+        self.frame_requested = threading.Event()
+        self.last_decode_time = 0.0
         
         self.cap = None
-        self.frame_queue = queue.Queue(maxsize=buffer_size)
+        self.frame_slot = FrameSlot(history_size)
+        self.last_interval_seq = 0  # get_frame_at_interval 上次返回的帧序号
+        self.last_interval_time = 0.0  # 及其采集时间
         self.running = False
         self.thread = None
         
         self.fps = 0
-        self.frame_count = 0
+        self.frame_count = 0    # 读取（grab）的帧数
+        self.decoded_count = 0  # 实际解码的帧数
+        self.dropped_count = 0  # 解码后还没被读取就被新帧覆盖的帧数
+        self.last_read_seq = 0  # 消费者最近读取的帧序号
         self.width = 0
         self.height = 0
         
+        self.health = StreamHealth()
+        self.failed_attempts = 0  # 连续重连失败次数，决定退避时长
+        self._wakeup = threading.Event()  # stop() 时打断退避等待
+        
         logger.info(f"RTMP处理器初始化 - 流地址: {stream_url}")
     
     def start(self) -> bool:
         """启动流处理"""
         try:
-            # 打开视频流
-            self.cap = cv2.VideoCapture(self.stream_url)
-            
-            if not self.cap.isOpened():
-                logger.error(f"无法打开视频流: {self.stream_url}")
+            self.health.set_state(StreamHealth.CONNECTING)
+            if not self._open():
+                self.health.set_state(StreamHealth.STOPPED)
                 return False
             
-            # 获取视频信息
-            self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            self.fps = self.cap.get(cv2.CAP_PROP_FPS)
-            
-            if self.fps == 0:
-                self.fps = 30  # 默认FPS
-            
             logger.info(f"视频流打开成功 - 分辨率: {self.width}x{self.height}, FPS: {self.fps}")
             
             # 启动读取线程
             self.running = True
+            self._wakeup.clear()
             self.thread = threading.Thread(target=self._read_frames, daemon=True)
             self.thread.start()
             
             # 等待第一帧
-            timeout = 10
-            start_time = time.time()
-            while self.frame_queue.empty() and time.time() - start_time < timeout:
-                time.sleep(0.1)
+            frame, _, _ = self.frame_slot.wait_newer(0, timeout=10)
             
-            if self.frame_queue.empty():
+            if frame is None:
                 logger.error("等待第一帧超时")
                 self.stop()
                 return False
@@ -84,39 +424,118 @@ class RTMPStreamProcessor:
             logger.error(f"启动流处理器失败: {e}")
             return False
     
+    def _open(self) -> bool:
+        """打开视频流并读取流信息"""
+        self.cap = cv2.VideoCapture(self.stream_url)
+        
+        if not self.cap.isOpened():
+            logger.error(f"无法打开视频流: {self.stream_url}")
+            return False
+        
+        # 获取视频信息
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        
+        if self.fps == 0:
+            self.fps = 30  # 默认FPS
+        
+        return True
+    
+    def _close(self):
+        """释放视频流"""
+        if self.cap:
+            self.cap.release()
+    
     def _read_frames(self):
         """读取视频帧的线程函数"""
         while self.running:
             try:
-                ret, frame = self.cap.read()
+                ret = self.cap.grab()
                 
                 if not ret:
-                    logger.warning("无法读取视频帧，尝试重新连接...")
-                    time.sleep(1)
-                    self._reconnect()
+                    self._handle_read_failure()
                     continue
                 
                 self.frame_count += 1
+                captured_at = time.time()
+                self._frame_ok(captured_at)
                 
-                # 如果队列满了，移除最旧的帧
-                if self.frame_queue.full():
-                    try:
-                        self.frame_queue.get_nowait()
-                    except queue.Empty:
-                        pass
+                if not self._decode_due(captured_at):
+                    continue
                 
-                # 添加新帧到队列
-                try:
-                    self.frame_queue.put_nowait(frame)
-                except queue.Full:
-                    pass
+                with CAPTURE_SECONDS.time(source='stream'):
+                    ret, frame = self.cap.retrieve()
+                if not ret:
+                    continue
+                
+                self.decoded_count += 1
+                self.last_decode_time = captured_at
+                # 解码器给出的当前帧时间戳（毫秒）；直播流通常从连接时刻起算
+                self._publish(frame, captured_at, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
                 
             except Exception as e:
                 logger.error(f"读取帧时出错: {e}")
                 time.sleep(0.1)
     
-    def _reconnect(self):
-        """重新连接视频流"""
+    def _publish(self, frame: np.ndarray, captured_at: float, pts: Optional[float] = None):
+        """发布新帧，并统计还没被读取就被覆盖的帧"""
+        if self.frame_slot.latest()[1] > self.last_read_seq:
+            self.dropped_count += 1
+        self.frame_slot.publish(frame, captured_at, pts)
+
+    def _frame_ok(self, now: float):
+        """成功读到一帧"""
+        self.failed_attempts = 0
+        self.health.frame_ok(now)
+
+    def _handle_read_failure(self):
+        """读取失败：指数退避（带随机抖动）后重连，连续失败时等待时间逐步加长"""
+        self.health.read_failed(time.time())
+        self.failed_attempts += 1
+
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failed_attempts - 1))
+        delay *= random.uniform(0.5, 1.0)
+        logger.warning(f"无法读取视频帧，{delay:.1f}s 后第 {self.failed_attempts} 次重连...")
+
+        if self._wakeup.wait(delay) or not self.running:
+            return
+        self.health.reconnected(self._reconnect())
+
+    def get_health(self) -> dict:
+        """
+        流健康统计
+
+        Returns:
+            状态机状态、重连/卡顿统计，以及读取、解码、覆盖丢弃的帧数
+        """
+        health = self.health.to_dict()
+        health.update({
+            'grabbed': self.frame_count,
+            'decoded': self.decoded_count,
+            'dropped': self.dropped_count,
+            'fps': self.fps,
+            'resolution': [self.width, self.height]
+        })
+        return health
+
+    def _decode_due(self, now: float) -> bool:
+        """按需解码模式下判断当前帧是否需要解码"""
+        if self.sample_interval is None:
+            return True
+        
+        if self.frame_requested.is_set():
+            self.frame_requested.clear()
+            return True
+        
+        return now - self.last_decode_time >= self.sample_interval
+    
+    def request_frame(self):
+        """请求读取线程解码下一帧（按需解码模式下使用）"""
+        self.frame_requested.set()
+    
+    def _reconnect(self) -> bool:
+        """重新连接视频流，返回是否成功"""
         try:
             if self.cap:
                 self.cap.release()
@@ -125,44 +544,12 @@ class RTMPStreamProcessor:
             
             if self.cap.isOpened():
                 logger.info("重新连接成功")
-            else:
-                logger.error("重新连接失败")
+                return True
+            logger.error("重新连接失败")
                 
         except Exception as e:
             logger.error(f"重新连接出错: {e}")
-    
-    def get_latest_frame(self) -> Optional[np.ndarray]:
-        """获取最新的视频帧"""
-        try:
-            # 清空旧帧，只保留最新的
-            frame = None
-            while not self.frame_queue.empty():
-                frame = self.frame_queue.get_nowait()
-            
-            return frame
-            
-        except queue.Empty:
-            return None
-    
-    def get_frame_at_interval(self, interval_seconds: float) -> Optional[np.ndarray]:
-        """
-        按固定间隔获取帧
-        
-        Args:
-            interval_seconds: 间隔时间（秒）
-            
-        Returns:
-            视频帧或None
-        """
-        # 计算需要跳过的帧数
-        skip_frames = int(self.fps * interval_seconds)
-        
-        # 跳过指定数量的帧
-        for _ in range(skip_frames):
-            if not self.frame_queue.empty():
-                self.frame_queue.get_nowait()
-        
-        return self.get_latest_frame()
+        return False
     
     def is_running(self) -> bool:
         """检查处理器是否正在运行"""
@@ -173,45 +560,207 @@ class RTMPStreamProcessor:
         logger.info("正在停止RTMP流处理器...")
         
         self.running = False
+        self._wakeup.set()
         
         if self.thread:
             self.thread.join(timeout=2)
         
-        if self.cap:
-            self.cap.release()
+        self._close()
         
-        # 清空队列
-        while not self.frame_queue.empty():
-            try:
-                self.frame_queue.get_nowait()
-            except queue.Empty:
-                break
+        self.frame_slot.clear()
+        self.health.set_state(StreamHealth.STOPPED)
         
         logger.info("✅ RTMP流处理器已停止")
 
 
+def _parse_frame_rate(rate: Optional[str]) -> Optional[float]:
+    """解析 ffprobe 的帧率字符串（如 '30000/1001'），无效时返回 None"""
+    try:
+        numerator, _, denominator = str(rate).partition('/')
+        value = float(numerator) / float(denominator or 1)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return value if value > 0 else None
+
+
+class FFmpegStreamProcessor(RTMPStreamProcessor):
+    """
+    基于 ffmpeg 管道的流处理器
+
+    由 ffmpeg 进程完成解码、降采样（scale）和降帧率（fps），以 bgr24 原始帧写入管道；
+    读取线程用 readinto 直接读入 NumPy 数组，不再经过 OpenCV 解码和 cv2.resize。
+
+    每帧读入新分配的数组（不复用缓冲区），发布后的帧不会再被改写，
+    Web层、分析和历史帧可以任意长时间持有。
+    """
+
+    def __init__(self, stream_url: str, output_size: Optional[Tuple[int, int]] = None,
+                 output_fps: Optional[float] = None, num_buffers: int = 1,
+                 input_options: Optional[dict] = None, history_size: int = 1):
+        """
+        初始化ffmpeg流处理器
+
+        Args:
+            stream_url: RTMP/RTSP流地址或视频文件
+            output_size: 输出尺寸 (宽, 高)，为空时保持原始分辨率（需要 ffprobe 获取）
+            output_fps: 输出帧率，为空时保持原始帧率
+            num_buffers: 保留参数，兼容旧调用（现在每帧读入新数组）
+            input_options: 传给 ffmpeg 输入的额外参数，如 {'rtsp_transport': 'tcp'}
+            history_size: 保留最近多少帧供 get_frame_near 按时间点选取
+        """
+        super().__init__(stream_url, history_size=history_size)
+        self.output_size = output_size
+        self.output_fps = output_fps
+        self.input_options = input_options or {}
+        self.pts_fps = None  # 推算 PTS 用的帧率，未知时帧不带 PTS
+
+        self.process = None
+
+    def _open(self) -> bool:
+        """启动 ffmpeg 进程"""
+        import ffmpeg
+
+        probed_fps = None
+        if self.output_size:
+            self.width, self.height = self.output_size
+        if not self.output_size or not self.output_fps:
+            try:
+                info = ffmpeg.probe(self.stream_url)
+                video = next(st for st in info['streams'] if st.get('codec_type') == 'video')
+                if not self.output_size:
+                    self.width, self.height = int(video['width']), int(video['height'])
+                probed_fps = _parse_frame_rate(video.get('avg_frame_rate')) or _parse_frame_rate(video.get('r_frame_rate'))
+            except Exception as e:
+                if not self.output_size:
+                    logger.error(f"无法获取视频流信息: {e}")
+                    return False
+                logger.warning(f"无法获取视频流信息: {e}")
+
+        self.pts_fps = self.output_fps or probed_fps
+        if not self.pts_fps:
+            logger.warning("⚠️ 无法确定帧率：帧不带流时间戳（PTS），按 PTS 取帧将退回采集时间")
+        self.fps = self.pts_fps or 30
+
+        stream = ffmpeg.input(self.stream_url, **self.input_options)
+        if self.output_fps:
+            stream = stream.filter('fps', fps=self.output_fps)
+        if self.output_size:
+            stream = stream.filter('scale', self.width, self.height)
+
+        try:
+            self.process = (
+                stream.output('pipe:', format='rawvideo', pix_fmt='bgr24')
+                .global_args('-loglevel', 'error', '-nostdin')
+                .run_async(pipe_stdout=True)
+            )
+        except Exception as e:
+            logger.error(f"启动ffmpeg失败: {e}")
+            return False
+
+        return True
+
+    def _close(self):
+        """结束 ffmpeg 进程"""
+        if self.process:
+            if self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=2)
+                except Exception:
+                    self.process.kill()
+            self.process = None
+
+    def _read_frames(self):
+        """读取原始帧的线程函数"""
+        index = 0
+        while self.running:
+            try:
+                # 每帧一个新数组：已发布的帧不会被下一帧覆盖
+                frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+                if not self._read_into(frame):
+                    if not self.running:
+                        break
+                    self._handle_read_failure()
+                    continue
+
+                index += 1
+                captured_at = time.time()
+                self.frame_count += 1
+                self.decoded_count += 1
+                self._frame_ok(captured_at)
+                # 原始帧管道不带时间戳，按帧率从帧号推算；帧率未知时不提供 PTS
+                pts = (index - 1) / self.pts_fps if self.pts_fps else None
+                self._publish(frame, captured_at, pts)
+
+            except Exception as e:
+                logger.error(f"读取帧时出错: {e}")
+                time.sleep(0.1)
+
+    def _read_into(self, buffer: np.ndarray) -> bool:
+        """把一整帧读入缓冲区，管道结束（或 ffmpeg 未能启动）时返回 False"""
+        if self.process is None:
+            return False
+        view = memoryview(buffer).cast('B')
+        stdout = self.process.stdout
+        filled = 0
+        while filled < len(view):
+            count = stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def _reconnect(self) -> bool:
+        """重启 ffmpeg 进程，返回是否成功"""
+        self._close()
+        if self._open():
+            logger.info("重新连接成功")
+            return True
+        logger.error("重新连接失败")
+        return False
+
+
 class ScreenCapture:
-    """屏幕截取处理器"""
+    """
+    屏幕截取处理器
+
+    截图对象按线程长期保存（mss 的句柄不能跨线程使用），不再每帧重新创建。
+    开启 auto_roi 时，第一帧截取整个窗口/屏幕并定位棋盘，之后只截取棋盘区域；
+    截图失败或定期校验发现区域内已没有棋盘时，才重新截取整屏定位。
+    """
     
-    def __init__(self):
-        """初始化屏幕截取器"""
+    def __init__(self, auto_roi: bool = True, verify_interval: int = 30):
+        """
+        初始化屏幕截取器
+
+        Args:
+            auto_roi: 自动定位棋盘区域，之后只截取该区域
+            verify_interval: 每隔多少帧校验一次区域内仍是棋盘；未找到棋盘时也按此间隔重试定位
+        """
         self.capture_method = None
+        self.auto_roi = auto_roi
+        self.verify_interval = verify_interval
+        # 棋盘区域（屏幕绝对坐标）及定位时所基于的截图区域，截图区域变化后失效
+        self.roi: Optional[Tuple[int, int, int, int]] = None
+        self._roi_base = None
+        self._frames_since_check = 0
+        self._local = threading.local()
         self._detect_capture_method()
     
     def _detect_capture_method(self):
-        """检测可用的截图方法"""
+        """检测可用的截图方法：优先 mss（截图对象按线程常驻、直接截取区域），其次 pyautogui"""
         try:
-            import pyautogui
-            self.capture_method = 'pyautogui'
-            logger.info("使用pyautogui进行屏幕截取")
+            import mss
+            self.capture_method = 'mss'
+            logger.info("使用mss进行屏幕截取")
             return
         except ImportError:
             pass
         
         try:
-            import mss
-            self.capture_method = 'mss'
-            logger.info("使用mss进行屏幕截取")
+            import pyautogui
+            self.capture_method = 'pyautogui'
+            logger.info("使用pyautogui进行屏幕截取")
             return
         except ImportError:
             pass
@@ -229,125 +778,273 @@ class ScreenCapture:
             region: 截图区域 (x, y, width, height)
             
         Returns:
-            截图或None
+            截图或None（开启 auto_roi 且已定位时为棋盘区域）
         """
         try:
-            if self.capture_method == 'pyautogui':
-                return self._capture_pyautogui(window_title, region)
-            elif self.capture_method == 'mss':
-                return self._capture_mss(window_title, region)
-            else:
-                return self._capture_opencv(window_title, region)
+            with CAPTURE_SECONDS.time(source='screen'):
+                base = self._base_region(window_title, region)
+                if self.auto_roi:
+                    return self._capture_roi(base)
+                return self._grab(base)
                 
         except Exception as e:
             logger.error(f"截图失败: {e}")
+            self.invalidate_roi()
             return None
     
-    def _capture_pyautogui(self, window_title: str = None, region: Tuple[int, int, int, int] = None) -> Optional[np.ndarray]:
+    def invalidate_roi(self):
+        """丢弃已定位的棋盘区域，下一帧重新截取整屏定位"""
+        self.roi = None
+        self._roi_base = None
+        self._frames_since_check = 0
+    
+    def _capture_roi(self, base: Optional[Tuple[int, int, int, int]]) -> Optional[np.ndarray]:
+        """只截取棋盘区域；尚未定位、区域失效或校验失败时截取整个 base 重新定位"""
+        from .board_locator import find_board_roi
+
+        self._frames_since_check += 1
+        due = self._frames_since_check >= self.verify_interval
+
+        if self.roi is not None and self._roi_base == base:
+            frame = self._grab(self.roi)
+            if frame is not None and (not due or find_board_roi(frame) is not None):
+                if due:
+                    self._frames_since_check = 0
+                return frame
+            logger.info("🔍 棋盘区域内未找到棋盘，重新定位")
+            self.invalidate_roi()
+            due = True
+
+        frame = self._grab(base)
+        if frame is None or base is None:
+            return frame
+        # 之前没找到棋盘时不必每帧都定位，按校验间隔重试
+        if self._roi_base == base and not due:
+            return frame
+
+        self._roi_base = base
+        self._frames_since_check = 0
+        found = find_board_roi(frame)
+        if found is None:
+            return frame
+
+        x, y, width, height = found
+        self.roi = (base[0] + x, base[1] + y, width, height)
+        logger.info(f"🎯 定位到棋盘区域: {self.roi}，之后只截取该区域")
+        return frame[y:y + height, x:x + width]
+    
+    def _base_region(self, window_title: str = None,
+                     region: Tuple[int, int, int, int] = None) -> Optional[Tuple[int, int, int, int]]:
+        """确定截图范围（屏幕绝对坐标）：指定区域 > 窗口区域 > 整个屏幕"""
+        if region:
+            return tuple(region)
+
+        window_api = self._window_api() if window_title else None
+        if window_api is not None:
+            windows = window_api.getWindowsWithTitle(window_title)
+            if windows:
+                window = windows[0]
+                return window.left, window.top, window.width, window.height
+            logger.warning(f"未找到窗口: {window_title}")
+
+        if self.capture_method == 'mss':
+            # 用屏幕的实际坐标，多显示器时左上角可能不是 (0, 0)
+            monitor = self._mss().monitors[0]
+            return monitor['left'], monitor['top'], monitor['width'], monitor['height']
+        if self.capture_method == 'pyautogui':
+            import pyautogui
+
+            width, height = pyautogui.size()
+            return 0, 0, width, height
+        return None
+    
+    def _grab(self, region: Optional[Tuple[int, int, int, int]]) -> Optional[np.ndarray]:
+        """截取屏幕绝对坐标下的区域，返回BGR图像"""
+        if self.capture_method == 'mss':
+            try:
+                return self._capture_mss(region)
+            except Exception as e:
+                # mss 在部分环境（如没有 X 扩展的远程桌面）无法截图，改用 pyautogui
+                try:
+                    import pyautogui
+                except ImportError:
+                    raise e
+                logger.warning(f"mss截图失败，改用pyautogui: {e}")
+                self.close()
+                self.capture_method = 'pyautogui'
+        if self.capture_method == 'pyautogui':
+            return self._capture_pyautogui(region)
+        return self._capture_opencv(region)
+    
+    def _capture_pyautogui(self, region: Tuple[int, int, int, int] = None) -> Optional[np.ndarray]:
         """使用pyautogui截图"""
         import pyautogui
         
-        if region:
-            # 直接截取指定区域
-            screenshot = pyautogui.screenshot(region=region)
-        else:
-            # 查找窗口并截取
-            if window_title:
-                windows = pyautogui.getWindowsWithTitle(window_title)
-                if windows:
-                    window = windows[0]
-                    region = (window.left, window.top, window.width, window.height)
-                    screenshot = pyautogui.screenshot(region=region)
-                else:
-                    logger.warning(f"未找到窗口: {window_title}")
-                    screenshot = pyautogui.screenshot()
-            else:
-                screenshot = pyautogui.screenshot()
+        screenshot = pyautogui.screenshot(region=region) if region else pyautogui.screenshot()
         
         # 转换为OpenCV格式
         frame = np.array(screenshot)
         frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
         return frame
     
-    def _capture_mss(self, window_title: str = None, region: Tuple[int, int, int, int] = None) -> Optional[np.ndarray]:
+    def _mss(self):
+        """当前线程的mss截图对象，首次使用时创建"""
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            import mss
+            sct = self._local.sct = mss.mss()
+        return sct
+    
+    def _capture_mss(self, region: Tuple[int, int, int, int] = None) -> Optional[np.ndarray]:
         """使用mss截图"""
-        import mss
+        sct = self._mss()
+        if region:
+            monitor = {"top": region[1], "left": region[0], "width": region[2], "height": region[3]}
+        else:
+            monitor = sct.monitors[0]  # 所有显示器
         
-        with mss.mss() as sct:
-            if region:
-                monitor = {"top": region[1], "left": region[0], "width": region[2], "height": region[3]}
-            else:
-                monitor = sct.monitors[0]  # 主显示器
-            
-            screenshot = sct.grab(monitor)
-            frame = np.array(screenshot)
-            
-            # 转换为OpenCV格式
-            if frame.shape[2] == 4:  # RGBA
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
-            else:  # RGB
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
-            return frame
+        # mss 返回 BGRA，去掉 alpha 通道即为OpenCV格式
+        screenshot = sct.grab(monitor)
+        return cv2.cvtColor(np.asarray(screenshot), cv2.COLOR_BGRA2BGR)
     
-    def _capture_opencv(self, window_title: str = None, region: Tuple[int, int, int, int] = None) -> Optional[np.ndarray]:
+    def _capture_opencv(self, region: Tuple[int, int, int, int] = None) -> Optional[np.ndarray]:
         """使用OpenCV截图（仅支持摄像头）"""
         # 这个方法主要用于测试，实际窗口截图需要其他库支持
         logger.warning("OpenCV方法不支持窗口截图，请安装pyautogui或mss")
         return None
     
+    def close(self):
+        """释放当前线程的截图对象"""
+        sct = getattr(self._local, 'sct', None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+    
+    @staticmethod
+    def _window_api():
+        """窗口枚举接口（pyautogui 转发自 pygetwindow），与截图方法无关；都不可用时返回None"""
+        for name in ('pyautogui', 'pygetwindow'):
+            try:
+                module = importlib.import_module(name)
+            except Exception:
+                continue
+            if hasattr(module, 'getAllWindows'):
+                return module
+        return None
+    
+    def get_windows(self) -> list:
+        """列出所有有标题的窗口对象（需要pyautogui或pygetwindow，截图仍可用mss）"""
+        window_api = self._window_api()
+        if window_api is None:
+            logger.warning("未安装pyautogui/pygetwindow，无法列出窗口")
+            return []
+        return [w for w in window_api.getAllWindows() if w.title]
+    
     def list_windows(self) -> list:
         """列出所有窗口标题"""
         try:
-            if self.capture_method == 'pyautogui':
-                import pyautogui
-                windows = pyautogui.getAllWindows()
-                return [w.title for w in windows if w.title]
-            else:
-                logger.warning("当前截图方法不支持窗口列表")
-                return []
+            return [w.title for w in self.get_windows()]
         except Exception as e:
             logger.error(f"获取窗口列表失败: {e}")
             return []
 
 
 class EmulatorCapture:
-    """模拟器截图专用类"""
+    """
+    模拟器截图专用类
+
+    只在首次使用（或窗口失效）时枚举所有窗口，之后缓存窗口句柄和位置尺寸：
+    每隔 geometry_interval 秒通过句柄读一次窗口矩形以发现移动/缩放，截图失败时立即重新读取。
+    """
     
-    def __init__(self, emulator_name: str = "MuMu"):
+    # 找不到窗口时，两次枚举所有窗口之间的最短间隔（秒）
+    search_interval = 2.0
+    
+    def __init__(self, emulator_name: str = "MuMu", geometry_interval: float = 0.5,
+                 screen_capture: Optional[ScreenCapture] = None):
         """
         初始化模拟器截图器
         
         Args:
             emulator_name: 模拟器名称（用于窗口匹配）
+            geometry_interval: 检查窗口是否移动/缩放的间隔（秒）
+            screen_capture: 使用的屏幕截取器，默认新建
         """
         self.emulator_name = emulator_name
-        self.screen_capture = ScreenCapture()
-        self.window_title = self._find_emulator_window()
+        self.geometry_interval = geometry_interval
+        self.screen_capture = screen_capture or ScreenCapture()
+        self.window = None
+        self.window_title = ""
+        # 缓存的窗口区域 (x, y, width, height) 及上次读取时间
+        self.geometry: Optional[Tuple[int, int, int, int]] = None
+        self._geometry_checked = 0.0
+        self._next_search = 0.0
         
-        if self.window_title:
+        if self._ensure_window() is not None:
             logger.info(f"找到模拟器窗口: {self.window_title}")
         else:
             logger.warning(f"未找到{emulator_name}模拟器窗口")
     
-    def _find_emulator_window(self) -> str:
-        """查找模拟器窗口"""
-        windows = self.screen_capture.list_windows()
+    def _find_emulator_window(self):
+        """枚举所有窗口，查找模拟器窗口对象"""
+        windows = self.screen_capture.get_windows()
         
         # 查找包含模拟器名称的窗口
         for window in windows:
-            if self.emulator_name.lower() in window.lower():
+            if self.emulator_name.lower() in window.title.lower():
                 return window
         
         # 尝试其他常见模拟器名称
         emulator_keywords = ["雷电", "BlueStacks", "Nox", "LDPlayer", "夜神", "逍遥"]
         for keyword in emulator_keywords:
             for window in windows:
-                if keyword.lower() in window.lower():
-                    logger.info(f"找到{keyword}模拟器窗口: {window}")
+                if keyword.lower() in window.title.lower():
+                    logger.info(f"找到{keyword}模拟器窗口: {window.title}")
                     return window
         
-        return ""
+        return None
+    
+    def _ensure_window(self):
+        """返回缓存的窗口对象；没有缓存时枚举窗口查找（按 search_interval 限频）"""
+        if self.window is None and time.monotonic() >= self._next_search:
+            self._next_search = time.monotonic() + self.search_interval
+            try:
+                self.window = self._find_emulator_window()
+            except Exception as e:
+                logger.error(f"查找模拟器窗口失败: {e}")
+            if self.window is not None:
+                self.window_title = self.window.title
+                self.geometry = None
+        return self.window
+    
+    def _window_geometry(self) -> Optional[Tuple[int, int, int, int]]:
+        """缓存的窗口区域，到检查间隔时通过句柄重新读取（不枚举窗口）"""
+        window = self._ensure_window()
+        if window is None:
+            return None
+        
+        now = time.monotonic()
+        if self.geometry is None or now - self._geometry_checked >= self.geometry_interval:
+            self._geometry_checked = now
+            try:
+                geometry = (window.left, window.top, window.width, window.height)
+            except Exception as e:
+                logger.warning(f"模拟器窗口已失效: {e}")
+                self.invalidate_window()
+                return None
+            if self.geometry is not None and geometry != self.geometry:
+                logger.info(f"📐 模拟器窗口移动/缩放: {self.geometry} -> {geometry}")
+            self.geometry = geometry
+        
+        if self.geometry[2] <= 0 or self.geometry[3] <= 0:
+            return None
+        return self.geometry
+    
+    def invalidate_window(self):
+        """丢弃缓存的窗口句柄，下次截图时重新查找"""
+        self.window = None
+        self.geometry = None
+        self._next_search = 0.0
     
     def capture(self, region: Tuple[int, int, int, int] = None) -> Optional[np.ndarray]:
         """
@@ -359,21 +1056,44 @@ class EmulatorCapture:
         Returns:
             截图或None
         """
-        if not self.window_title and not region:
-            logger.error("未指定窗口标题或截图区域")
+        if region:
+            return self.screen_capture.capture_window(region=region)
+        
+        geometry = self._window_geometry()
+        if geometry is None:
+            if not self.window_title:
+                logger.error("未指定窗口标题或截图区域")
             return None
         
-        return self.screen_capture.capture_window(self.window_title, region)
+        frame = self.screen_capture.capture_window(region=geometry)
+        if frame is None:
+            # 截图失败时下一帧立即通过句柄重新读取窗口区域
+            self.geometry = None
+        return frame
     
     def is_emulator_running(self) -> bool:
-        """检查模拟器是否正在运行"""
-        return bool(self._find_emulator_window())
+        """检查模拟器是否正在运行（通过缓存的窗口句柄，不枚举所有窗口）"""
+        return self._window_geometry() is not None
 
 
 # 便捷函数
-def create_stream_processor(stream_url: str) -> RTMPStreamProcessor:
-    """创建RTMP流处理器"""
-    return RTMPStreamProcessor(stream_url)
+def create_stream_processor(stream_url: str, backend: str = 'opencv', separate_process: bool = False,
+                            **kwargs) -> RTMPStreamProcessor:
+    """
+    创建RTMP流处理器
+
+    Args:
+        stream_url: 流地址
+        backend: 'opencv'（cv2.VideoCapture）或 'ffmpeg'（ffmpeg管道，支持解码器内降采样）
+        separate_process: 在独立进程中解码，帧经共享内存传回（见 SharedStreamCapture）
+        **kwargs: 传给对应处理器的参数
+    """
+    if separate_process:
+        from .shared_frames import SharedStreamCapture
+        return SharedStreamCapture(stream_url, backend=backend, **kwargs)
+    if backend == 'ffmpeg':
+        return FFmpegStreamProcessor(stream_url, **kwargs)
+    return RTMPStreamProcessor(stream_url, **kwargs)
 
 
 def create_emulator_capture(emulator_name: str = "MuMu") -> EmulatorCapture:
@@ -381,6 +1101,6 @@ def create_emulator_capture(emulator_name: str = "MuMu") -> EmulatorCapture:
     return EmulatorCapture(emulator_name)
 
 
-def create_screen_capture() -> ScreenCapture:
+def create_screen_capture(auto_roi: bool = True) -> ScreenCapture:
     """创建屏幕截图器"""
-    return ScreenCapture()
\ No newline at end of file
+    return ScreenCapture(auto_roi=auto_roi)
\ No newline at end of file
@@ -0,0 +1,358 @@
+"""
+多路视频流调度
+同时监控多张棋桌：每路流有独立的对局状态，帧被公平地调度到共享的分析器池
+"""
+
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .chess_analyzer import FrameState
+from .stream_processor import create_stream_processor
+
+logger = logging.getLogger(__name__)
+
+
+class StreamSource:
+    """一路被监控的视频流及其调度/统计状态"""
+
+    def __init__(self, stream_id: str, url: str, processor):
+        self.stream_id = stream_id
+        self.url = url
+        self.processor = processor
+        self.state = FrameState()
+
+        self.busy = False           # 是否有工作线程正在分析该路的帧
+        self.notifies = False       # 处理器是否在新帧到达时通知调度器（否则需要轮询）
+        self.waiting_frame = False  # 已到采样时间、正在等待新帧
+        self.last_seq = 0           # 最近一次被分析的帧序号
+        self.next_due = time.time() # 下一次应当开始分析的时间
+        self.last_started = 0.0     # 上一次开始分析的时间（用于轮转调度）
+        self.analyzed = 0           # 已分析帧数
+        self.no_result = 0          # 未得到结果的帧数（尚未形成稳定布局或分析出错）
+        self.lag = None             # 最近一帧的 采集->出结果 延迟（秒）
+        self.avg_lag = None         # 延迟的指数滑动平均
+        self.schedule_delay = 0.0   # 最近一次开始分析比预定时间晚了多久（秒）
+        self.last_result_at = None
+        self.last_fen = None
+
+    def status(self) -> Dict:
+        """该路流的状态快照"""
+        return {
+            'id': self.stream_id,
+            'url': self.url,
+            'running': self.processor.is_running(),
+            'health': self.processor.get_health(),
+            'analyzed': self.analyzed,
+            'no_result': self.no_result,
+            'lag': self.lag,
+            'avg_lag': self.avg_lag,
+            'schedule_delay': self.schedule_delay,
+            'last_result_at': self.last_result_at,
+            'fen': self.last_fen
+        }
+
+
+class StreamSupervisor:
+    """
+    多路流调度器
+
+    每个工作线程独占一个由 analyzer_factory 创建的分析器（检测器 + 引擎进程），
+    各路流的平滑器和上一次结果保存在各自的 FrameState 中，共用分析器而互不干扰。
+
+    调度规则：空闲的工作线程在"有新帧、未在分析、已到采样时间"的流中，
+    选择上一次被分析最早的一路（轮转）。每路流同一时刻最多占用一个工作线程，
+    因此一路高帧率的流不会饿死其他流。
+
+    当分析器池跟不上时，各路流的 schedule_delay（开始分析比预定时间晚多少）
+    会持续增长，get_status() 的 at_capacity 据此给出提示。
+
+    没有可分析的流时，工作线程睡到最早的预定时间；等待新帧的流由处理器在发布新帧时唤醒
+    （add_frame_listener），不支持回调的处理器（如独立采集进程）才按 poll_interval 轮询。
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, analyzer_factory: Callable, pool_size: int = 2,
+                 analysis_interval: float = 1.0, think_time: int = 2000,
+                 on_result: Optional[Callable[[str, Dict], None]] = None,
+                 processor_factory: Optional[Callable] = None):
+        """
+        初始化调度器
+
+        Args:
+            analyzer_factory: 无参函数，返回一个 XiangqiAnalyzer（每个工作线程调用一次）
+            pool_size: 工作线程（分析器）数量
+            analysis_interval: 每路流的分析间隔（秒）
+            think_time: 引擎思考时间（毫秒）
+            on_result: 分析结果回调 on_result(stream_id, result)
+            processor_factory: 流处理器工厂 processor_factory(url, **kwargs)，默认 create_stream_processor
+        """
+        self.analyzer_factory = analyzer_factory
+        self.pool_size = pool_size
+        self.analysis_interval = analysis_interval
+        self.think_time = think_time
+        self.on_result = on_result
+        self.processor_factory = processor_factory or create_stream_processor
+
+        self.sources: Dict[str, StreamSource] = {}
+        self._pending = set()   # 正在启动处理器的流ID，防止并发添加同一路流
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._analyzers = []
+        self._generation = 0    # reset_analyzers 后递增，工作线程据此重建分析器
+        self.running = False
+
+    def add_stream(self, stream_id: str, url: str, **kwargs) -> bool:
+        """
+        添加并启动一路流
+
+        Args:
+            stream_id: 流标识
+            url: 流地址
+            **kwargs: 传给 processor_factory 的参数（OpenCV 后端默认按分析间隔按需解码）
+
+        Returns:
+            是否添加成功
+        """
+        # 启动处理器可能耗时数秒，不持有锁；先在锁内占用流ID，失败时释放
+        with self._cond:
+            if stream_id in self.sources or stream_id in self._pending:
+                logger.warning(f"流已存在: {stream_id}")
+                return False
+            self._pending.add(stream_id)
+
+        try:
+            if kwargs.get('backend', 'opencv') == 'opencv':
+                kwargs.setdefault('sample_interval', self.analysis_interval)
+            processor = self.processor_factory(url, **kwargs)
+            started = processor.start()
+        except Exception as e:
+            logger.error(f"❌ 无法启动流 {stream_id}: {e}")
+            started = False
+
+        if not started:
+            with self._cond:
+                self._pending.discard(stream_id)
+            logger.error(f"❌ 无法启动流 {stream_id}: {url}")
+            return False
+
+        source = StreamSource(stream_id, url, processor)
+        add_listener = getattr(processor, 'add_frame_listener', None)
+        source.notifies = bool(add_listener and add_listener(self._frame_arrived))
+
+        with self._cond:
+            self._pending.discard(stream_id)
+            self.sources[stream_id] = source
+            self._cond.notify_all()
+
+        logger.info(f"📺 已添加流 {stream_id}: {url}")
+        return True
+
+    def remove_stream(self, stream_id: str) -> bool:
+        """停止并移除一路流"""
+        with self._cond:
+            source = self.sources.pop(stream_id, None)
+        if source is None:
+            return False
+
+        source.processor.stop()
+        logger.info(f"已移除流 {stream_id}")
+        return True
+
+    def start(self):
+        """启动工作线程"""
+        if self.running:
+            return
+
+        self.running = True
+        for index in range(self.pool_size):
+            worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f'stream-worker-{index}')
+            worker.start()
+            self._workers.append(worker)
+
+        logger.info(f"✅ 多路流调度已启动，分析器池大小 {self.pool_size}")
+
+    def stop(self):
+        """停止所有工作线程和流"""
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+
+        for worker in self._workers:
+            worker.join(timeout=self.think_time / 1000 + 5)
+        self._workers = []
+
+        for stream_id in list(self.sources):
+            self.remove_stream(stream_id)
+
+        for analyzer in self._analyzers:
+            analyzer.quit()
+        self._analyzers = []
+
+    def reset_analyzers(self):
+        """配置（模型/引擎路径）变化后调用：各工作线程在下一次分析前用 analyzer_factory 重建分析器"""
+        with self._cond:
+            self._generation += 1
+
+    def get_status(self) -> Dict:
+        """
+        调度状态
+
+        Returns:
+            {'pool_size', 'streams': [...], 'at_capacity'}；
+            任一路流的调度延迟超过一个分析间隔即认为分析器池已满负荷
+        """
+        with self._cond:
+            streams = [source.status() for source in self.sources.values()]
+
+        return {
+            'pool_size': self.pool_size,
+            'analysis_interval': self.analysis_interval,
+            'streams': streams,
+            'at_capacity': any(s['schedule_delay'] > self.analysis_interval for s in streams)
+        }
+
+    def get_queue_depth(self) -> Dict:
+        """
+        待分析的帧数
+
+        Returns:
+            pending: 有新帧、等待空闲工作线程的流数（每路流最多一帧待分析）；
+            running: 正在分析的流数
+        """
+        with self._cond:
+            sources = list(self.sources.values())
+        running = sum(source.busy for source in sources)
+        pending = sum(not source.busy and source.processor.latest_seq() > source.last_seq for source in sources)
+        return {'pending': pending, 'running': running}
+
+    def _frame_arrived(self):
+        """处理器发布新帧的回调：唤醒等待中的工作线程"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def _next_source(self, now: float) -> Optional[StreamSource]:
+        """选出下一路要分析的流（调用方持有锁）"""
+        candidates = []
+        for source in self.sources.values():
+            source.waiting_frame = False
+            if source.busy or now < source.next_due:
+                continue
+            # 只读序号：不复制帧（共享内存的流会整帧复制），也不计为已读取
+            if source.processor.latest_seq() > source.last_seq:
+                candidates.append(source)
+            else:
+                # 已到时间但流还没有新帧：顺延预定时间，流本身卡顿不计入调度延迟
+                source.next_due = now
+                source.waiting_frame = True
+
+        return min(candidates, key=lambda s: s.last_started, default=None)
+
+    def _idle_timeout(self, now: float) -> Optional[float]:
+        """
+        没有可分析的流时应等待多久（调用方持有锁）
+
+        Returns:
+            到最早预定时间的秒数；有等待新帧但不能回调的流时不超过 poll_interval；
+            None 表示只等通知（新帧、分析完成、添加流或停止）
+        """
+        timeout = None
+        for source in self.sources.values():
+            if source.busy:
+                continue
+            if source.waiting_frame:
+                wait = None if source.notifies else self.poll_interval
+            else:
+                wait = max(0.0, source.next_due - now)
+            if wait is not None and (timeout is None or wait < timeout):
+                timeout = wait
+        return timeout
+
+    def _worker_loop(self):
+        """工作线程：领取一路流的最新帧并分析"""
+        analyzer, generation = self._create_analyzer()
+        if analyzer is None:
+            return
+
+        while True:
+            with self._cond:
+                if not self.running:
+                    return
+                now = time.time()
+                source = self._next_source(now)
+                if source is None:
+                    self._cond.wait(timeout=self._idle_timeout(now))
+                    continue
+
+                source.busy = True
+                source.last_started = now
+                source.schedule_delay = now - source.next_due
+                source.next_due = max(source.next_due + self.analysis_interval, now)
+
+            # 只为选中的流取一次帧，在锁外复制；busy 期间其他线程不会调度这一路流
+            frame, seq, captured_at = source.processor.get_latest()
+            if frame is None:
+                # 流在选中后被移除或停止
+                with self._cond:
+                    source.busy = False
+                continue
+            source.last_seq = seq
+            if generation != self._generation:
+                logger.info("配置已变化，重建流分析器")
+                self._discard_analyzer(analyzer)
+                analyzer, generation = self._create_analyzer()
+                if analyzer is None:
+                    with self._cond:
+                        source.busy = False
+                    return
+            self._analyze(analyzer, source, frame, captured_at)
+
+    def _create_analyzer(self):
+        """创建工作线程的分析器，返回 (分析器, 创建时的配置代数)；失败时分析器为 None"""
+        generation = self._generation
+        try:
+            analyzer = self.analyzer_factory()
+        except Exception as e:
+            logger.error(f"❌ 创建分析器失败: {e}")
+            return None, generation
+
+        with self._cond:
+            self._analyzers.append(analyzer)
+        return analyzer, generation
+
+    def _discard_analyzer(self, analyzer):
+        """关闭不再使用的分析器"""
+        with self._cond:
+            if analyzer in self._analyzers:
+                self._analyzers.remove(analyzer)
+        analyzer.quit()
+
+    def _analyze(self, analyzer, source: StreamSource, frame, captured_at: float):
+        """分析一帧并更新该路流的统计"""
+        result = None
+        try:
+            result = analyzer.analyze_frame(frame, self.think_time, state=source.state)
+        except Exception as e:
+            logger.error(f"流 {source.stream_id} 分析出错: {e}")
+
+        finished = time.time()
+        with self._cond:
+            source.busy = False
+            source.analyzed += 1
+            source.lag = finished - captured_at
+            source.avg_lag = source.lag if source.avg_lag is None else 0.8 * source.avg_lag + 0.2 * source.lag
+            if result is None:
+                source.no_result += 1
+            else:
+                source.last_result_at = finished
+                source.last_fen = result.get('fen')
+            self._cond.notify_all()
+
+        if result is not None and self.on_result:
+            try:
+                self.on_result(source.stream_id, result)
+            except Exception as e:
+                logger.error(f"结果回调出错: {e}")
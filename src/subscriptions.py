@@ -0,0 +1,108 @@
+"""
+Socket.IO 订阅管理
+客户端按房间订阅信号源（实时画面、某一路流）或会话，结果只发送给订阅者；
+房间没有订阅者时不构造、不序列化负载
+"""
+
+import threading
+from typing import Dict, List, Set
+
+LIVE_ROOM = 'live'              # Web界面自身采集的实时画面：预览和分析结果
+STREAM_ROOM_PREFIX = 'stream:'  # 多路流中某一路的分析结果
+SESSION_ROOM_PREFIX = 'session:'  # 同一登录会话的所有连接（上传任务结果）
+
+
+def stream_room(stream_id: str) -> str:
+    """某一路流的房间名"""
+    return STREAM_ROOM_PREFIX + stream_id
+
+
+def session_room(session_id: str) -> str:
+    """某个登录会话的房间名"""
+    return SESSION_ROOM_PREFIX + session_id
+
+
+def is_source_room(room: str) -> bool:
+    """客户端可以自行订阅的信号源房间（会话房间在连接时自动加入，不能订阅别人的会话）"""
+    return room == LIVE_ROOM or (room.startswith(STREAM_ROOM_PREFIX) and len(room) > len(STREAM_ROOM_PREFIX))
+
+
+class Subscriptions:
+    """
+    客户端与房间的双向索引
+
+    只记录订阅关系，实际加入/离开 Socket.IO 房间由调用方完成；
+    发送前用 count() 判断房间是否有订阅者，没有则跳过负载的构造和序列化。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms: Dict[str, Set[str]] = {}
+        self._clients: Dict[str, Set[str]] = {}
+
+    def subscribe(self, sid: str, room: str) -> bool:
+        """
+        订阅房间
+
+        Returns:
+            是否为新订阅
+        """
+        with self._lock:
+            members = self._rooms.setdefault(room, set())
+            if sid in members:
+                return False
+            members.add(sid)
+            self._clients.setdefault(sid, set()).add(room)
+            return True
+
+    def unsubscribe(self, sid: str, room: str) -> bool:
+        """
+        取消订阅
+
+        Returns:
+            之前是否订阅了该房间
+        """
+        with self._lock:
+            members = self._rooms.get(room)
+            if not members or sid not in members:
+                return False
+            members.discard(sid)
+            if not members:
+                del self._rooms[room]
+            rooms = self._clients.get(sid)
+            if rooms is not None:
+                rooms.discard(room)
+            return True
+
+    def remove_client(self, sid: str) -> List[str]:
+        """客户端断开：移除其全部订阅，返回原来订阅的房间"""
+        with self._lock:
+            rooms = self._clients.pop(sid, set())
+            for room in rooms:
+                members = self._rooms.get(room)
+                if members is not None:
+                    members.discard(sid)
+                    if not members:
+                        del self._rooms[room]
+            return sorted(rooms)
+
+    def count(self, room: str) -> int:
+        """房间的订阅者数"""
+        return len(self._rooms.get(room, ()))
+
+    def rooms_of(self, sid: str) -> List[str]:
+        """客户端订阅的房间"""
+        with self._lock:
+            return sorted(self._clients.get(sid, ()))
+
+    def client_count(self) -> int:
+        """有订阅的客户端数"""
+        return len(self._clients)
+
+    def get_stats(self) -> Dict:
+        """各房间的订阅者数（会话房间只计总数，不暴露会话ID）"""
+        with self._lock:
+            rooms = {room: len(members) for room, members in self._rooms.items()
+                     if not room.startswith(SESSION_ROOM_PREFIX)}
+            sessions = sum(1 for room in self._rooms if room.startswith(SESSION_ROOM_PREFIX))
+        return {'clients': len(self._clients), 'rooms': rooms, 'sessions': sessions}
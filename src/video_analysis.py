@@ -0,0 +1,315 @@
+"""
+离线视频分析
+把录像按时间分段，在多个工作进程中并行解码、对采样帧做棋盘检测，
+合并连续相同的局面得到着法序列，再对每个不同的局面并行做引擎分析
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .board_renderer import fen_to_grid
+from .lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内的分析器（由进程池的 initializer 创建，每个进程一个）
+_worker_analyzer = None
+
+
+def plan_segments(total_frames: int, step: int, segments: int) -> List[Tuple[int, int]]:
+    """
+    把采样帧均分为若干段
+
+    采样帧是帧号为 step 整数倍的帧；每段的边界都落在采样帧上，
+    保证每个采样帧恰好属于一个分段。
+
+    Args:
+        total_frames: 视频总帧数
+        step: 采样步长（帧）
+        segments: 分段数
+
+    Returns:
+        [(起始帧, 结束帧)]，结束帧不包含在内
+    """
+    samples = list(range(0, total_frames, step))
+    if not samples:
+        return []
+
+    chunk = math.ceil(len(samples) / max(1, segments))
+    return [(samples[i], samples[min(i + chunk, len(samples)) - 1] + 1)
+            for i in range(0, len(samples), chunk)]
+
+
+def collapse_positions(samples: List[Dict], min_stable: int = 2) -> List[Dict]:
+    """
+    合并连续相同的局面
+
+    连续出现不足 min_stable 次的局面视为识别抖动（手遮挡、走子过程中）并丢弃，
+    丢弃后相邻的相同局面再合并为一个。识别失败（fen 为 None）的采样直接跳过。
+
+    Args:
+        samples: 按时间排序的采样 [{'time', 'fen', ...}]
+        min_stable: 局面至少连续出现的采样次数
+
+    Returns:
+        [{'fen', 'start', 'end', 'samples'}]
+    """
+    runs = []
+    for sample in samples:
+        if sample['fen'] is None:
+            continue
+        if runs and runs[-1]['fen'] == sample['fen']:
+            runs[-1]['end'] = sample['time']
+            runs[-1]['samples'] += 1
+        else:
+            runs.append({'fen': sample['fen'], 'start': sample['time'], 'end': sample['time'], 'samples': 1})
+
+    positions = []
+    for run in runs:
+        if run['samples'] < min_stable:
+            continue
+        if positions and positions[-1]['fen'] == run['fen']:
+            positions[-1]['end'] = run['end']
+            positions[-1]['samples'] += run['samples']
+        else:
+            positions.append(run)
+    return positions
+
+
+def _square(i: int, j: int) -> str:
+    """网格坐标转ICCS坐标（a0 为红方左下角）"""
+    return f"{chr(ord('a') + j)}{9 - i}"
+
+
+def infer_move(before_fen: str, after_fen: str) -> Optional[str]:
+    """
+    从前后两个局面推断着法
+
+    Args:
+        before_fen: 走子前的FEN
+        after_fen: 走子后的FEN
+
+    Returns:
+        ICCS着法（如 'h2e2'）；两个局面之间不是一步棋时返回 None
+    """
+    before, after = fen_to_grid(before_fen), fen_to_grid(after_fen)
+    changed = [(i, j) for i in range(10) for j in range(9) if before[i][j] != after[i][j]]
+    if len(changed) != 2:
+        return None
+
+    # 起点走子后变空，终点变成起点原来的棋子（吃子时终点原本有对方棋子）
+    for src, dst in (changed, changed[::-1]):
+        piece = before[src[0]][src[1]]
+        captured = before[dst[0]][dst[1]]
+        if (piece != '.' and after[src[0]][src[1]] == '.' and after[dst[0]][dst[1]] == piece
+                and (captured == '.' or captured.isupper() != piece.isupper())):
+            return _square(*src) + _square(*dst)
+    return None
+
+
+def assign_turns(positions: List[Dict]):
+    """
+    为每个局面标注行棋方（'w' 红方 / 'b' 黑方）
+
+    能推断出着法的局面，由走动棋子的颜色确定：走子方的对方行棋，前一局面则由走子方行棋；
+    其余局面按步数奇偶与相邻局面交替。整局都推断不出着法时按红方先行处理。
+
+    Args:
+        positions: collapse_positions 的结果，已填好 move
+    """
+    turns: List[Optional[str]] = [None] * len(positions)
+    for index in range(1, len(positions)):
+        move = positions[index].get('move')
+        if not move:
+            continue
+        # ICCS 坐标转回网格坐标，取走子前起点上的棋子
+        grid = fen_to_grid(positions[index - 1]['fen'])
+        piece = grid[9 - int(move[1])][ord(move[0]) - ord('a')]
+        mover = 'w' if piece.isupper() else 'b'
+        turns[index] = 'b' if mover == 'w' else 'w'
+        if turns[index - 1] is None:
+            turns[index - 1] = mover
+
+    if not any(turns) and turns:
+        turns[0] = 'w'
+    # 向后、向前传播，未知的局面与相邻局面交替
+    for index in range(1, len(turns)):
+        if turns[index] is None and turns[index - 1] is not None:
+            turns[index] = 'b' if turns[index - 1] == 'w' else 'w'
+    for index in range(len(turns) - 2, -1, -1):
+        if turns[index] is None and turns[index + 1] is not None:
+            turns[index] = 'b' if turns[index + 1] == 'w' else 'w'
+
+    for position, turn in zip(positions, turns):
+        position['turn'] = turn
+
+
+def _init_worker(pose_model_path: str, classifier_model_path: str, detector_inverted: bool):
+    """进程池 initializer：在工作进程内创建检测器"""
+    global _worker_analyzer
+    from .chess_analyzer import XiangqiAnalyzer
+
+    _worker_analyzer = XiangqiAnalyzer('', pose_model_path, classifier_model_path, detector_inverted)
+
+
+def _detect_segment(video_path: str, start: int, end: int, step: int, fps: float) -> List[Dict]:
+    """
+    工作进程：解码一个分段，对其中的采样帧做检测
+
+    非采样帧只 grab() 推进位置，不做颜色转换。
+    """
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    samples = []
+    for index in range(start, end):
+        if index % step:
+            if not cap.grab():
+                break
+            continue
+
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        sample = {'frame': index, 'time': index / fps, 'fen': None, 'confidence': 0.0}
+        detect_result = _worker_analyzer.detector.detect(frame)
+        if detect_result is not None:
+            layout = [list(row.strip()) for row in detect_result['cell_labels_str'].strip().split('\n')]
+            sample['fen'] = _worker_analyzer._board_layout_to_fen(layout)
+            sample['confidence'] = float(np.mean(detect_result['scores']))
+        samples.append(sample)
+
+    cap.release()
+    return samples
+
+
+class VideoAnalyzer:
+    """离线视频分析器"""
+
+    def __init__(self, pose_model_path: str, classifier_model_path: str, engine_path: str = '',
+                 workers: Optional[int] = None, engine_workers: Optional[int] = None,
+                 detector_inverted: bool = True):
+        """
+        初始化视频分析器
+
+        Args:
+            pose_model_path: 姿态检测模型路径
+            classifier_model_path: 棋子分类模型路径
+            engine_path: Pikafish引擎路径（为空时只识别局面，不做引擎分析）
+            workers: 解码+检测的工作进程数（默认CPU核心数）
+            engine_workers: 同时运行的引擎进程数（默认与 workers 相同）
+            detector_inverted: 检测器是否反转
+        """
+        self.pose_model_path = pose_model_path
+        self.classifier_model_path = classifier_model_path
+        self.engine_path = engine_path
+        self.workers = workers or os.cpu_count() or 1
+        self.engine_workers = engine_workers or self.workers
+        self.detector_inverted = detector_inverted
+
+    def analyze(self, video_path: str, sample_interval: float = 1.0, think_time: int = 1000,
+                min_stable: int = 2, segments: Optional[int] = None) -> Dict:
+        """
+        分析视频文件
+
+        Args:
+            video_path: 视频文件路径
+            sample_interval: 采样间隔（秒）
+            think_time: 每个局面的引擎思考时间（毫秒）
+            min_stable: 局面至少连续出现的采样次数
+            segments: 分段数（默认为工作进程数的2倍，便于负载均衡）
+
+        Returns:
+            {'video', 'fps', 'duration', 'samples', 'positions', 'moves', 'timing'}；
+            positions 中每项包含 fen、起止时间、到达该局面的着法 move、行棋方 turn，
+            以及引擎给出的 best_move / score
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"无法打开视频: {video_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        step = max(1, round(sample_interval * fps))
+        plan = plan_segments(total_frames, step, segments or self.workers * 2)
+        logger.info(f"🎬 {video_path}: {total_frames} 帧 @ {fps:.1f}fps，"
+                    f"每 {step} 帧采样，分 {len(plan)} 段，{self.workers} 个进程")
+
+        start = time.perf_counter()
+        samples = self._detect_samples(video_path, plan, step, fps)
+        detect_elapsed = time.perf_counter() - start
+
+        positions = collapse_positions(samples, min_stable)
+        for previous, position in zip([None] + positions, positions):
+            position['move'] = infer_move(previous['fen'], position['fen']) if previous else None
+        assign_turns(positions)
+
+        start = time.perf_counter()
+        if self.engine_path:
+            self._analyze_positions(positions, think_time)
+        engine_elapsed = time.perf_counter() - start
+
+        logger.info(f"✅ 视频分析完成：{len(samples)} 个采样，{len(positions)} 个局面，"
+                    f"检测 {detect_elapsed:.1f}s，引擎 {engine_elapsed:.1f}s")
+        return {
+            'video': str(video_path),
+            'fps': fps,
+            'duration': total_frames / fps,
+            'samples': len(samples),
+            'positions': positions,
+            'moves': [p['move'] for p in positions[1:]],
+            'timing': {'detect': detect_elapsed, 'engine': engine_elapsed}
+        }
+
+    def _detect_samples(self, video_path: str, plan: List[Tuple[int, int]], step: int, fps: float) -> List[Dict]:
+        """在进程池中并行解码、检测各分段，按时间顺序返回所有采样"""
+        # spawn 启动，避免在已有线程（Web服务器、onnxruntime）的进程里 fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(plan)) or 1, mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(self.pose_model_path, self.classifier_model_path,
+                                           self.detector_inverted)) as executor:
+            futures = [executor.submit(_detect_segment, video_path, seg_start, seg_end, step, fps)
+                       for seg_start, seg_end in plan]
+            return [sample for future in futures for sample in future.result()]
+
+    def _analyze_positions(self, positions: List[Dict], think_time: int):
+        """每个不同的局面只分析一次，多个引擎进程并行"""
+        from .chess_analyzer import PikafishEngine
+
+        local = threading.local()
+        engines = []
+        engines_lock = threading.Lock()
+
+        def analyze(key):
+            fen, turn = key
+            if not hasattr(local, 'engine'):
+                local.engine = PikafishEngine(self.engine_path)
+                with engines_lock:
+                    engines.append(local.engine)
+            return local.engine.get_best_move(fen, think_time=think_time, turn=turn)
+
+        # 同一棋盘轮到不同的一方是不同的局面
+        unique_keys = list(dict.fromkeys((p['fen'], p.get('turn')) for p in positions))
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.engine_workers, len(unique_keys)) or 1) as executor:
+                analyses = dict(zip(unique_keys, executor.map(analyze, unique_keys)))
+        finally:
+            for engine in engines:
+                engine.quit()
+
+        for position in positions:
+            analysis = analyses[(position['fen'], position.get('turn'))]
+            position['best_move'] = analysis.get('best_move')
+            position['score'] = analysis.get('score')
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+模拟器截图帧率基准
+对比每帧查找窗口（原方式）、缓存窗口句柄、缓存窗口+只截取棋盘区域三种方式的截图帧率
+
+需要在有显示器、模拟器窗口已打开（棋盘可见）的机器上运行。
+
+用法:
+  python tests/bench_capture_rate.py --emulator MuMu --seconds 5
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+import logging
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.stream_processor import EmulatorCapture, ScreenCapture
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def measure(capture: EmulatorCapture, seconds: float, uncached: bool) -> tuple:
+    """连续截图 seconds 秒，返回 (帧/秒, 平均帧像素数)"""
+    frames = pixels = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        if uncached:
+            # 模拟原方式：每帧重新枚举窗口、重新创建截图对象
+            capture.invalidate_window()
+            capture.screen_capture.close()
+        frame = capture.capture()
+        if frame is not None:
+            frames += 1
+            pixels += frame.shape[0] * frame.shape[1]
+    return frames / seconds, pixels / max(frames, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟器截图帧率基准')
+    parser.add_argument('--emulator', default='MuMu', help='模拟器名称（窗口标题部分匹配）')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    modes = (('每帧查找窗口', False, True), ('缓存窗口', False, False), ('缓存窗口+棋盘区域', True, False))
+    for name, auto_roi, uncached in modes:
+        capture = EmulatorCapture(args.emulator, screen_capture=ScreenCapture(auto_roi=auto_roi))
+        if not capture.is_emulator_running():
+            print(f"未找到{args.emulator}模拟器窗口")
+            return 1
+        capture.capture()  # 预热（棋盘区域模式在首帧定位）
+        fps, pixels = measure(capture, args.seconds, uncached)
+        print(f"{name}: {fps:.1f} 帧/秒, 平均每帧 {pixels / 1e6:.2f} 百万像素")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+合成语料基准
+用 BoardRenderer 生成带标注的棋盘图片，再对其跑端到端的吞吐和识别准确率测试
+
+用法:
+  # 生成语料
+  python tests/bench_corpus.py build --out bench_corpus --count 200 --noise 6 --perspective 0.05 --lighting 0.4
+  # 只测检测+FEN转换
+  python tests/bench_corpus.py run --corpus bench_corpus
+  # 包含引擎搜索的端到端测试
+  python tests/bench_corpus.py run --corpus bench_corpus --engine-path Pikafish/src/pikafish --think-time 500
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+import logging
+
+import cv2
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.board_renderer import BoardRenderer, fen_to_grid, random_position, INITIAL_FEN
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def build_corpus(args):
+    """生成语料目录：图片 + labels.jsonl"""
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    width, height = map(int, args.size.lower().split('x'))
+    rng = random.Random(args.seed)
+    renderer = BoardRenderer(font_path=args.font)
+
+    with open(out_dir / 'labels.jsonl', 'w', encoding='utf-8') as labels:
+        for index in range(args.count):
+            fen = INITIAL_FEN if index == 0 else random_position(rng)
+            params = {
+                'size': [width, height],
+                'noise': rng.uniform(0, args.noise),
+                'perspective': rng.uniform(0, args.perspective),
+                'lighting': rng.uniform(0, args.lighting),
+                'seed': rng.randrange(2 ** 31),
+            }
+            image, label = renderer.render(fen, size=(width, height), noise=params['noise'],
+                                           perspective=params['perspective'],
+                                           lighting=params['lighting'], seed=params['seed'])
+
+            file_name = f"{index:06d}.png"
+            cv2.imwrite(str(out_dir / file_name), image)
+            labels.write(json.dumps({'file': file_name, **label, 'params': params}, ensure_ascii=False) + '\n')
+
+    print(f"已生成 {args.count} 张图片: {out_dir}")
+    return 0
+
+
+def cell_accuracy(predicted_fen: str, expected_fen: str) -> float:
+    """逐格比较两个FEN，返回正确格子比例"""
+    try:
+        predicted = fen_to_grid(predicted_fen)
+    except ValueError:
+        return 0.0
+    expected = fen_to_grid(expected_fen)
+    correct = sum(p == e for prow, erow in zip(predicted, expected) for p, e in zip(prow, erow))
+    return correct / 90
+
+
+def run_corpus(args):
+    """对语料跑检测（可选引擎），输出吞吐和准确率"""
+    from src.chess_analyzer import XiangqiAnalyzer
+
+    corpus = Path(args.corpus)
+    samples = [json.loads(line) for line in open(corpus / 'labels.jsonl', encoding='utf-8')]
+    if args.limit:
+        samples = samples[:args.limit]
+
+    analyzer = XiangqiAnalyzer(args.engine_path or '', args.pose_model, args.classifier_model)
+
+    latencies = []
+    accuracies = []
+    exact = 0
+    failed = 0
+    start = time.perf_counter()
+
+    for sample in samples:
+        image = cv2.imread(str(corpus / sample['file']))
+        t0 = time.perf_counter()
+
+        if args.engine_path:
+            result = analyzer.analyze_image(image, args.think_time)
+            fen = result['fen'] if result else None
+        else:
+            detect_result = analyzer.detector.detect(image)
+            fen = None
+            if detect_result:
+                layout = [list(row.strip()) for row in detect_result['cell_labels_str'].strip().split('\n')]
+                fen = analyzer._board_layout_to_fen(layout)
+
+        latencies.append(time.perf_counter() - t0)
+        if fen is None:
+            failed += 1
+            accuracies.append(0.0)
+            continue
+
+        accuracy = cell_accuracy(fen, sample['fen'])
+        accuracies.append(accuracy)
+        exact += accuracy == 1.0
+
+    elapsed = time.perf_counter() - start
+    analyzer.quit()
+
+    latencies.sort()
+    print(f"样本数: {len(samples)}, 失败: {failed}")
+    print(f"吞吐: {len(samples) / elapsed:.2f} 张/秒")
+    print(f"延迟: 中位数 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"P95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+    print(f"逐格准确率: {statistics.mean(accuracies):.4f}")
+    print(f"整盘完全正确: {exact}/{len(samples)}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成语料基准')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='生成语料')
+    build.add_argument('--out', required=True, help='输出目录')
+    build.add_argument('--count', type=int, default=100)
+    build.add_argument('--size', default='720x800', help='图像尺寸 宽x高')
+    build.add_argument('--noise', type=float, default=6.0, help='噪声标准差上限')
+    build.add_argument('--perspective', type=float, default=0.05, help='透视扰动上限')
+    build.add_argument('--lighting', type=float, default=0.4, help='光照不均上限')
+    build.add_argument('--font', help='中文字体路径')
+    build.add_argument('--seed', type=int, default=0)
+
+    run = subparsers.add_parser('run', help='运行基准')
+    run.add_argument('--corpus', required=True, help='语料目录')
+    run.add_argument('--pose-model', default='onnx/pose/4_v6-0301.onnx')
+    run.add_argument('--classifier-model', default='onnx/layout_recognition/nano_v3-0319.onnx')
+    run.add_argument('--engine-path', help='Pikafish路径（为空时只测检测）')
+    run.add_argument('--think-time', type=int, default=500)
+    run.add_argument('--limit', type=int, default=0)
+
+    args = parser.parse_args()
+    return build_corpus(args) if args.command == 'build' else run_corpus(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+多图检测吞吐基准
+对比逐张调用 detect 与 detect_many 的吞吐量
+
+用法:
+  python tests/bench_detect_many.py --images path/to/screenshots --workers 4
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+import logging
+
+import cv2
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.chess_analyzer import ChessboardDetector
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def load_images(image_dir: Path, limit: int) -> list:
+    """读取目录下的图片"""
+    images = []
+    for path in sorted(image_dir.iterdir()):
+        if path.suffix.lower() not in ('.jpg', '.jpeg', '.png', '.bmp'):
+            continue
+        image = cv2.imread(str(path))
+        if image is not None:
+            images.append(image)
+        if len(images) >= limit:
+            break
+    return images
+
+
+def run_benchmark(detector: ChessboardDetector, images: list, workers: int, repeat: int):
+    """运行基准测试并打印结果"""
+    # 预热，避免首次推理和额外检测器实例的加载开销影响结果
+    detector.detect_many(images[:workers], workers=workers)
+
+    loop_times = []
+    many_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for image in images:
+            detector.detect(image)
+        loop_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        detector.detect_many(images, workers=workers)
+        many_times.append(time.perf_counter() - start)
+
+    loop_best = min(loop_times)
+    many_best = min(many_times)
+
+    print(f"图片数量: {len(images)}, workers: {workers}, 重复: {repeat}")
+    print(f"逐张 detect:  {loop_best:.3f}s  ({len(images) / loop_best:.2f} 张/秒)")
+    print(f"detect_many:  {many_best:.3f}s  ({len(images) / many_best:.2f} 张/秒)")
+    print(f"加速比: {loop_best / many_best:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='detect_many 吞吐基准')
+    parser.add_argument('--images', required=True, help='截图目录')
+    parser.add_argument('--pose-model', default='onnx/pose/4_v6-0301.onnx')
+    parser.add_argument('--classifier-model', default='onnx/layout_recognition/nano_v3-0319.onnx')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=64, help='最多读取的图片数量')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    images = load_images(Path(args.images), args.limit)
+    if not images:
+        print(f"目录中没有可读取的图片: {args.images}")
+        return 1
+
+    try:
+        detector = ChessboardDetector(args.pose_model, args.classifier_model)
+    except RuntimeError as e:
+        print(f"无法创建检测器，需要检出 Chinese_Chess_Recognition 子模块并放置 ONNX 模型: {e}")
+        return 1
+
+    run_benchmark(detector, images, args.workers, args.repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+采集进程隔离基准
+对比采集线程（同一解释器）与采集进程（共享内存）对主进程Python代码吞吐的影响
+
+主线程持续执行纯Python工作（模拟Flask的请求处理和JSON序列化），统计每秒完成的迭代数，
+同时后台全速解码一段视频。
+
+用法:
+  python tests/bench_shared_frames.py --video bench_stream.mp4 --seconds 5
+  python tests/bench_shared_frames.py --generate
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+import logging
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.stream_processor import create_stream_processor
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def python_work(seconds: float) -> float:
+    """执行纯Python工作，返回每秒迭代数"""
+    payload = {'fen': 'rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR',
+               'scores': [0.95] * 90, 'best_move': 'h2e2'}
+    iterations = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        json.loads(json.dumps(payload))
+        iterations += 1
+    return iterations / seconds
+
+
+def measure(video: str, seconds: float, separate_process) -> tuple:
+    """返回 (主线程迭代/秒, 读取到的帧数)"""
+    if separate_process is None:
+        return python_work(seconds), 0
+
+    processor = create_stream_processor(video, separate_process=separate_process)
+    processor.start()
+    _, start_seq, _ = processor.get_latest()
+    rate = python_work(seconds)
+    _, end_seq, _ = processor.get_latest()
+    processor.stop()
+    return rate, end_seq - start_seq
+
+
+def main():
+    parser = argparse.ArgumentParser(description='采集进程隔离基准')
+    parser.add_argument('--video', default='bench_stream.mp4')
+    parser.add_argument('--generate', action='store_true', help='生成测试视频')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    if args.generate or not Path(args.video).exists():
+        from bench_stream_decode import generate_video
+        generate_video(Path(args.video), seconds=60)
+
+    baseline = None
+    for name, mode in (('无采集', None), ('采集线程', False), ('采集进程+共享内存', True)):
+        rate, frames = measure(args.video, args.seconds, mode)
+        baseline = baseline or rate
+        print(f"{name}: 主线程 {rate:,.0f} 次/秒 ({rate / baseline:.0%}), 采集 {frames} 帧")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
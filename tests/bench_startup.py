@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准
+测量模块导入时间，以及从进程启动到Web服务器返回第一个响应的时间
+（启动流程与 main.py 一致：导入 main 和 web.app，调用 init_app 后运行服务器）
+
+用法:
+  python tests/bench_startup.py --repeat 5
+  python tests/bench_startup.py --root /path/to/other/checkout   # 对比其他版本
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+IMPORT_SNIPPET = (
+    "import sys, time; sys.path.insert(0, '.'); t = time.perf_counter(); "
+    "import {module}; print(time.perf_counter() - t)"
+)
+
+SERVER_SNIPPET = (
+    "import sys; sys.path.insert(0, '.'); import main; "
+    "from web.app import app, socketio, init_app; init_app(); "
+    "socketio.run(app, host='127.0.0.1', port={port}, allow_unsafe_werkzeug=True)"
+)
+
+
+def measure_import(root: Path, module: str, repeat: int) -> list:
+    """在独立进程中测量模块导入时间"""
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SNIPPET.format(module=module)],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return samples
+
+
+def measure_first_response(root: Path, port: int, timeout: float) -> float:
+    """启动Web服务器并轮询 /login，返回收到第一个响应的时间"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER_SNIPPET.format(port=port)],
+        cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env=dict(os.environ, PYTHONUNBUFFERED='1')
+    )
+
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.02)
+        raise TimeoutError(f"{timeout}秒内未收到响应")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def report(name: str, samples: list):
+    """打印中位数和最小值"""
+    print(f"{name:<28} 中位数 {statistics.median(samples) * 1000:8.1f} ms   最小 {min(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准')
+    parser.add_argument('--root', default=str(PROJECT_ROOT), help='待测项目根目录')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    print(f"项目目录: {root}")
+
+    for module in ('main', 'web.app', 'src.chess_analyzer'):
+        report(f"import {module}", measure_import(root, module, args.repeat))
+
+    first_response = [measure_first_response(root, args.port, args.timeout) for _ in range(args.repeat)]
+    report("首个HTTP响应", first_response)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
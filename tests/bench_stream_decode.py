@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+流解码CPU基准
+对比全量解码（read）与按需解码（grab + 按采样间隔 retrieve）的CPU占用
+
+用法:
+  python tests/bench_stream_decode.py --video path/to/game.mp4 --sample-interval 3
+  python tests/bench_stream_decode.py --generate   # 生成一段 1280x720@30fps 的测试视频
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+import logging
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.stream_processor import RTMPStreamProcessor
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def generate_video(path: Path, seconds: int = 20, fps: int = 30, size=(1280, 720)) -> int:
+    """生成带运动内容的测试视频，返回帧数"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    total = seconds * fps
+    for index in range(total):
+        frame = np.roll(background, index * 4, axis=1)
+        cv2.putText(frame, str(index), (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 5)
+        writer.write(frame)
+    writer.release()
+    return total
+
+
+def measure(video: str, total_frames: int, sample_interval) -> tuple:
+    """读取整段视频，返回 (CPU秒, 墙钟秒, 读取帧数, 解码帧数)"""
+    processor = RTMPStreamProcessor(video, sample_interval=sample_interval)
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    processor.start()
+
+    while processor.frame_count < total_frames and processor.is_running():
+        time.sleep(0.01)
+
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    grabbed, decoded = processor.frame_count, processor.decoded_count
+    processor.stop()
+    return cpu, wall, grabbed, decoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流解码CPU基准')
+    parser.add_argument('--video', default='bench_stream.mp4')
+    parser.add_argument('--generate', action='store_true', help='生成测试视频')
+    parser.add_argument('--sample-interval', type=float, default=3.0)
+    args = parser.parse_args()
+
+    if args.generate or not Path(args.video).exists():
+        generate_video(Path(args.video))
+
+    capture = cv2.VideoCapture(args.video)
+    total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) - 1
+    capture.release()
+
+    # 文件源不受实时帧率限制，读取速度远快于直播流，按需解码模式下实际解码的帧数会比
+    # 实时流更少；比较时关注"每帧CPU"：按需模式的每帧开销接近只做 grab() 的下限
+    for name, interval in (('全量解码', None), ('按需解码', args.sample_interval)):
+        cpu, wall, grabbed, decoded = measure(args.video, total_frames, interval)
+        print(f"{name}: CPU {cpu:.2f}s, 墙钟 {wall:.2f}s, 读取 {grabbed} 帧, 解码 {decoded} 帧, "
+              f"每帧CPU {cpu / max(grabbed, 1) * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
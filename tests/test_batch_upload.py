@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+批量上传接口测试：多张图片和 zip 压缩包，NDJSON 按完成顺序输出
+"""
+
+import io
+import sys
+import json
+import time
+import zipfile
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.job_queue import JobQueue
+from src.result_cache import ResultCache
+import web.app as web_app
+
+
+class FakeAnalyzer:
+    """记录同时进行的分析数；亮度 200 的图片分析得慢"""
+
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def analyze_image(self, image, think_time):
+        with FakeAnalyzer.lock:
+            FakeAnalyzer.active += 1
+            FakeAnalyzer.peak = max(FakeAnalyzer.peak, FakeAnalyzer.active)
+        time.sleep(0.3 if image[0, 0, 0] == 200 else 0.05)
+        with FakeAnalyzer.lock:
+            FakeAnalyzer.active -= 1
+        return {'fen': str(image[0, 0, 0]), 'detect_time': 0.01, 'confidence': 1.0,
+                'transformed_board': image}
+
+
+def png(value):
+    return cv2.imencode('.png', np.full((30, 40, 3), value, dtype=np.uint8))[1].tobytes()
+
+
+def run_batch(data, workers=2):
+    """用测试客户端调用批量接口，返回解析后的各行"""
+    original = (web_app.job_queue, web_app.upload_cache, web_app.user_manager.is_logged_in)
+    web_app.job_queue = JobQueue(FakeAnalyzer, web_app.run_upload_job, workers=workers)
+    web_app.upload_cache = ResultCache()
+    web_app.user_manager.is_logged_in = lambda session_id: True
+    FakeAnalyzer.peak = 0
+    try:
+        client = web_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['session_id'] = 'test'
+        response = client.post('/api/upload/batch', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    finally:
+        web_app.job_queue.stop()
+        web_app.job_queue, web_app.upload_cache, web_app.user_manager.is_logged_in = original
+    return lines
+
+
+def test_multiple_images_stream_in_completion_order():
+    """多张图片分散到各工作线程，先完成的先输出；重复和无法读取的图片立即输出"""
+    files = [(io.BytesIO(png(value)), f'{value}.png') for value in (200, 10, 20)]
+    files += [(io.BytesIO(png(10)), 'again.png'), (io.BytesIO(b'not an image'), 'bad.png')]
+    lines = run_batch({'image': files})
+
+    summary = lines[-1]
+    results = {line['name']: line for line in lines[:-1]}
+    assert summary['summary']
+    assert (summary['total'], summary['done'], summary['failed']) == (5, 4, 1)
+
+    assert results['bad.png']['error'] == '无法读取图片'
+    assert results['200.png']['result']['fen'] == '200'
+    # 慢的第一张在后面的图片之后完成
+    names = [line['name'] for line in lines[:-1]]
+    assert names.index('200.png') > names.index('20.png')
+    assert FakeAnalyzer.peak == 2
+
+
+def test_zip_archive_bounded_in_flight():
+    """压缩包中的图片逐个读取，进行中的任务不超过工作线程数的两倍"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for value in range(8):
+            archive.writestr(f'games/{value}.png', png(value * 20 + 1))
+        archive.writestr('readme.txt', 'skip')
+    buffer.seek(0)
+
+    window = []
+    original_submit = JobQueue.submit
+
+    def submit(self, payload, owner=None):
+        window.append(self.get_stats()['queued'] + self.get_stats()['running'])
+        return original_submit(self, payload, owner)
+
+    JobQueue.submit = submit
+    try:
+        lines = run_batch({'archive': (buffer, 'games.zip')}, workers=1)
+    finally:
+        JobQueue.submit = original_submit
+
+    assert lines[-1]['total'] == 8 and lines[-1]['done'] == 8
+    assert sorted(line['name'] for line in lines[:-1]) == [f'games/{value}.png' for value in range(8)]
+    assert max(window) < 2
+
+
+def test_zip_archive_limits():
+    """压缩包的条目数、图片数、解压后总大小超限时整包拒绝；单张超限的图片记为失败"""
+    def archive_of(count, extra=0):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for value in range(count):
+                archive.writestr(f'{value}.png', png(value + 1))
+            for index in range(extra):
+                archive.writestr(f'{index}.txt', 'skip')
+        buffer.seek(0)
+        return buffer
+
+    def post(buffer):
+        client = web_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['session_id'] = 'test'
+        return client.post('/api/upload/batch', data={'archive': (buffer, 'games.zip')},
+                           content_type='multipart/form-data')
+
+    original = (web_app.user_manager.is_logged_in, web_app.analysis_config['batch_max_images'],
+                web_app.BATCH_MAX_ARCHIVE_MEMBERS, web_app.BATCH_MAX_ARCHIVE_BYTES)
+    web_app.user_manager.is_logged_in = lambda session_id: True
+    try:
+        web_app.analysis_config['batch_max_images'] = 3
+        response = post(archive_of(4))
+        assert response.status_code == 400 and '3 张' in response.get_json()['error']
+
+        web_app.BATCH_MAX_ARCHIVE_MEMBERS = 5
+        response = post(archive_of(2, extra=4))
+        assert response.status_code == 400 and '条目' in response.get_json()['error']
+
+        web_app.BATCH_MAX_ARCHIVE_MEMBERS = original[2]
+        web_app.BATCH_MAX_ARCHIVE_BYTES = len(png(1)) * 2
+        response = post(archive_of(3))
+        assert response.status_code == 400 and '解压后' in response.get_json()['error']
+    finally:
+        (web_app.user_manager.is_logged_in, web_app.analysis_config['batch_max_images'],
+         web_app.BATCH_MAX_ARCHIVE_MEMBERS, web_app.BATCH_MAX_ARCHIVE_BYTES) = original
+
+    sizes = [len(png(value + 1)) for value in range(2)]
+    original_limit = web_app.BATCH_MAX_IMAGE_BYTES
+    web_app.BATCH_MAX_IMAGE_BYTES = min(sizes) - 1
+    try:
+        lines = run_batch({'archive': (archive_of(2), 'games.zip')})
+    finally:
+        web_app.BATCH_MAX_IMAGE_BYTES = original_limit
+    assert lines[-1]['total'] == 2 and lines[-1]['failed'] == 2
+    assert all('MB 的上限' in line['error'] for line in lines[:-1])
+
+
+def test_stopped_or_full_queue_does_not_hang():
+    """队列停止时立即输出失败行；队列一直满时等待有上限"""
+    queue = JobQueue(FakeAnalyzer, web_app.run_upload_job, workers=1)
+    queue.stop()
+    original = web_app.upload_cache
+    web_app.upload_cache = ResultCache()
+    try:
+        start = time.time()
+        lines = [json.loads(line) for line in
+                 web_app.batch_results([('a.png', lambda: png(1)), ('b.png', lambda: png(2))], queue)]
+    finally:
+        web_app.upload_cache = original
+    assert time.time() - start < 1
+    assert [line['error'] for line in lines[:-1]] == ['任务队列已停止'] * 2
+    assert lines[-1]['failed'] == 2
+
+    full = JobQueue(FakeAnalyzer, web_app.run_upload_job, max_jobs=0)
+    start = time.time()
+    job, error = web_app.submit_batch_job(full, {}, timeout=0.2)
+    assert job is None and '已满' in error
+    assert 0.2 <= time.time() - start < 1
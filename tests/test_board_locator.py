@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+棋盘区域定位与区域截图测试
+"""
+
+import sys
+import types
+import random
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.board_locator import find_board_roi
+from src.board_renderer import BoardRenderer, random_position, INITIAL_FEN
+from src.stream_processor import EmulatorCapture, ScreenCapture
+
+
+def make_screen(fen=INITIAL_FEN, origin=(600, 200), size=(432, 480), seed=0):
+    """在带界面杂物的 1920x1080 画布上放一张棋盘，返回 (画布, 棋盘四角的屏幕坐标)"""
+    rng = random.Random(seed)
+    canvas = np.full((1080, 1920, 3), 200, dtype=np.uint8)
+    for _ in range(10):
+        x, y = rng.randrange(1700), rng.randrange(950)
+        cv2.rectangle(canvas, (x, y), (x + rng.randrange(50, 200), y + rng.randrange(20, 100)),
+                      (rng.randrange(255),) * 3, rng.choice([1, 2, -1]))
+    cv2.putText(canvas, 'xiangqi', (50, 1050), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+
+    image, label = BoardRenderer().render(fen, size=size, noise=3, seed=seed)
+    x, y = origin
+    canvas[y:y + size[1], x:x + size[0]] = image
+    return canvas, np.array(label['corners']) + origin
+
+
+def contains(roi, points):
+    x, y, width, height = roi
+    return all(x <= px <= x + width and y <= py <= y + height for px, py in points)
+
+
+def test_finds_board_among_clutter():
+    """不同位置、大小和局面的棋盘都能被完整框住"""
+    rng = random.Random(1)
+    for seed, (origin, size) in enumerate([((600, 200), (432, 480)), ((100, 40), (720, 800)),
+                                           ((1400, 600), (324, 360))]):
+        canvas, corners = make_screen(random_position(rng), origin, size, seed)
+        roi = find_board_roi(canvas)
+        assert roi is not None
+        assert contains(roi, corners)
+        # 只截取棋盘附近，而不是大半个屏幕
+        assert roi[2] * roi[3] < 1.5 * size[0] * size[1]
+
+
+def test_no_board_returns_none():
+    """没有棋盘时返回 None"""
+    canvas = np.full((1080, 1920, 3), 200, dtype=np.uint8)
+    cv2.rectangle(canvas, (100, 100), (700, 700), (0, 0, 0), 2)
+    assert find_board_roi(canvas) is None
+
+
+class FakeScreenCapture(ScreenCapture):
+    """从内存画布截图的屏幕截取器，记录每次截取的区域"""
+
+    def __init__(self, canvas, **kwargs):
+        super().__init__(**kwargs)
+        self.canvas = canvas
+        self.grabs = []
+
+    def _detect_capture_method(self):
+        self.capture_method = 'fake'
+
+    def _base_region(self, window_title=None, region=None):
+        return tuple(region) if region else (0, 0, self.canvas.shape[1], self.canvas.shape[0])
+
+    def _grab(self, region):
+        self.grabs.append(region)
+        x, y, width, height = region
+        return self.canvas[y:y + height, x:x + width].copy()
+
+
+def test_screen_capture_grabs_only_roi():
+    """第一帧整屏定位，之后只截取棋盘区域"""
+    canvas, corners = make_screen()
+    capture = FakeScreenCapture(canvas, verify_interval=100)
+
+    first = capture.capture_window()
+    assert capture.grabs == [(0, 0, 1920, 1080)]
+    assert capture.roi is not None and contains(capture.roi, corners)
+    assert first.shape[:2] == (capture.roi[3], capture.roi[2])
+
+    for _ in range(5):
+        frame = capture.capture_window()
+    assert capture.grabs[1:] == [capture.roi] * 5
+    assert frame.shape == first.shape
+
+
+def test_screen_capture_relocates_moved_board():
+    """校验发现区域内已没有棋盘时重新整屏定位"""
+    canvas, _ = make_screen(origin=(100, 100))
+    capture = FakeScreenCapture(canvas, verify_interval=3)
+    capture.capture_window()
+    old_roi = capture.roi
+
+    moved, corners = make_screen(origin=(1300, 500))
+    capture.canvas = moved
+    for _ in range(3):
+        capture.capture_window()
+
+    assert capture.grabs[-1] == (0, 0, 1920, 1080)
+    assert capture.roi != old_roi and contains(capture.roi, corners)
+
+
+def test_screen_capture_without_auto_roi():
+    """关闭 auto_roi 时每次截取整个区域"""
+    canvas, _ = make_screen()
+    capture = FakeScreenCapture(canvas, auto_roi=False)
+    frame = capture.capture_window(region=(10, 20, 300, 200))
+    assert frame.shape == (200, 300, 3)
+    assert capture.roi is None
+
+
+def fake_screen_modules(mss_fails=False, windows=()):
+    """伪造的 mss / pyautogui 模块（pyautogui 带窗口枚举），返回 (模块字典, 各自的截图次数和截图区域)"""
+    calls = {'mss': 0, 'pyautogui': 0}
+    regions = []
+
+    class Grabber:
+        monitors = [{'top': 0, 'left': 0, 'width': 40, 'height': 30}]
+
+        def grab(self, monitor):
+            calls['mss'] += 1
+            regions.append((monitor['left'], monitor['top'], monitor['width'], monitor['height']))
+            if mss_fails:
+                raise RuntimeError('XGetImage() failed')
+            return np.zeros((monitor['height'], monitor['width'], 4), dtype=np.uint8)
+
+        def close(self):
+            pass
+
+    def screenshot(region=None):
+        calls['pyautogui'] += 1
+        return np.zeros((30, 40, 3), dtype=np.uint8)
+
+    def get_all_windows():
+        return list(windows)
+
+    def get_windows_with_title(title):
+        return [w for w in windows if title.lower() in w.title.lower()]
+
+    modules = {'mss': types.SimpleNamespace(mss=Grabber),
+               'pyautogui': types.SimpleNamespace(screenshot=screenshot, getAllWindows=get_all_windows,
+                                                  getWindowsWithTitle=get_windows_with_title)}
+    return modules, calls, regions
+
+
+def with_modules(modules, run):
+    saved = {name: sys.modules.get(name) for name in modules}
+    sys.modules.update(modules)
+    try:
+        return run()
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+def test_screen_capture_prefers_mss():
+    """mss 和 pyautogui 都可用时使用 mss（常驻截图对象）"""
+    modules, calls, _ = fake_screen_modules()
+
+    def run():
+        capture = ScreenCapture(auto_roi=False)
+        frame = capture.capture_window(region=(0, 0, 40, 30))
+        return capture.capture_method, frame.shape
+
+    assert with_modules(modules, run) == ('mss', (30, 40, 3))
+    assert calls == {'mss': 1, 'pyautogui': 0}
+
+
+def test_screen_capture_falls_back_to_pyautogui():
+    """mss 无法截图时改用 pyautogui"""
+    modules, calls, _ = fake_screen_modules(mss_fails=True)
+
+    def run():
+        capture = ScreenCapture(auto_roi=False)
+        frames = [capture.capture_window(region=(0, 0, 40, 30)) for _ in range(2)]
+        return capture.capture_method, [frame.shape for frame in frames]
+
+    assert with_modules(modules, run) == ('pyautogui', [(30, 40, 3)] * 2)
+    assert calls == {'mss': 1, 'pyautogui': 2}
+
+
+def test_windows_found_while_grabbing_with_mss():
+    """用 mss 截图时仍通过 pyautogui 枚举和定位窗口，只有像素截取走 mss"""
+    window = types.SimpleNamespace(title='MuMu模拟器12', left=100, top=50, width=40, height=30)
+    other = types.SimpleNamespace(title='记事本', left=0, top=0, width=10, height=10)
+    modules, calls, regions = fake_screen_modules(windows=[other, window])
+
+    def run():
+        capture = ScreenCapture(auto_roi=False)
+        emulator = EmulatorCapture('MuMu', screen_capture=capture)
+        by_title = capture.capture_window(window_title='MuMu')
+        return capture.capture_method, emulator.window, emulator.capture().shape, by_title.shape
+
+    assert with_modules(modules, run) == ('mss', window, (30, 40, 3), (30, 40, 3))
+    assert regions == [(100, 50, 40, 30)] * 2
+    assert calls == {'mss': 2, 'pyautogui': 0}
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+合成棋盘渲染器测试
+"""
+
+import sys
+import random
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.board_renderer import BoardRenderer, fen_to_grid, grid_to_fen, random_position, INITIAL_FEN
+
+
+def test_fen_round_trip():
+    """FEN 展开后能还原"""
+    assert grid_to_fen(fen_to_grid(INITIAL_FEN)) == INITIAL_FEN
+
+
+def test_random_position_keeps_kings():
+    """随机局面保留双方将帅"""
+    rng = random.Random(7)
+    for _ in range(20):
+        fen = random_position(rng)
+        cells = [cell for row in fen_to_grid(fen) for cell in row]
+        assert cells.count('K') == 1 and cells.count('k') == 1
+
+
+def test_render_size_and_label():
+    """渲染尺寸和标注正确"""
+    image, label = BoardRenderer().render(INITIAL_FEN, size=(360, 400), noise=5,
+                                          perspective=0.05, lighting=0.3, seed=1)
+    assert image.shape == (400, 360, 3)
+    assert label['fen'] == INITIAL_FEN
+    assert len(label['corners']) == 4
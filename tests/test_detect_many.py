@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+多图并发检测测试：每个工作线程独占检测器实例，结果与输入顺序一致
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import src.chess_analyzer as chess_analyzer
+
+LABELS = "\n".join(["rnbakabnr", ".........", ".c.....c.", "p.p.p.p.p", ".........",
+                    ".........", "P.P.P.P.P", ".C.....C.", ".........", "RNBAKABNR"])
+
+
+def test_detect_many_uses_one_instance_per_worker():
+    """同一检测器实例不会被两个线程同时使用，慢图片不阻塞其他图片，结果按输入顺序返回"""
+    instances = []
+    overlaps = []
+    waited = []
+    last_started = threading.Event()
+
+    class FakeCore:
+        def __init__(self, pose_model_path, full_classifier_model_path):
+            self.busy = False
+            instances.append(self)
+
+        def pred_detect_board_and_classifier(self, image):
+            if self.busy:
+                overlaps.append(self)
+            self.busy = True
+            value = int(image[0, 0, 0])
+            if value == 8:
+                last_started.set()
+            if value == 0:
+                # 第一张图片一直处理到最后一张开始；按批等待时最后一张要等它结束，这里会超时
+                waited.append(last_started.wait(timeout=5))
+            else:
+                time.sleep(0.01)
+            self.busy = False
+            board = np.full((100, 90, 3), 255, dtype=np.uint8)
+            return image, board, LABELS, [[float(image[0, 0, 0])] * 9 for _ in range(10)], {}
+
+    load_core, core = chess_analyzer._load_core, chess_analyzer.OriginalDetector
+    chess_analyzer._load_core = lambda: True
+    chess_analyzer.OriginalDetector = FakeCore
+    try:
+        detector = chess_analyzer.ChessboardDetector('', '')
+        detector.enable_red_flip = False
+        images = [np.full((4, 4, 3), value, dtype=np.uint8) for value in range(9)]
+
+        threads = set()
+        original = detector._detect_with
+
+        def record(instance, image):
+            threads.add(threading.current_thread().name)
+            return original(instance, image)
+
+        detector._detect_with = record
+        results = detector.detect_many(images, workers=3)
+
+        assert [result['scores'][0][0] for result in results] == list(range(9))
+        assert len(instances) == 3 and instances[0] is detector.detector
+        assert not overlaps
+        assert waited == [True]
+        assert len(threads) == 3
+
+        # 再次调用复用已创建的实例
+        detector.detect_many(images[:2], workers=3)
+        assert len(instances) == 3
+    finally:
+        chess_analyzer._load_core, chess_analyzer.OriginalDetector = load_core, core
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+模拟器窗口缓存测试
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.stream_processor import EmulatorCapture, ScreenCapture
+
+
+class FakeWindow:
+    """窗口对象，closed 后读取位置抛出异常（与句柄失效时一致）"""
+
+    def __init__(self, title, left=0, top=0, width=400, height=300):
+        self.title = title
+        self.box = (left, top, width, height)
+        self.closed = False
+        self.reads = 0
+
+    def _get(self, index):
+        if self.closed:
+            raise RuntimeError('invalid window handle')
+        self.reads += 1
+        return self.box[index]
+
+    left = property(lambda self: self._get(0))
+    top = property(lambda self: self._get(1))
+    width = property(lambda self: self._get(2))
+    height = property(lambda self: self._get(3))
+
+
+class FakeScreen(ScreenCapture):
+    """记录窗口枚举次数和截图区域的屏幕截取器"""
+
+    def __init__(self, windows):
+        super().__init__(auto_roi=False)
+        self.windows = windows
+        self.enumerations = 0
+        self.grabs = []
+        self.fail = False
+
+    def _detect_capture_method(self):
+        self.capture_method = 'fake'
+
+    def get_windows(self):
+        self.enumerations += 1
+        return list(self.windows)
+
+    def _base_region(self, window_title=None, region=None):
+        return tuple(region)
+
+    def _grab(self, region):
+        self.grabs.append(region)
+        if self.fail:
+            return None
+        return np.zeros((region[3], region[2], 3), dtype=np.uint8)
+
+
+def make_capture(windows, geometry_interval=0.5):
+    screen = FakeScreen(windows)
+    return EmulatorCapture('MuMu', geometry_interval=geometry_interval, screen_capture=screen), screen
+
+
+def test_window_enumerated_once():
+    """连续截图和检查运行状态都不再枚举窗口"""
+    window = FakeWindow('MuMu模拟器12', 10, 20, 400, 300)
+    capture, screen = make_capture([FakeWindow('Explorer'), window])
+
+    for _ in range(20):
+        frame = capture.capture()
+        assert capture.is_emulator_running()
+
+    assert screen.enumerations == 1
+    assert frame.shape == (300, 400, 3)
+    assert set(screen.grabs) == {(10, 20, 400, 300)}
+    # 检查间隔内只通过句柄读取一次位置
+    assert window.reads == 4
+
+
+def test_moved_window_picked_up():
+    """窗口移动后，到检查间隔时通过句柄读到新位置"""
+    window = FakeWindow('MuMu', 0, 0, 400, 300)
+    capture, screen = make_capture([window], geometry_interval=0.05)
+    capture.capture()
+
+    window.box = (100, 50, 640, 480)
+    capture.capture()
+    assert screen.grabs[-1] == (0, 0, 400, 300)
+
+    time.sleep(0.06)
+    assert capture.capture().shape == (480, 640, 3)
+    assert screen.grabs[-1] == (100, 50, 640, 480)
+    assert screen.enumerations == 1
+
+
+def test_failed_grab_refreshes_geometry():
+    """截图失败后下一帧立即重新读取窗口区域"""
+    window = FakeWindow('夜神模拟器', 0, 0, 400, 300)
+    capture, screen = make_capture([window], geometry_interval=60)
+    capture.capture()
+
+    window.box = (5, 5, 200, 100)
+    screen.fail = True
+    assert capture.capture() is None
+    screen.fail = False
+    capture.capture()
+    assert screen.grabs[-1] == (5, 5, 200, 100)
+
+
+def test_closed_window_searched_again():
+    """窗口关闭后按限频重新枚举，找到新窗口后继续截图"""
+    window = FakeWindow('MuMu', 0, 0, 400, 300)
+    capture, screen = make_capture([window], geometry_interval=0)
+    capture.search_interval = 0
+    capture.capture()
+
+    window.closed = True
+    screen.windows = []
+    assert capture.capture() is None
+    assert not capture.is_emulator_running()
+
+    screen.windows = [FakeWindow('MuMu', 30, 40, 200, 100)]
+    assert capture.capture().shape == (100, 200, 3)
+    assert capture.is_emulator_running()
+    assert screen.enumerations == 3
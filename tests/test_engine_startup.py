@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+引擎启动测试：后台预热与分析同时启动引擎时只启动一个进程
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import src.chess_analyzer as chess_analyzer
+
+
+class FakeEngine:
+    """启动较慢的假引擎，记录创建和关闭"""
+
+    created = []
+
+    def __init__(self, path):
+        time.sleep(0.05)
+        self.closed = False
+        FakeEngine.created.append(self)
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeDetector:
+    def __init__(self, pose_model_path, classifier_model_path):
+        pass
+
+
+def test_concurrent_start_spawns_one_engine():
+    """并发启动只创建一个引擎；关闭后不再启动新进程"""
+    FakeEngine.created = []
+    original = (chess_analyzer.PikafishEngine, chess_analyzer.ChessboardDetector)
+    chess_analyzer.PikafishEngine, chess_analyzer.ChessboardDetector = FakeEngine, FakeDetector
+    try:
+        analyzer = chess_analyzer.XiangqiAnalyzer('engine', 'pose', 'classifier')
+        threads = [threading.Thread(target=analyzer._ensure_engine_started) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(FakeEngine.created) == 1
+
+        analyzer.quit()
+        assert FakeEngine.created[0].closed
+        try:
+            analyzer._ensure_engine_started()
+            assert False, '关闭后不应再启动引擎'
+        except RuntimeError:
+            pass
+        assert len(FakeEngine.created) == 1
+    finally:
+        chess_analyzer.PikafishEngine, chess_analyzer.ChessboardDetector = original
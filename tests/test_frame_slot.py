@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+最新帧缓冲测试
+"""
+
+import io
+import sys
+import time
+import threading
+from pathlib import Path
+
+import ffmpeg
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.stream_processor import FFmpegStreamProcessor, FrameSlot, RTMPStreamProcessor
+
+
+def test_latest_keeps_newest_frame():
+    """只保留最新一帧，序号递增"""
+    slot = FrameSlot()
+    assert slot.latest() == (None, 0, 0.0)
+
+    slot.publish('a', timestamp=1.0)
+    seq = slot.publish('b', timestamp=2.0)
+    assert seq == 2
+    assert slot.latest() == ('b', 2, 2.0)
+
+
+def test_wait_newer_returns_immediately_when_available():
+    """已有更新的帧时立即返回"""
+    slot = FrameSlot()
+    slot.publish('a')
+    frame, seq, _ = slot.wait_newer(0, timeout=0)
+    assert (frame, seq) == ('a', 1)
+
+
+def test_wait_newer_blocks_until_publish():
+    """等待新帧直到生产者发布"""
+    slot = FrameSlot()
+    slot.publish('a')
+
+    threading.Timer(0.05, slot.publish, args=('b',)).start()
+    start = time.time()
+    frame, seq, _ = slot.wait_newer(1, timeout=2)
+    assert (frame, seq) == ('b', 2)
+    assert time.time() - start < 1
+
+
+def test_wait_newer_timeout():
+    """超时返回 None"""
+    slot = FrameSlot()
+    slot.publish('a')
+    assert slot.wait_newer(1, timeout=0.01) == (None, 1, 0.0)
+
+
+def test_closest_by_capture_time_and_pts():
+    """按采集时间或流时间戳选取最接近的历史帧"""
+    slot = FrameSlot(history=3)
+    slot.publish('a', timestamp=10.0, pts=0.0)
+    slot.publish('b', timestamp=10.1, pts=2.0)
+    slot.publish('c', timestamp=10.2, pts=4.0)
+
+    assert slot.closest(10.09)[0] == 'b'
+    assert slot.closest(3.5, clock='pts')[0] == 'c'
+    assert slot.pts(2) == 2.0
+    assert slot.pts(99) is None
+
+
+def test_history_is_bounded():
+    """历史只保留最近 history 帧"""
+    slot = FrameSlot(history=2)
+    for index, frame in enumerate('abc'):
+        slot.publish(frame, timestamp=float(index))
+    assert slot.closest(0.0)[0] == 'b'
+
+
+def test_processor_frame_near_waits_for_future_frame():
+    """目标时间晚于最新帧时等待新帧"""
+    processor = RTMPStreamProcessor('unused://', history_size=4)
+    processor._publish('a', 100.0, 0.0)
+
+    threading.Timer(0.05, processor._publish, args=('b', 101.0, 1.0)).start()
+    frame, seq, _ = processor.get_frame_near(1.0, clock='pts', timeout=2)
+    assert (frame, seq) == ('b', 2)
+
+    # 过去的时间点从历史中选取
+    assert processor.get_frame_near(0.2, clock='pts')[0] == 'a'
+
+
+def test_processor_interval_by_pts():
+    """按流时间戳计算采样间隔，与读取速度无关"""
+    processor = RTMPStreamProcessor('unused://', history_size=4)
+    processor._publish('a', 100.0, 0.0)
+    assert processor.get_frame_at_interval(1.0, clock='pts') == 'a'
+
+    processor._publish('b', 100.0, 0.5)
+    threading.Timer(0.05, processor._publish, args=('c', 100.0, 1.0)).start()
+    assert processor.get_frame_at_interval(1.0, clock='pts') == 'c'
+
+
+class FakePipe:
+    """ffmpeg 的 stdout：读完后让处理器停止"""
+
+    def __init__(self, data: bytes, processor):
+        self.data = io.BytesIO(data)
+        self.processor = processor
+
+    def readinto(self, view):
+        count = self.data.readinto(view)
+        if not count:
+            self.processor.running = False
+        return count
+
+
+def test_ffmpeg_frames_are_not_overwritten():
+    """管道后端发布的帧不被后续帧覆盖，长期持有的帧内容不变"""
+    processor = FFmpegStreamProcessor('unused://', output_size=(6, 4), history_size=8)
+    processor.width, processor.height = 6, 4
+    processor.pts_fps = 2.0
+    raw = b''.join(bytes([value]) * (6 * 4 * 3) for value in range(5))
+    processor.process = type('Process', (), {'stdout': FakePipe(raw, processor)})()
+
+    held = []
+    processor._publish = lambda frame, captured_at, pts: held.append((frame, pts))
+    processor.running = True
+    processor._read_frames()
+
+    assert [int(frame[0, 0, 0]) for frame, _ in held] == [0, 1, 2, 3, 4]
+    assert [pts for _, pts in held] == [0.0, 0.5, 1.0, 1.5, 2.0]
+
+
+def test_ffmpeg_unknown_frame_rate_has_no_pts():
+    """探测不到帧率时不假定 30fps，帧不带 PTS"""
+    processor = FFmpegStreamProcessor('unused://', output_size=(6, 4))
+
+    def failing_probe(url):
+        raise ffmpeg.Error('ffprobe', b'', b'')
+
+    original = (ffmpeg.probe, ffmpeg.nodes.OutputStream.run_async)
+    ffmpeg.probe = failing_probe
+    ffmpeg.nodes.OutputStream.run_async = lambda self, **kwargs: None
+    try:
+        assert processor._open()
+    finally:
+        ffmpeg.probe, ffmpeg.nodes.OutputStream.run_async = original
+    assert processor.pts_fps is None
+
+    processor.process = type('Process', (), {'stdout': FakePipe(bytes(6 * 4 * 3), processor)})()
+    held = []
+    processor._publish = lambda frame, captured_at, pts: held.append(pts)
+    processor.running = True
+    processor._read_frames()
+    assert held == [None]
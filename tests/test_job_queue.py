@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+上传分析任务队列测试
+"""
+
+import io
+import sys
+import time
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.job_queue import Job, JobQueue
+import web.app as web_app
+
+
+class FakeAnalyzer:
+    """记录创建次数，quit 时标记"""
+
+    created = 0
+
+    def __init__(self):
+        FakeAnalyzer.created += 1
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+
+def gated_handler(gate):
+    """等待 gate 放行后返回结果；payload 为 'bad' 时抛异常，为 'none' 时返回 None"""
+    def handle(analyzer, payload):
+        gate.wait(2)
+        if payload == 'bad':
+            raise ValueError('无法识别')
+        return None if payload == 'none' else {'fen': payload}
+    return handle
+
+
+def test_submit_returns_immediately_with_position_and_eta():
+    """提交立即返回，排队任务报告位置和预计时间，完成后可取到结果"""
+    gate = threading.Event()
+    FakeAnalyzer.created = 0
+    queue = JobQueue(FakeAnalyzer, gated_handler(gate), workers=1, initial_estimate=2.0)
+
+    start = time.time()
+    jobs = [queue.submit(f'p{index}') for index in range(3)]
+    assert time.time() - start < 0.1
+    time.sleep(0.05)
+
+    running = queue.status(jobs[0])
+    assert running['state'] == Job.RUNNING
+    assert 0 < running['eta'] <= 2.0
+    second, third = queue.status(jobs[1]), queue.status(jobs[2])
+    assert (second['position'], third['position']) == (1, 2)
+    assert 2.0 < second['eta'] <= 4.0
+    assert abs(third['eta'] - second['eta'] - 2.0) < 0.02
+
+    gate.set()
+    assert all(job.wait(2) for job in jobs)
+    queue.stop()
+
+    status = queue.status(jobs[2])
+    assert status['state'] == Job.DONE
+    assert status['result'] == {'fen': 'p2'}
+    # 单个工作线程只创建一个分析器
+    assert FakeAnalyzer.created == 1
+    assert queue.get_stats()['completed'] == 3
+
+
+def test_eta_with_several_workers():
+    """多个工作线程时排队任务分摊到最早空闲的线程"""
+    queue = JobQueue(FakeAnalyzer, gated_handler(threading.Event()), workers=2, initial_estimate=1.0)
+    assert queue._eta(0, []) == 1.0
+    assert queue._eta(1, []) == 1.0
+    assert queue._eta(2, []) == 2.0
+    assert queue._eta(0, [0.5, 0.2]) == 1.5
+
+
+def test_rejects_when_full():
+    """排队加运行中的任务达到上限时拒绝新任务"""
+    gate = threading.Event()
+    queue = JobQueue(FakeAnalyzer, gated_handler(gate), max_jobs=2)
+    assert queue.submit('a') is not None
+    assert queue.submit('b') is not None
+    assert queue.submit('c') is None
+    assert queue.get_stats()['rejected'] == 1
+    gate.set()
+    queue.stop()
+
+
+def test_failures_and_on_finish():
+    """异常和空结果记为失败，结束回调收到每个任务"""
+    gate = threading.Event()
+    gate.set()
+    finished = []
+    queue = JobQueue(FakeAnalyzer, gated_handler(gate), on_finish=finished.append)
+
+    jobs = [queue.submit(payload, owner='sid-1') for payload in ('bad', 'none', 'ok')]
+    assert all(job.wait(2) for job in jobs)
+    time.sleep(0.02)
+    queue.stop()
+
+    assert [job.state for job in jobs] == [Job.FAILED, Job.FAILED, Job.DONE]
+    assert queue.status(jobs[0])['error'] == '无法识别'
+    assert queue.status(jobs[1])['error'] == '分析失败'
+    assert [job.owner for job in finished] == ['sid-1'] * 3
+    stats = queue.get_stats()
+    assert (stats['completed'], stats['failed']) == (1, 2)
+
+
+def test_finished_jobs_evicted_and_analyzer_closed():
+    """只保留最近的已结束任务；停止时关闭分析器"""
+    analyzers = []
+
+    def factory():
+        analyzers.append(FakeAnalyzer())
+        return analyzers[-1]
+
+    queue = JobQueue(factory, lambda analyzer, payload: payload, keep_finished=2)
+    jobs = [queue.submit(index + 1) for index in range(4)]
+    assert all(job.wait(2) for job in jobs)
+    queue.stop()
+
+    assert queue.get(jobs[0].id) is None
+    assert queue.get(jobs[3].id) is jobs[3]
+    assert all(analyzer.closed for analyzer in analyzers)
+
+
+def test_stop_fails_queued_jobs():
+    """停止时排队中的任务直接失败，等待者立即返回；停止后不再接受任务"""
+    gate = threading.Event()
+    queue = JobQueue(FakeAnalyzer, gated_handler(gate), workers=1)
+    running = queue.submit('a')
+    time.sleep(0.05)
+    queued = queue.submit('b')
+
+    stopper = threading.Thread(target=queue.stop)
+    stopper.start()
+    assert queued.wait(1)
+    assert queue.status(queued) == {'job_id': queued.id, 'state': Job.FAILED,
+                                    'submitted_at': queued.submitted_at, 'error': '任务队列已停止'}
+    gate.set()
+    stopper.join()
+    assert running.wait(1) and running.state == Job.DONE
+    assert queue.stopped and queue.submit('c') is None
+
+
+def test_reset_analyzers_rebuilds_on_next_job():
+    """reset_analyzers 后工作线程关闭旧分析器，处理下一个任务前重新创建"""
+    analyzers = []
+
+    def factory():
+        analyzers.append(FakeAnalyzer())
+        return analyzers[-1]
+
+    queue = JobQueue(factory, lambda analyzer, payload: id(analyzer))
+    try:
+        first = queue.submit(1)
+        assert first.wait(2)
+        second = queue.submit(2)
+        assert second.wait(2) and second.result == first.result
+
+        queue.reset_analyzers()
+        third = queue.submit(3)
+        assert third.wait(2)
+        assert len(analyzers) == 2 and analyzers[0].closed
+        assert third.result == id(analyzers[1])
+    finally:
+        queue.stop()
+
+
+def test_web_workers_share_warm_analyzer_and_follow_config():
+    """第一个工作线程借用全局分析器，其余新建；模型路径变化时队列重建分析器"""
+    created = []
+
+    class FakeXiangqiAnalyzer:
+        def __init__(self, *paths):
+            created.append(paths)
+
+    resets = []
+
+    class FakeQueue:
+        def reset_analyzers(self):
+            resets.append(True)
+
+    original = (web_app.XiangqiAnalyzer, web_app.analyzer_leased, web_app.job_queue,
+                web_app.user_manager.is_logged_in, dict(web_app.analysis_config))
+    web_app.XiangqiAnalyzer = FakeXiangqiAnalyzer
+    web_app.analyzer_leased = False
+    web_app.job_queue = FakeQueue()
+    web_app.user_manager.is_logged_in = lambda session_id: True
+    try:
+        shared = web_app.lease_analyzer()
+        assert isinstance(shared, web_app.SharedAnalyzer)
+        assert not isinstance(web_app.lease_analyzer(), web_app.SharedAnalyzer)
+        assert len(created) == 1
+        shared.quit()
+        assert isinstance(web_app.lease_analyzer(), web_app.SharedAnalyzer)
+
+        client = web_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['session_id'] = 'config-test'
+        client.post('/api/config', json={'think_time': 1000})
+        assert not resets
+        client.post('/api/config', json={'pose_model_path': 'other.onnx'})
+        assert resets == [True]
+    finally:
+        (web_app.XiangqiAnalyzer, web_app.analyzer_leased, web_app.job_queue,
+         web_app.user_manager.is_logged_in, config) = original
+        web_app.analysis_config.clear()
+        web_app.analysis_config.update(config)
+
+
+def test_upload_owner_comes_from_server_session():
+    """结果只推送给属于当前会话的连接；其他会话的 sid 被忽略"""
+    owners = []
+
+    class FakeQueue:
+        def submit(self, payload, owner=None):
+            owners.append(owner)
+            return Job(payload, owner)
+
+        def status(self, job):
+            return {'job_id': job.id, 'state': job.state}
+
+    image = cv2.imencode('.png', np.full((30, 40, 3), 7, dtype=np.uint8))[1].tobytes()
+
+    original = (web_app.job_queue, web_app.upload_cache, web_app.user_manager.is_logged_in)
+    web_app.job_queue = FakeQueue()
+    web_app.upload_cache = web_app.ResultCache(max_entries=0)
+    web_app.user_manager.is_logged_in = lambda session_id: True
+    web_app.subscriptions.subscribe('mine', web_app.session_room('owner-test'))
+    web_app.subscriptions.subscribe('theirs', web_app.session_room('someone-else'))
+    try:
+        client = web_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['session_id'] = 'owner-test'
+        for sid in ('mine', 'theirs', ''):
+            response = client.post('/api/upload', data={'image': (io.BytesIO(image), 'a.png'), 'sid': sid},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 202
+    finally:
+        web_app.subscriptions.remove_client('mine')
+        web_app.subscriptions.remove_client('theirs')
+        web_app.job_queue, web_app.upload_cache, web_app.user_manager.is_logged_in = original
+
+    assert owners == ['mine', 'session:owner-test', 'session:owner-test']
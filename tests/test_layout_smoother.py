@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+布局平滑器测试
+验证多帧投票能过滤单格抖动，并在新布局稳定后提交
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.layout_smoother import LayoutSmoother
+
+BASE = ["rnbakabnr", ".........", ".c.....c.", "p.p.p.p.p", ".........",
+        ".........", "P.P.P.P.P", ".C.....C.", ".........", "RNBAKABNR"]
+
+
+def make_result(rows, score=0.9):
+    """构造检测结果"""
+    return {
+        'cell_labels_str': "\n".join(rows),
+        'scores': [[score] * 9 for _ in range(10)],
+    }
+
+
+def moved(rows, src, dst):
+    """生成走子后的布局"""
+    grid = [list(row) for row in rows]
+    (si, sj), (di, dj) = src, dst
+    grid[di][dj], grid[si][sj] = grid[si][sj], '.'
+    return ["".join(row) for row in grid]
+
+
+def test_first_layout_committed():
+    """首个高置信度布局直接提交"""
+    smoother = LayoutSmoother(window=5, persist_frames=3, confidence_margin=0.5)
+    result = smoother.update(make_result(BASE))
+    assert result is not None
+    assert result['layout_changed']
+    assert result['cell_labels_str'] == "\n".join(BASE)
+
+
+def test_single_frame_flicker_ignored():
+    """单帧抖动不会改变已提交布局"""
+    smoother = LayoutSmoother(window=5, persist_frames=3, confidence_margin=0.5)
+    for _ in range(3):
+        smoother.update(make_result(BASE))
+
+    flicker = list(BASE)
+    flicker[4] = "....p...."
+    result = smoother.update(make_result(flicker, score=0.6))
+    assert not result['layout_changed']
+    assert result['cell_labels_str'] == "\n".join(BASE)
+
+
+def test_persistent_change_committed():
+    """持续出现的新布局最终被提交"""
+    smoother = LayoutSmoother(window=5, persist_frames=3, confidence_margin=0.5)
+    for _ in range(5):
+        smoother.update(make_result(BASE))
+
+    new_rows = moved(BASE, (7, 1), (7, 4))
+    changed = []
+    for _ in range(8):
+        changed.append(smoother.update(make_result(new_rows))['layout_changed'])
+
+    assert changed.count(True) == 1
+    assert smoother.committed_layout == [list(row) for row in new_rows]
+
+
+def commit_frame(smoother, rows, score, frames=10):
+    """连续输入新布局，返回提交新布局的是第几帧（从1开始），未提交返回 None"""
+    for index in range(1, frames + 1):
+        if smoother.update(make_result(rows, score=score))['layout_changed']:
+            return index
+    return None
+
+
+def test_high_confidence_move_commits_quickly():
+    """高置信度的走子在第2帧提交，不必等投票窗口和连续帧数"""
+    smoother = LayoutSmoother()
+    for _ in range(5):
+        smoother.update(make_result(BASE))
+
+    new_rows = moved(BASE, (7, 1), (7, 4))
+    assert commit_frame(smoother, new_rows, score=0.99) == 2
+    assert smoother.committed_layout == [list(row) for row in new_rows]
+
+    # 提交后不会被窗口内的旧布局拉回
+    for _ in range(5):
+        assert not smoother.update(make_result(new_rows, score=0.99))['layout_changed']
+    assert smoother.committed_layout == [list(row) for row in new_rows]
+
+
+def test_low_confidence_move_waits_for_vote():
+    """低置信度的走子仍需投票结果连续稳定后才提交"""
+    smoother = LayoutSmoother()
+    for _ in range(5):
+        smoother.update(make_result(BASE))
+
+    frame = commit_frame(smoother, moved(BASE, (7, 1), (7, 4)), score=0.6)
+    assert frame is not None and frame > 2
+
+
+def test_missing_detection_keeps_layout():
+    """检测失败的帧返回已提交布局"""
+    smoother = LayoutSmoother()
+    assert smoother.update(None) is None
+    smoother.update(make_result(BASE))
+    result = smoother.update(None)
+    assert result['cell_labels_str'] == "\n".join(BASE)
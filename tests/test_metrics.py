@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+运行指标与 /metrics 端点测试
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.metrics import CAPTURE_SECONDS, QUEUE_DEPTH, REGISTRY, Registry
+from src.pipeline import StagedPipeline
+from src.stream_processor import FrameSlot, ScreenCapture
+import web.app as web_app
+
+
+def test_histogram_buckets_are_cumulative():
+    """直方图输出累计分桶、总和与次数"""
+    registry = Registry()
+    histogram = registry.histogram('demo_seconds', '演示', ['stage'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, stage='engine')
+
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{stage="engine",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="engine",le="1.0"} 3' in text
+    assert 'demo_seconds_bucket{stage="engine",le="+Inf"} 4' in text
+    assert 'demo_seconds_sum{stage="engine"} 4.25' in text
+    assert 'demo_seconds_count{stage="engine"} 4' in text
+
+
+def test_counter_gauge_and_collectors():
+    """计数器带 _total 后缀，无标签时输出 0；采集函数在输出前同步仪表"""
+    registry = Registry()
+    crashes = registry.counter('demo_crashes', '崩溃')
+    depth = registry.gauge('demo_depth', '深度', ['queue'])
+    queue = [1, 2, 3]
+    registry.add_collector(lambda: depth.set(len(queue), queue='jobs'))
+
+    text = registry.render()
+    assert '# TYPE demo_crashes_total counter\ndemo_crashes_total 0' in text
+    assert 'demo_depth{queue="jobs"} 3' in text
+
+    crashes.inc()
+    queue.pop()
+    text = registry.render()
+    assert 'demo_crashes_total 1' in text
+    assert 'demo_depth{queue="jobs"} 2' in text
+
+    try:
+        depth.set(1, stage='x')
+        assert False, '标签不匹配应报错'
+    except ValueError:
+        pass
+
+
+class FakeScreenCapture(ScreenCapture):
+    def _detect_capture_method(self):
+        self.capture_method = 'fake'
+
+    def _base_region(self, window_title=None, region=None):
+        return (0, 0, 64, 48)
+
+    def _grab(self, region):
+        return np.zeros((48, 64, 3), dtype=np.uint8)
+
+
+def test_metrics_endpoint_reports_pipeline():
+    """截图耗时、上传缓存命中率、队列深度和客户端数都出现在 /metrics 中"""
+    before = CAPTURE_SECONDS.count(source='screen')
+    FakeScreenCapture(auto_roi=False).capture_window()
+    assert CAPTURE_SECONDS.count(source='screen') == before + 1
+
+    original = web_app.user_manager.is_logged_in
+    web_app.user_manager.is_logged_in = lambda session_id: True
+    web_app.subscriptions.subscribe('metrics-viewer', 'live')
+    try:
+        client = web_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['session_id'] = 'metrics-test'
+        response = client.get('/metrics')
+    finally:
+        web_app.subscriptions.remove_client('metrics-viewer')
+        web_app.user_manager.is_logged_in = original
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'xiangqi_capture_seconds_count{source="screen"}' in text
+    assert 'xiangqi_cache_hit_ratio{cache="upload"}' in text
+    assert 'xiangqi_queue_depth{queue="upload_jobs"}' in text
+    assert 'xiangqi_clients{kind="socketio"} 1' in text
+    assert 'xiangqi_clients{kind="live"} 1' in text
+    assert 'xiangqi_engine_restarts_total' in text
+
+
+def test_metrics_endpoint_requires_login_unless_public():
+    """未登录访问 /metrics 返回 401；配置 metrics_public 后无需登录"""
+    original = web_app.analysis_config['metrics_public']
+    try:
+        web_app.analysis_config['metrics_public'] = False
+        response = web_app.app.test_client().get('/metrics')
+        assert response.status_code == 401
+        assert 'xiangqi_' not in response.get_data(as_text=True)
+
+        web_app.analysis_config['metrics_public'] = True
+        response = web_app.app.test_client().get('/metrics')
+        assert response.status_code == 200
+        assert 'xiangqi_engine_restarts_total' in response.get_data(as_text=True)
+    finally:
+        web_app.analysis_config['metrics_public'] = original
+
+
+def test_live_queue_depths_exported():
+    """实时流水线各级队列和多路流待分析的帧数都出现在 /metrics 中"""
+    gate = threading.Event()
+    started = threading.Event()
+
+    def detect(item):
+        started.set()
+        gate.wait(2)
+        return item
+
+    pipeline = StagedPipeline([('detect', detect), ('engine', lambda item: None)], queue_size=2)
+    pipeline.start()
+    try:
+        pipeline.submit(1)
+        assert started.wait(2)
+        pipeline.submit(2)
+        pipeline.submit(3)
+        assert 'xiangqi_queue_depth{queue="pipeline_detect"} 2' in REGISTRY.render()
+    finally:
+        gate.set()
+        pipeline.stop()
+    assert QUEUE_DEPTH.get(queue='pipeline_detect') == 0
+
+    class Processor:
+        def __init__(self, seq):
+            self.slot = FrameSlot()
+            for _ in range(seq):
+                self.slot.publish(object())
+
+        def latest_seq(self):
+            return self.slot.latest_seq()
+
+    class Source:
+        def __init__(self, seq, last_seq, busy=False):
+            self.processor, self.last_seq, self.busy = Processor(seq), last_seq, busy
+
+    supervisor = web_app.StreamSupervisor(lambda: None)
+    supervisor.sources = {'a': Source(3, 2), 'b': Source(2, 2), 'c': Source(5, 1, busy=True)}
+    assert supervisor.get_queue_depth() == {'pending': 1, 'running': 1}
+
+    original = web_app.stream_supervisor
+    web_app.stream_supervisor = supervisor
+    try:
+        text = REGISTRY.render()
+    finally:
+        web_app.stream_supervisor = original
+    assert 'xiangqi_queue_depth{queue="stream_frames"} 1' in text
+    assert 'xiangqi_queue_depth{queue="stream_frames_running"} 1' in text
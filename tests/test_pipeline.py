@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+分级流水线测试
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.pipeline import DropOldestQueue, StagedPipeline
+
+
+def test_drop_oldest_queue():
+    """队列满时丢弃最旧的元素"""
+    queue = DropOldestQueue(2)
+    assert not queue.put(1)
+    assert not queue.put(2)
+    assert queue.put(3)
+    assert queue.dropped == 1
+    assert queue.get(timeout=0) == (True, 2)
+    assert queue.get(timeout=0) == (True, 3)
+    assert queue.get(timeout=0.01) == (False, None)
+
+
+def sleeper(seconds, tag):
+    def run(item):
+        time.sleep(seconds)
+        return item + [tag]
+    return run
+
+
+def test_stages_overlap():
+    """检测与引擎重叠执行：引擎处理上一帧期间，下一帧的检测已经开始"""
+    results = []
+    detect_started = {index: threading.Event() for index in range(5)}
+    overlapped = []
+
+    def detect(item):
+        detect_started[item[0]].set()
+        return item + ['d']
+
+    def engine(item):
+        # 等待下一帧的检测开始；两级串行执行时这里会超时
+        following = detect_started.get(item[0] + 1)
+        if following is not None:
+            overlapped.append(following.wait(timeout=2))
+        return item + ['e']
+
+    pipeline = StagedPipeline([('detect', detect), ('engine', engine)],
+                              queue_size=5, on_result=lambda item, at: results.append(item))
+    pipeline.start()
+    for index in range(5):
+        pipeline.submit([index])
+    start = time.time()
+    while len(results) < 5 and time.time() - start < 10:
+        time.sleep(0.01)
+    pipeline.stop()
+
+    assert results == [[index, 'd', 'e'] for index in range(5)]
+    assert overlapped == [True] * 4
+
+
+def test_slow_stage_drops_old_items():
+    """慢的一级只处理最新的输入，丢弃数可观测"""
+    results = []
+    pipeline = StagedPipeline([('detect', sleeper(0.0, 'd')), ('engine', sleeper(0.2, 'e'))],
+                              on_result=lambda item, at: results.append(item[0]))
+    pipeline.start()
+    for index in range(10):
+        pipeline.submit([index])
+        time.sleep(0.03)
+    time.sleep(0.5)
+    stats = pipeline.get_stats()
+    pipeline.stop()
+
+    assert results[-1] == 9
+    assert len(results) < 10
+    engine = stats['stages'][1]
+    assert engine['dropped'] > 0
+    assert engine['processed'] == len(results)
+    assert engine['avg_latency'] >= 0.15
+    assert stats['last_latency'] >= 0.2
+
+
+def test_none_stops_item_and_errors_counted():
+    """返回 None 的元素不进入下一级，出错的元素计数后跳过"""
+    results = []
+
+    def detect(item):
+        if item == 'bad':
+            raise ValueError(item)
+        return None if item == 'unstable' else item
+
+    pipeline = StagedPipeline([('detect', detect), ('engine', lambda item: item)], queue_size=4,
+                              on_result=lambda item, at: results.append(item))
+    pipeline.start()
+    for item in ('unstable', 'bad', 'ok'):
+        pipeline.submit(item)
+    time.sleep(0.2)
+    stats = pipeline.get_stats()
+    pipeline.stop()
+
+    assert results == ['ok']
+    detect_stats = stats['stages'][0]
+    assert detect_stats['processed'] == 3
+    assert detect_stats['passed'] == 1
+    assert detect_stats['errors'] == 1
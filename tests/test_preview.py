@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+自适应预览推送测试
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.preview import MJPEGSource, PreviewBroadcaster, PREVIEW_LEVELS, DEFAULT_LEVEL
+from src.stream_processor import FrameSlot
+
+
+def make_frame(value):
+    frame = np.full((240, 320, 3), value, dtype=np.uint8)
+    frame[::8] = 255 - value
+    return frame
+
+
+class Recorder:
+    """记录发送内容；auto_ack 时立即确认"""
+
+    def __init__(self, auto_ack=True):
+        self.sent = []
+        self.callbacks = []
+        self.auto_ack = auto_ack
+
+    def __call__(self, sid, payload, callback):
+        self.sent.append((sid, payload))
+        self.callbacks.append(callback)
+        if self.auto_ack:
+            callback()
+
+
+def test_binary_jpeg_and_unchanged_skipped():
+    """预览为二进制JPEG，画面未变化时不再推送"""
+    recorder = Recorder()
+    broadcaster = PreviewBroadcaster(recorder)
+    broadcaster.add_client('a')
+
+    assert broadcaster.publish(make_frame(10), seq=1) == 1
+    assert broadcaster.publish(make_frame(10), seq=2) == 0
+    assert broadcaster.publish(make_frame(120), seq=3) == 1
+
+    payload = recorder.sent[0][1]
+    assert isinstance(payload['image'], bytes)
+    assert payload['image'][:2] == b'\xff\xd8'
+    assert [p['seq'] for _, p in recorder.sent] == [1, 3]
+    assert broadcaster.get_stats()['unchanged'] == 1
+
+
+def test_new_client_gets_current_frame():
+    """新连接的客户端即使画面未变化也会收到一帧"""
+    recorder = Recorder()
+    broadcaster = PreviewBroadcaster(recorder)
+    broadcaster.add_client('a')
+    broadcaster.publish(make_frame(10), seq=1)
+
+    broadcaster.add_client('b')
+    assert broadcaster.publish(make_frame(10), seq=2) == 1
+    assert recorder.sent[-1][0] == 'b'
+
+
+def test_unacked_client_skipped_and_downgraded_on_timeout():
+    """上一帧未确认时跳过该客户端；确认超时后降档"""
+    recorder = Recorder(auto_ack=False)
+    broadcaster = PreviewBroadcaster(recorder, ack_timeout=0.05)
+    broadcaster.add_client('slow')
+
+    broadcaster.publish(make_frame(10), seq=1)
+    assert broadcaster.publish(make_frame(100), seq=2) == 0
+    time.sleep(0.06)
+    assert broadcaster.publish(make_frame(200), seq=3) == 1
+
+    status = broadcaster.get_stats()['clients'][0]
+    assert status['skipped'] == 1
+    assert status['timeouts'] == 1
+    assert status['size'] == list(PREVIEW_LEVELS[DEFAULT_LEVEL + 1][:2])
+
+
+def test_adapts_to_round_trip_time():
+    """往返慢时降档，连续快速确认后升档；同档位的客户端共享一次编码"""
+    recorder = Recorder(auto_ack=False)
+    broadcaster = PreviewBroadcaster(recorder, upgrade_after=2)
+    broadcaster.add_client('a')
+    broadcaster.add_client('b')
+
+    broadcaster.publish(make_frame(10), seq=1, interval=0.1)
+    assert broadcaster.encoded == 1
+    recorder.callbacks[1]()     # b: 立即确认
+    time.sleep(0.06)
+    recorder.callbacks[0]()     # a: 往返超过间隔的一半，降档
+    levels = {c['sid']: c['size'] for c in broadcaster.get_stats()['clients']}
+    assert levels['a'] == list(PREVIEW_LEVELS[DEFAULT_LEVEL + 1][:2])
+
+    recorder.auto_ack = True
+    for seq, value in enumerate((60, 120, 180, 240), start=2):
+        broadcaster.publish(make_frame(value), seq=seq, interval=10)
+    levels = {c['sid']: c['size'] for c in broadcaster.get_stats()['clients']}
+    # 4 次快速确认，每 2 次升一档
+    assert levels['a'] == list(PREVIEW_LEVELS[DEFAULT_LEVEL - 1][:2])
+    assert levels['b'] == list(PREVIEW_LEVELS[DEFAULT_LEVEL - 2][:2])
+
+
+def test_mjpeg_encodes_once_for_all_viewers():
+    """多个观看者共享同一份编码，每帧只编码一次"""
+    slot = FrameSlot()
+    source = MJPEGSource(slot, max_width=160)
+    viewers = [source.stream(timeout=0.05) for _ in range(3)]
+
+    slot.publish(make_frame(10))
+    parts = [next(viewer) for viewer in viewers]
+    assert len(set(parts)) == 1
+    assert parts[0].startswith(b'--frame\r\nContent-Type: image/jpeg\r\n')
+    assert source.get_stats() == {'viewers': 3, 'encoded': 1, 'seq': 1}
+
+    slot.publish(make_frame(200))
+    for viewer in viewers:
+        assert next(viewer) != parts[0]
+    assert source.encoded == 2
+
+    for viewer in viewers:
+        viewer.close()
+    assert source.viewers == 0
+
+
+def test_mjpeg_stream_ends_when_inactive():
+    """服务停止后生成器结束"""
+    source = MJPEGSource(FrameSlot())
+    assert list(source.stream(lambda: False)) == []
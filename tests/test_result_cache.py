@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+上传结果缓存测试
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.job_queue import JobQueue
+from src.result_cache import ResultCache, bytes_key, pixels_key
+from src.result_codec import ImageStore
+import web.app as web_app
+
+
+def test_keys_follow_content():
+    """字节哈希区分文件，像素哈希只看解码后的画面"""
+    image = np.random.default_rng(0).integers(0, 255, (60, 80, 3), dtype=np.uint8)
+    png = cv2.imencode('.png', image)[1].tobytes()
+    png_fast = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])[1].tobytes()
+
+    assert png != png_fast
+    assert bytes_key(png) != bytes_key(png_fast)
+    assert pixels_key(cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR)) == \
+        pixels_key(cv2.imdecode(np.frombuffer(png_fast, np.uint8), cv2.IMREAD_COLOR))
+    # 像素相同但形状不同不是同一画面
+    assert pixels_key(image.reshape(80, 60, 3)) != pixels_key(image)
+
+
+def test_lookup_aliases_keys_and_counts_once():
+    """命中时登记其余的键；一次查找只计一次命中或未命中"""
+    cache = ResultCache()
+    cache.put(['pixels:a', 'bytes:a'], {'fen': 'a'})
+
+    assert cache.lookup(['bytes:b'], count_miss=False) is None
+    assert cache.lookup(['pixels:a', 'bytes:b']) == {'fen': 'a'}
+    assert cache.lookup(['bytes:b']) == {'fen': 'a'}
+    assert cache.lookup(['bytes:c']) is None
+
+    stats = cache.get_stats()
+    assert (stats['entries'], stats['hits'], stats['misses']) == (1, 2, 1)
+    assert stats['hit_rate'] == 0.667
+
+
+def test_bounded_by_entries_and_bytes():
+    """超过条目数或总大小时淘汰最久未使用的结果"""
+    cache = ResultCache(max_entries=2, max_bytes=100)
+    cache.put(['a'], 'A', size=40)
+    cache.put(['b'], 'B', size=40)
+    cache.lookup(['a'])
+    cache.put(['c'], 'C', size=40)
+    assert cache.lookup(['b']) is None
+    assert cache.lookup(['a']) == 'A'
+    assert cache.bytes == 80
+
+    cache.put(['d'], 'D', size=90)
+    assert cache.get_stats()['entries'] == 1
+    assert cache.bytes == 90
+    # 单个结果超过上限时不缓存
+    cache.put(['e'], 'E', size=200)
+    assert cache.lookup(['e']) is None
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.calls = 0
+
+    def analyze_image(self, image, think_time):
+        self.calls += 1
+        time.sleep(0.1)
+        return {'fen': 'rnbakabnr', 'detect_time': 0.05, 'confidence': np.float32(0.9),
+                'original_with_keypoints': image, 'transformed_board': image}
+
+
+def test_repeat_upload_served_from_cache():
+    """重复上传直接返回缓存的结果（含已编码的图像），不再运行分析"""
+    analyzer = FakeAnalyzer()
+    original = (web_app.job_queue, web_app.upload_cache, web_app.user_manager.is_logged_in)
+    web_app.job_queue = JobQueue(lambda: analyzer, web_app.run_upload_job)
+    web_app.upload_cache = ResultCache()
+    web_app.user_manager.is_logged_in = lambda session_id: True
+
+    image = np.full((60, 80, 3), 90, dtype=np.uint8)
+    png = cv2.imencode('.png', image)[1].tobytes()
+    try:
+        client = web_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['session_id'] = 'test'
+
+        def upload(data):
+            return client.post('/api/upload', data={'image': (io.BytesIO(data), 'board.png')},
+                               content_type='multipart/form-data')
+
+        first = upload(png)
+        assert first.status_code == 202
+        assert web_app.job_queue.get(first.get_json()['job_id']).wait(2)
+
+        start = time.time()
+        second = upload(png)
+        elapsed = time.time() - start
+        # 同一画面另存为 BMP：字节不同，像素相同
+        third = upload(cv2.imencode('.bmp', image)[1].tobytes())
+        jpeg = client.get(second.get_json()['result']['images']['transformed_board']).data
+    finally:
+        web_app.job_queue.stop()
+        web_app.job_queue, web_app.upload_cache, web_app.user_manager.is_logged_in = original
+
+    assert second.status_code == 200
+    body = second.get_json()
+    assert body['cached'] and body['state'] == 'done'
+    # 图像不内嵌在响应中，按地址单独获取
+    assert 'transformed_board' not in body['result']
+    assert jpeg.startswith(b'\xff\xd8')
+    assert elapsed < 0.05
+    assert third.get_json()['cached']
+    assert analyzer.calls == 1
+
+
+def test_evicted_images_are_reanalysed():
+    """结果引用的图像被淘汰后，两种键命中都不再返回失效的图像地址，而是重新分析"""
+    analyzer = FakeAnalyzer()
+    original = (web_app.job_queue, web_app.upload_cache, web_app.image_store, web_app.user_manager.is_logged_in)
+    web_app.job_queue = JobQueue(lambda: analyzer, web_app.run_upload_job)
+    web_app.upload_cache = ResultCache()
+    web_app.image_store = ImageStore()
+    web_app.user_manager.is_logged_in = lambda session_id: True
+
+    image = np.full((60, 80, 3), 90, dtype=np.uint8)
+    png = cv2.imencode('.png', image)[1].tobytes()
+    try:
+        client = web_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['session_id'] = 'test'
+
+        def upload(data):
+            response = client.post('/api/upload', data={'image': (io.BytesIO(data), 'board.png')},
+                                   content_type='multipart/form-data')
+            if response.status_code == 202:
+                job = web_app.job_queue.get(response.get_json()['job_id'])
+                assert job.wait(2)
+                return job.result
+            return response.get_json()['result']
+
+        first = upload(png)
+        web_app.image_store = ImageStore()    # 模拟图像被淘汰
+        # 原始字节相同（字节键命中）和另存为 BMP（像素键命中）都重新分析
+        again = upload(png)
+        web_app.image_store = ImageStore()
+        bmp = upload(cv2.imencode('.bmp', image)[1].tobytes())
+        status = client.get(bmp['images']['transformed_board']).status_code
+    finally:
+        web_app.job_queue.stop()
+        web_app.job_queue, web_app.upload_cache, web_app.image_store, web_app.user_manager.is_logged_in = original
+
+    assert analyzer.calls == 3
+    assert again['image_id'] != first['image_id']
+    assert status == 200
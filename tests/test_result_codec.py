@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+分析结果精简序列化测试
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import src.result_codec as result_codec
+from src.result_codec import ImageStore, dumps, result_summary
+
+
+def make_result():
+    image = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    cv2.putText(image, 'board', (200, 500), cv2.FONT_HERSHEY_SIMPLEX, 10, (0, 200, 255), 20)
+    return {
+        'timestamp': '2026-10-18T12:00:00',
+        'fen': 'rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w',
+        'layout_pgn': [list('rnbakabnr')] * 10,
+        'layout_2d': [['r'] * 9] * 10,
+        'scores': [np.full(9, 0.98768, dtype=np.float32) for _ in range(10)],
+        'detect_time': '0.123s',
+        'best_move': 'h2e2',
+        'score': {'type': 'cp', 'value': 35},
+        'confidence': np.float32(0.9),
+        'classifier_work': {'cells': np.arange(90)},
+        'original_with_keypoints': image,
+        'transformed_board': image[:800, :720],
+    }
+
+
+def test_summary_has_only_plain_text_fields():
+    """摘要只含文本字段和基本类型，标准库 json 即可编码"""
+    summary = result_summary(make_result())
+    assert 'original_with_keypoints' not in summary and 'classifier_work' not in summary
+    assert summary['detect_time'] == 0.123
+    assert isinstance(summary['confidence'], float)
+    assert summary['scores'][0][0] == 0.9877
+    json.dumps(summary)
+
+
+def test_dumps_with_and_without_orjson():
+    """orjson 和标准库 json 的输出解析结果相同，numpy 类型都能编码"""
+    data = {'fen': '象棋', 'scores': np.ones((2, 2), dtype=np.float32), 'n': np.int64(3)}
+    fast = json.loads(dumps(data))
+    original = result_codec.orjson
+    result_codec.orjson = None
+    try:
+        plain = json.loads(dumps(data))
+    finally:
+        result_codec.orjson = original
+    assert fast == plain == {'fen': '象棋', 'scores': [[1.0, 1.0], [1.0, 1.0]], 'n': 3}
+
+
+def test_image_store_encodes_each_width_once():
+    """登记时编码一次，其他宽度按需缩小并缓存"""
+    store = ImageStore()
+    image_id = store.add(make_result())
+    assert store.encoded == 2
+
+    full = store.get(image_id, 'original_with_keypoints')
+    assert cv2.imdecode(np.frombuffer(full, np.uint8), cv2.IMREAD_COLOR).shape[1] == 1280
+    small = store.get(image_id, 'original_with_keypoints', width=300)
+    assert cv2.imdecode(np.frombuffer(small, np.uint8), cv2.IMREAD_COLOR).shape[1] == 320
+    assert store.get(image_id, 'original_with_keypoints', width=320) is small
+    # 不超过登记版本宽度的请求直接返回登记版本
+    assert store.get(image_id, 'transformed_board', width=1280) is store.get(image_id, 'transformed_board')
+    assert store.encoded == 3
+    assert store.get(image_id, 'missing') is None
+
+
+def test_image_store_bounded_by_bytes():
+    """总大小超过上限时淘汰最早登记的结果"""
+    store = ImageStore(max_bytes=1)
+    first = store.add(make_result())
+    second = store.add(make_result())
+    assert not store.has(first) and store.has(second)
+    assert store.get(first, 'transformed_board') is None
+    assert store.get_stats()['expired'] == 1
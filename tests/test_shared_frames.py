@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+共享内存帧传输测试
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.shared_frames import SharedFrameRing, SharedStreamCapture
+
+
+def make_frame(value, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_reader_sees_writer_frames():
+    """读端通过共享内存读到写端发布的帧"""
+    writer = SharedFrameRing.create((4, 6, 3), num_slots=3)
+    reader = SharedFrameRing.attach(writer.name, (4, 6, 3), num_slots=3)
+    try:
+        assert reader.latest() == (None, 0, 0.0)
+
+        writer.publish(make_frame(1), timestamp=10.0)
+        seq = writer.publish(make_frame(2), timestamp=11.0)
+        frame, latest_seq, timestamp = reader.latest()
+        assert latest_seq == seq == 2
+        assert timestamp == 11.0
+        assert (frame == 2).all()
+        # 读到的是副本，写端之后覆盖槽位不影响已读出的帧
+        for value in range(3, 6):
+            writer.publish(make_frame(value))
+        assert (frame == 2).all()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_overwrite_during_copy_is_retried():
+    """复制期间写端绕回该槽位时丢弃副本重新读取，不返回拼接的帧"""
+    writer = SharedFrameRing.create((4, 6, 3), num_slots=2)
+    reader = SharedFrameRing.attach(writer.name, (4, 6, 3), num_slots=2)
+
+    class RacingFrames:
+        """第一次复制时写端连写两帧，绕回正在复制的槽位"""
+        raced = False
+
+        def __init__(self, frames):
+            self.frames = frames
+
+        def __getitem__(self, slot):
+            outer = self
+
+            class Slot:
+                def copy(self):
+                    if not outer.raced:
+                        outer.raced = True
+                        writer.publish(make_frame(3))
+                        writer.publish(make_frame(4))
+                    return outer.frames[slot].copy()
+            return Slot()
+
+    racing = RacingFrames(reader._frames)
+    try:
+        writer.publish(make_frame(1))
+        writer.publish(make_frame(2))
+        reader._frames = racing
+        frame, seq, _ = reader.latest()
+        assert seq == 4 and (frame == 4).all()
+    finally:
+        # 归还共享内存数组并释放测试持有的引用，否则关闭映射时缓冲区仍被引用
+        reader._frames, racing.frames = racing.frames, None
+        reader.close()
+        writer.close()
+
+
+def test_closest_and_pts_from_ring_history():
+    """缓冲区中的帧作为历史，按采集时间或流时间戳取最接近的帧"""
+    writer = SharedFrameRing.create((4, 6, 3), num_slots=4)
+    try:
+        for value in range(1, 6):
+            writer.publish(make_frame(value), timestamp=100.0 + value, pts=value * 0.5)
+        assert writer.pts(5) == 2.5
+        assert writer.pts(1) is None    # 已被覆盖
+        frame, seq, timestamp = writer.closest(103.2)
+        assert seq == 3 and timestamp == 103.0 and (frame == 3).all()
+        assert writer.closest(1.9, clock='pts')[1] == 4
+        assert writer.closest(0.0)[1] == 2   # 最早的帧已被覆盖，取仍在缓冲区中的最早一帧
+    finally:
+        writer.close()
+
+
+def test_slot_reuse_invalidates_old_frames():
+    """写端绕回槽位后，旧序号不再有效"""
+    writer = SharedFrameRing.create((4, 6, 3), num_slots=3)
+    try:
+        first = writer.publish(make_frame(1))
+        assert writer.valid(first)
+        for value in range(2, 5):
+            writer.publish(make_frame(value))
+        assert not writer.valid(first)
+        assert writer.valid(4)
+    finally:
+        writer.close()
+
+
+def test_wait_newer_timeout_and_close():
+    """没有新帧时超时，写端关闭后立即返回"""
+    writer = SharedFrameRing.create((4, 6, 3), num_slots=2)
+    try:
+        writer.publish(make_frame(1))
+        assert writer.wait_newer(1, timeout=0.05) == (None, 1, 0.0)
+
+        writer.mark_closed()
+        assert writer.wait_newer(1) == (None, 1, 0.0)
+    finally:
+        writer.close()
+
+
+def test_shape_mismatch_rejected():
+    """尺寸不一致的帧被拒绝"""
+    writer = SharedFrameRing.create((4, 6, 3), num_slots=2)
+    try:
+        try:
+            writer.publish(make_frame(1, shape=(2, 2, 3)))
+            assert False, "应当抛出 ValueError"
+        except ValueError:
+            pass
+    finally:
+        writer.close()
+
+
+def test_health_messages_drained_without_polling():
+    """没有人查询状态时也持续读取健康统计，采集进程的 send 不会因管道写满而阻塞"""
+    import multiprocessing
+    import threading
+
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    capture = SharedStreamCapture('rtmp://example/live')
+    capture._start_health_receiver(parent_conn)
+
+    payload = {'state': 'streaming', 'padding': 'x' * 1024}
+    sender = threading.Thread(
+        target=lambda: [child_conn.send(('health', dict(payload, grabbed=i))) for i in range(500)],
+        daemon=True)
+    sender.start()
+    sender.join(timeout=5)
+    try:
+        assert not sender.is_alive()
+        deadline = time.time() + 5
+        while capture.get_health().get('grabbed') != 499 and time.time() < deadline:
+            time.sleep(0.01)
+        health = capture.get_health()
+        assert health['grabbed'] == 499
+        assert health['state'] == 'stopped'  # 没有采集进程
+    finally:
+        child_conn.close()
+        capture._health_thread.join(timeout=1)
+        parent_conn.close()
+    assert not capture._health_thread.is_alive()
+
+
+def test_capture_process_streams_video(tmp_path):
+    """采集进程解码视频文件，帧经共享内存传回"""
+    import cv2
+
+    video = tmp_path / 'clip.avi'
+    writer = cv2.VideoWriter(str(video), cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+    for index in range(50):
+        writer.write(make_frame(index * 5, shape=(48, 64, 3)))
+    writer.release()
+
+    capture = SharedStreamCapture(str(video))
+    try:
+        assert capture.start()
+        frame, seq, _ = capture.get_latest()
+        assert frame.shape == (48, 64, 3)
+
+        frame, newer_seq, _ = capture.wait_for_frame(seq, timeout=5)
+        assert frame is not None and newer_seq > seq
+
+        # 与 RTMPStreamProcessor 相同的取帧接口
+        assert capture.fps == 25
+        assert capture.get_frame_at_interval(0.01) is not None
+        frame, near_seq, _ = capture.get_frame_near(time.time(), timeout=5)
+        assert frame is not None and near_seq >= newer_seq
+        assert capture.frame_slot.latest()[1] >= near_seq
+    finally:
+        capture.stop()
+    assert not capture.is_running()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+流重连退避与健康统计测试
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.stream_processor import RTMPStreamProcessor, StreamHealth
+
+
+class FlakyCapture:
+    """前 failures 次 grab 失败，之后正常出帧"""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def grab(self):
+        if self.failures > 0:
+            self.failures -= 1
+            time.sleep(0.001)
+            return False
+        time.sleep(0.005)
+        return True
+
+    def retrieve(self):
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+
+    def get(self, prop):
+        return 0.0
+
+    def release(self):
+        pass
+
+
+class FlakyProcessor(RTMPStreamProcessor):
+    """用 FlakyCapture 代替 cv2.VideoCapture 的流处理器"""
+
+    backoff_base = 0.01
+
+    def __init__(self, failures):
+        super().__init__('flaky://test')
+        self.failures = failures
+
+    def _open(self):
+        self.cap = FlakyCapture(self.failures)
+        return True
+
+    def _reconnect(self):
+        return True
+
+
+def test_health_state_machine():
+    """卡顿从第一次读取失败开始，到重新出帧结束"""
+    health = StreamHealth()
+    assert health.state == StreamHealth.IDLE
+
+    health.frame_ok(1.0)
+    health.read_failed(2.0)
+    health.read_failed(3.0)
+    assert health.state == StreamHealth.RECONNECTING
+    health.frame_ok(5.0)
+
+    snapshot = health.to_dict()
+    assert snapshot['state'] == StreamHealth.STREAMING
+    assert snapshot['stalls'] == 1
+    assert snapshot['stall_total'] == snapshot['stall_longest'] == 3.0
+
+
+def test_reconnects_with_backoff_then_recovers():
+    """读取失败时退避重连，恢复后统计重连次数和卡顿"""
+    processor = FlakyProcessor(failures=3)
+    try:
+        assert processor.start()
+        health = processor.get_health()
+    finally:
+        processor.stop()
+
+    assert health['reconnects'] == 3
+    assert health['stalls'] == 1
+    assert health['stall_total'] >= 0.01 * (0.5 + 1 + 2) * 0.5
+    assert health['decoded'] >= 1
+    assert processor.get_health()['state'] == StreamHealth.STOPPED
+
+
+def test_failing_source_does_not_spin():
+    """源持续失败时重连间隔指数增长，不会空转"""
+    processor = FlakyProcessor(failures=10 ** 9)
+    processor.backoff_base = 0.05
+    processor.running = True
+    processor._open()
+
+    thread = threading.Thread(target=processor._read_frames, daemon=True)
+    thread.start()
+    time.sleep(1.0)
+    processor.running = False
+    processor._wakeup.set()
+    thread.join(timeout=2)
+
+    # 0.05 + 0.1 + 0.2 + 0.4 + 0.8 ... 在 1 秒内最多约 5 次（抖动最多缩短一半）
+    assert 2 <= processor.health.reconnects <= 6
+
+
+def test_dropped_frames_counted():
+    """没被读取就被覆盖的帧计为丢弃"""
+    processor = RTMPStreamProcessor('unused://')
+    frame = np.zeros((2, 2, 3), dtype=np.uint8)
+
+    processor._publish(frame, 1.0)
+    processor._publish(frame, 2.0)
+    assert processor.dropped_count == 1
+
+    processor.get_latest()
+    processor._publish(frame, 3.0)
+    assert processor.dropped_count == 1
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+多路流调度测试
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.stream_processor import FrameSlot
+from src.stream_supervisor import StreamSupervisor
+
+
+class FakeProcessor:
+    """按固定间隔发布帧的假流处理器，帧内容为 (url, 序号)"""
+
+    def __init__(self, url, fps=50, **kwargs):
+        self.url = url
+        self.interval = 1 / fps
+        self.slot = FrameSlot()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+        return True
+
+    def _run(self):
+        index = 0
+        while self.running:
+            index += 1
+            self.slot.publish((self.url, index))
+            time.sleep(self.interval)
+
+    def get_latest(self):
+        return self.slot.latest()
+
+    def latest_seq(self):
+        return self.slot.latest_seq()
+
+    def is_running(self):
+        return self.running
+
+    def get_health(self):
+        return {'state': 'streaming' if self.running else 'stopped'}
+
+    def stop(self):
+        self.running = False
+
+
+class FakeAnalyzer:
+    """记录调用的假分析器，每次分析耗时 cost 秒"""
+
+    def __init__(self, cost=0.01):
+        self.cost = cost
+        self.calls = []
+
+    def analyze_frame(self, frame, think_time, state=None):
+        time.sleep(self.cost)
+        url, _ = frame
+        self.calls.append((url, id(state)))
+        return {'fen': url}
+
+    def quit(self):
+        pass
+
+
+def make_supervisor(analyzers, **kwargs):
+    pool = iter(analyzers)
+    return StreamSupervisor(lambda: next(pool), pool_size=len(analyzers),
+                            processor_factory=FakeProcessor, **kwargs)
+
+
+def test_streams_share_pool_fairly():
+    """单个分析器时各路流轮流获得分析机会"""
+    analyzer = FakeAnalyzer()
+    results = []
+    supervisor = make_supervisor([analyzer], analysis_interval=0.0,
+                                 on_result=lambda sid, r: results.append(sid))
+    for name in ('a', 'b', 'c'):
+        assert supervisor.add_stream(name, name)
+    supervisor.start()
+    time.sleep(0.5)
+    supervisor.stop()
+
+    counts = {name: results.count(name) for name in ('a', 'b', 'c')}
+    assert min(counts.values()) > 0
+    assert max(counts.values()) - min(counts.values()) <= 2
+
+
+def test_each_stream_has_own_state():
+    """每路流使用独立的 FrameState"""
+    analyzer = FakeAnalyzer()
+    supervisor = make_supervisor([analyzer], analysis_interval=0.0)
+    supervisor.add_stream('a', 'a')
+    supervisor.add_stream('b', 'b')
+    supervisor.start()
+    time.sleep(0.2)
+    supervisor.stop()
+
+    states = {}
+    for url, state_id in analyzer.calls:
+        states.setdefault(url, set()).add(state_id)
+    assert len(states['a']) == len(states['b']) == 1
+    assert states['a'] != states['b']
+
+
+def test_status_reports_lag_and_capacity():
+    """分析器跟不上时报告延迟和满负荷"""
+    supervisor = make_supervisor([FakeAnalyzer(cost=0.1)], analysis_interval=0.05)
+    for name in ('a', 'b', 'c'):
+        supervisor.add_stream(name, name)
+    supervisor.start()
+    time.sleep(1.0)
+    status = supervisor.get_status()
+    supervisor.stop()
+
+    assert status['at_capacity']
+    for stream in status['streams']:
+        assert stream['analyzed'] > 0
+        assert stream['lag'] >= 0.1
+        assert stream['fen'] == stream['id']
+
+
+def test_remove_stream():
+    """移除流后不再调度"""
+    supervisor = make_supervisor([FakeAnalyzer()], analysis_interval=0.0)
+    supervisor.add_stream('a', 'a')
+    assert not supervisor.add_stream('a', 'a')
+    assert supervisor.remove_stream('a')
+    assert not supervisor.remove_stream('a')
+    assert supervisor.get_status()['streams'] == []
+
+
+class ManualProcessor(FakeProcessor):
+    """只在测试调用 push() 时发布帧，支持新帧回调，并统计查看序号和取帧的次数"""
+
+    started = []
+
+    def start(self):
+        time.sleep(0.1)     # 模拟打开流的耗时
+        self.running = True
+        ManualProcessor.started.append(self)
+        return True
+
+    def push(self, index):
+        self.slot.publish((self.url, index))
+
+    def get_latest(self):
+        self.reads = getattr(self, 'reads', 0) + 1
+        return self.slot.latest()
+
+    def latest_seq(self):
+        self.peeks = getattr(self, 'peeks', 0) + 1
+        return self.slot.latest_seq()
+
+    def add_frame_listener(self, listener):
+        self.slot.add_listener(listener)
+        return True
+
+
+def test_workers_wake_on_new_frame_without_polling():
+    """空闲时工作线程不轮询，新帧发布后立即被唤醒分析"""
+    analyzer = FakeAnalyzer(cost=0.0)
+    supervisor = StreamSupervisor(lambda: analyzer, pool_size=1, analysis_interval=0.0,
+                                  processor_factory=ManualProcessor)
+    supervisor.add_stream('a', 'a')
+    processor = supervisor.sources['a'].processor
+    supervisor.start()
+    try:
+        time.sleep(0.3)
+        assert processor.peeks <= 3
+        assert getattr(processor, 'reads', 0) == 0
+
+        start = time.time()
+        processor.push(1)
+        while not analyzer.calls and time.time() - start < 1:
+            time.sleep(0.001)
+        assert analyzer.calls and time.time() - start < 0.05
+        # 只为选中的流取一次帧
+        assert processor.reads == len(analyzer.calls) == 1
+    finally:
+        supervisor.stop()
+
+
+def test_concurrent_add_starts_one_processor():
+    """并发添加同一路流只启动一个处理器"""
+    ManualProcessor.started = []
+    supervisor = StreamSupervisor(lambda: FakeAnalyzer(), pool_size=1, processor_factory=ManualProcessor)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(supervisor.add_stream('a', 'a')))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False, True]
+    assert len(ManualProcessor.started) == 1
+    supervisor.stop()
+
+    # 启动失败时释放流ID，之后可以重新添加
+    def failing_factory(url, **kwargs):
+        raise RuntimeError('无法连接')
+
+    supervisor.processor_factory = failing_factory
+    assert not supervisor.add_stream('b', 'b')
+    supervisor.processor_factory = ManualProcessor
+    assert supervisor.add_stream('b', 'b')
+    supervisor.stop()
+
+
+def test_reset_analyzers_rebuilds_before_next_analysis():
+    """reset_analyzers 后工作线程关闭旧分析器，下一次分析前重新创建"""
+    analyzers = []
+
+    class ClosingAnalyzer(FakeAnalyzer):
+        closed = False
+
+        def quit(self):
+            self.closed = True
+
+    def factory():
+        analyzers.append(ClosingAnalyzer(cost=0.0))
+        return analyzers[-1]
+
+    supervisor = StreamSupervisor(factory, pool_size=1, analysis_interval=0.0,
+                                  processor_factory=ManualProcessor)
+    supervisor.add_stream('a', 'a')
+    processor = supervisor.sources['a'].processor
+    supervisor.start()
+    try:
+        def analyze(index):
+            processor.push(index)
+            deadline = time.time() + 2
+            while supervisor.sources['a'].analyzed < index and time.time() < deadline:
+                time.sleep(0.005)
+
+        analyze(1)
+        assert len(analyzers) == 1 and analyzers[0].calls
+
+        supervisor.reset_analyzers()
+        analyze(2)
+        assert len(analyzers) == 2 and analyzers[0].closed
+        assert analyzers[1].calls and not analyzers[1].closed
+    finally:
+        supervisor.stop()
+    assert analyzers[1].closed
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Socket.IO 房间订阅测试：结果只发送给订阅了对应信号源的客户端
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.subscriptions import LIVE_ROOM, Subscriptions, is_source_room, session_room, stream_room
+import web.app as web_app
+
+
+def test_subscriptions_index():
+    """订阅关系双向索引，断开时全部移除"""
+    subs = Subscriptions()
+    assert subs.subscribe('a', LIVE_ROOM)
+    assert not subs.subscribe('a', LIVE_ROOM)
+    subs.subscribe('a', stream_room('cam1'))
+    subs.subscribe('b', stream_room('cam1'))
+    subs.subscribe('b', session_room('s1'))
+
+    assert subs.count(stream_room('cam1')) == 2
+    assert subs.rooms_of('a') == ['live', 'stream:cam1']
+    assert subs.unsubscribe('a', LIVE_ROOM)
+    assert not subs.unsubscribe('a', LIVE_ROOM)
+    assert subs.count(LIVE_ROOM) == 0
+
+    assert subs.get_stats() == {'clients': 2, 'rooms': {'stream:cam1': 2}, 'sessions': 1}
+    assert subs.remove_client('b') == ['session:s1', 'stream:cam1']
+    assert subs.count(stream_room('cam1')) == 1
+
+    assert is_source_room('stream:cam1') and is_source_room(LIVE_ROOM)
+    assert not is_source_room('stream:') and not is_source_room(session_room('s1'))
+
+
+def test_results_reach_only_subscribers():
+    """实时结果只发给订阅了实时画面的连接，流结果只发给订阅了该路流的连接；无人订阅时不构造负载"""
+    original = web_app.user_manager.is_logged_in
+    web_app.user_manager.is_logged_in = lambda session_id: True
+    clients = []
+    try:
+        flask_client = web_app.app.test_client()
+        with flask_client.session_transaction() as sess:
+            sess['session_id'] = 'room-test'
+
+        def connect(query=''):
+            client = web_app.socketio.test_client(web_app.app, flask_test_client=flask_client,
+                                                  query_string=query)
+            clients.append(client)
+            client.get_received()
+            return client
+
+        live = connect()
+        watcher = connect('subscribe=stream:cam1')
+        assert web_app.subscriptions.count(LIVE_ROOM) == 1
+        # 只有订阅实时画面的连接参与预览推送
+        assert len(web_app.preview_broadcaster.clients) == 1
+
+        built = []
+
+        def build(payload):
+            def make():
+                built.append(payload)
+                return payload
+            return make
+
+        assert web_app.emit_to_room('analysis_result', LIVE_ROOM, build({'fen': 'live'}))
+        assert web_app.emit_to_room('stream_result', stream_room('cam1'), build({'fen': 'cam1'}))
+        assert not web_app.emit_to_room('stream_result', stream_room('cam2'), build({'fen': 'cam2'}))
+        assert built == [{'fen': 'live'}, {'fen': 'cam1'}]
+
+        assert [(m['name'], m['args'][0]) for m in live.get_received()] == [('analysis_result', {'fen': 'live'})]
+        assert [(m['name'], m['args'][0]) for m in watcher.get_received()] == [('stream_result', {'fen': 'cam1'})]
+
+        # 改为订阅另一路流后不再收到原来的结果
+        assert watcher.emit('unsubscribe', {'room': 'stream:cam1'}, callback=True) == {'rooms': ['session:room-test']}
+        assert watcher.emit('subscribe', {'room': 'stream:cam2'}, callback=True)['rooms'] == \
+            ['session:room-test', 'stream:cam2']
+        assert 'error' in watcher.emit('subscribe', {'room': 'session:other'}, callback=True)
+        web_app.emit_to_room('stream_result', stream_room('cam1'), build({'fen': 'cam1'}))
+        web_app.emit_to_room('stream_result', stream_room('cam2'), build({'fen': 'cam2'}))
+        assert [m['args'][0]['fen'] for m in watcher.get_received()] == ['cam2']
+
+        # 同一会话的所有连接都收到该会话的上传任务结果
+        web_app.socketio.emit('job_result', {'job_id': 'j1'}, to=session_room('room-test'))
+        assert live.get_received()[0]['name'] == 'job_result'
+        assert watcher.get_received()[0]['name'] == 'job_result'
+    finally:
+        for client in clients:
+            if client.is_connected():
+                client.disconnect()
+        web_app.user_manager.is_logged_in = original
+
+    assert web_app.subscriptions.count(LIVE_ROOM) == 0
+    assert not web_app.preview_broadcaster.clients
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+离线视频分析测试
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.board_renderer import INITIAL_FEN
+import src.chess_analyzer as chess_analyzer
+from src.video_analysis import VideoAnalyzer, assign_turns, plan_segments, collapse_positions, infer_move
+
+# 红方炮二平五
+AFTER_CANNON = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C2C4/9/RNBAKABNR"
+# 黑方炮8平5
+AFTER_REPLY = "rnbakabnr/9/1c2c4/p1p1p1p1p/9/9/P1P1P1P1P/1C2C4/9/RNBAKABNR"
+
+
+def test_plan_segments_cover_every_sample_once():
+    """每个采样帧恰好属于一个分段"""
+    plan = plan_segments(1000, 30, 4)
+    covered = [index for start, end in plan for index in range(start, end) if index % 30 == 0]
+    assert covered == list(range(0, 1000, 30))
+    assert len(plan) == 4
+
+
+def test_plan_segments_empty_video():
+    """空视频没有分段"""
+    assert plan_segments(0, 30, 4) == []
+
+
+def test_collapse_positions_drops_flicker():
+    """短暂的误识别被丢弃，前后相同局面合并"""
+    fens = [INITIAL_FEN] * 3 + ['bad'] + [INITIAL_FEN] * 2 + [None] + [AFTER_CANNON] * 3
+    samples = [{'time': float(t), 'fen': fen} for t, fen in enumerate(fens)]
+
+    positions = collapse_positions(samples, min_stable=2)
+    assert [p['fen'] for p in positions] == [INITIAL_FEN, AFTER_CANNON]
+    assert positions[0]['start'] == 0.0 and positions[0]['end'] == 5.0
+    assert positions[0]['samples'] == 5
+
+
+def test_infer_move():
+    """从相邻局面推断ICCS着法"""
+    assert infer_move(INITIAL_FEN, AFTER_CANNON) == 'h2e2'
+    assert infer_move(AFTER_CANNON, AFTER_REPLY) == 'h7e7'
+
+
+def test_infer_move_capture():
+    """吃子着法"""
+    before = "4k4/9/9/9/4p4/9/9/9/4R4/4K4"
+    after = "4k4/9/9/9/4R4/9/9/9/9/4K4"
+    assert infer_move(before, after) == 'e1e5'
+
+
+def test_infer_move_not_single_move():
+    """相隔多步的局面无法推断"""
+    assert infer_move(INITIAL_FEN, AFTER_REPLY) is None
+    assert infer_move(INITIAL_FEN, INITIAL_FEN) is None
+
+
+def test_turns_alternate_between_positions():
+    """相邻局面的行棋方交替，并传给引擎"""
+    positions = [{'fen': INITIAL_FEN, 'move': None},
+                 {'fen': AFTER_CANNON, 'move': 'h2e2'},
+                 {'fen': AFTER_REPLY, 'move': 'h7e7'}]
+    assign_turns(positions)
+    assert [p['turn'] for p in positions] == ['w', 'b', 'w']
+
+    calls = []
+
+    class FakeEngine:
+        def __init__(self, path):
+            pass
+
+        def get_best_move(self, fen, think_time=8000, depth=None, turn=None):
+            calls.append((fen, turn))
+            return {'best_move': 'a0a1', 'score': 0}
+
+        def quit(self):
+            pass
+
+    original = chess_analyzer.PikafishEngine
+    chess_analyzer.PikafishEngine = FakeEngine
+    try:
+        VideoAnalyzer('', '', engine_path='fake', engine_workers=1)._analyze_positions(positions[:2], 100)
+    finally:
+        chess_analyzer.PikafishEngine = original
+    assert calls == [(INITIAL_FEN, 'w'), (AFTER_CANNON, 'b')]
+
+
+def test_turns_follow_parity_when_move_unknown():
+    """推断不出着法时按步数奇偶交替；黑方先走出的着法确定前一局面轮到黑方"""
+    black_moved = "rnbakabnr/9/1c2c4/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR"
+    positions = [{'fen': INITIAL_FEN, 'move': None},
+                 {'fen': black_moved, 'move': infer_move(INITIAL_FEN, black_moved)},
+                 {'fen': INITIAL_FEN, 'move': None}]
+    assign_turns(positions)
+    assert [p['turn'] for p in positions] == ['b', 'w', 'b']
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Web界面采集流水线测试：单一采集线程同时供给预览和分析
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.subscriptions import LIVE_ROOM
+import web.app as web_app
+
+
+class CountingScreen:
+    """每次截图返回一张新帧并计数"""
+
+    def __init__(self):
+        self.grabs = 0
+
+    def capture_window(self, region=None):
+        self.grabs += 1
+        # 相邻帧明显不同，预览不会因画面未变化被跳过
+        return np.full((48, 64, 3), self.grabs * 40 % 256, dtype=np.uint8)
+
+
+class FakeAnalyzer:
+    def analyze_frame(self, frame, think_time):
+        return {'fen': int(frame[0, 0, 0]), 'detect_time': 0.01, 'confidence': 1.0}
+
+
+def test_single_capture_feeds_preview_and_analysis():
+    """采集只由采集线程完成，分析结果的帧序号对应已推送的预览"""
+    events = []
+    screen = CountingScreen()
+    original = (web_app.socketio.emit, web_app.screen_capture, web_app.analyzer, dict(web_app.analysis_config))
+
+    def emit(event, data, to=None, callback=None):
+        events.append((event, data))
+        if callback:
+            callback()
+
+    web_app.socketio.emit = emit
+    web_app.subscriptions.subscribe('viewer', LIVE_ROOM)
+    web_app.preview_broadcaster.add_client('viewer')
+    web_app.screen_capture = screen
+    web_app.analyzer = FakeAnalyzer()
+    web_app.analysis_config.update(source_type='screen', preview_interval=0.05,
+                                   analysis_interval=0.15, think_time=10)
+    web_app.frame_slot.clear()
+    web_app.pipeline_stats.update(captured=0, previewed=0, analyzed=0)
+
+    web_app.running = True
+    threads = [threading.Thread(target=web_app.capture_loop), threading.Thread(target=web_app.analysis_loop)]
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(0.8)
+    finally:
+        web_app.running = False
+        for thread in threads:
+            thread.join(timeout=3)
+        web_app.socketio.emit, web_app.screen_capture, web_app.analyzer = original[:3]
+        web_app.subscriptions.remove_client('viewer')
+        web_app.preview_broadcaster.remove_client('viewer')
+        web_app.analysis_config.clear()
+        web_app.analysis_config.update(original[3])
+
+    stats = web_app.pipeline_stats
+    previews = [data['seq'] for event, data in events if event == 'preview']
+    results = [data for event, data in events if event == 'analysis_result']
+
+    # 分析不再单独截图：截图次数等于发布的帧数
+    assert screen.grabs == stats['captured']
+    assert 2 <= stats['analyzed'] < stats['captured']
+    assert len(previews) == stats['previewed'] >= stats['analyzed']
+    assert results
+    for result in results:
+        assert result['frame_seq'] in previews
+        assert result['fen'] == result['frame_seq'] * 40 % 256
@@ -3,28 +3,36 @@ Web界面主程序
 提供实时棋盘分析和推荐走法展示
 """
 
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, session, redirect, url_for
 from flask_socketio import SocketIO, emit
 import threading
 import time
-import json
 import os
 import sys
-import re
 from pathlib import Path
 from datetime import datetime, timedelta
 import logging
-import cv2
-import numpy as np
-import base64
-from io import BytesIO
-from PIL import Image
+import zipfile
+import shutil
+import tempfile
 
 # 添加父目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.chess_analyzer import XiangqiAnalyzer, analyze_image_file
-from src.stream_processor import RTMPStreamProcessor, EmulatorCapture, create_screen_capture
+from src.lazy_import import lazy_import
+from src.chess_analyzer import XiangqiAnalyzer
+from src.stream_processor import EmulatorCapture, FrameSlot, create_screen_capture, create_stream_processor
+from src.stream_supervisor import StreamSupervisor
+from src.job_queue import JobQueue
+from src.result_cache import ResultCache, bytes_key, pixels_key
+from src.result_codec import IMAGE_FIELDS, ImageStore, dumps, result_summary, safe_float
+from src.preview import MJPEGSource, PreviewBroadcaster
+from src.subscriptions import LIVE_ROOM, Subscriptions, is_source_room, session_room, stream_room
+from src.metrics import CACHE_REQUESTS, CLIENTS, QUEUE_DEPTH, REGISTRY, STAGE_SECONDS, record_cache
+
+# 重量级依赖延迟导入，首次使用时才加载
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -42,10 +50,36 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 analyzer = None
 stream_processor = None
 emulator_capture = None
+screen_capture = None
 capture_thread = None
 analysis_thread = None
 running = False
 latest_result = None
+stream_supervisor = None  # 多路流调度器（/api/streams）
+job_queue = None  # 上传图片的分析任务队列（/api/upload）
+upload_cache = ResultCache()  # 上传图片的结果缓存（按内容哈希）
+image_store = ImageStore()  # 分析结果图像，按ID单独提供（/api/images）
+# 采集线程是唯一的取帧者，预览和分析都从这里读取同一批帧
+frame_slot = FrameSlot()
+pipeline_stats = {'captured': 0, 'previewed': 0, 'analyzed': 0}
+# 按客户端自适应的二进制预览推送
+preview_broadcaster = PreviewBroadcaster(
+    lambda sid, payload, callback: socketio.emit('preview', payload, to=sid, callback=callback)
+)
+# Socket.IO 客户端订阅的房间（信号源、会话），结果只发给订阅者
+subscriptions = Subscriptions()
+# MJPEG 预览：所有观看者共享同一份编码结果
+mjpeg_source = MJPEGSource(frame_slot)
+analyzer_lock = threading.Lock()
+analyzer_paths = None  # 当前分析器对应的路径配置
+analyzer_use_lock = threading.Lock()  # 实时分析与借用全局分析器的工作线程互斥使用
+analyzer_leased = False  # 全局分析器是否已借给任务队列或多路流调度器的工作线程
+# 后台预热状态: idle / warming / ready / failed
+warmup_state = {
+    'state': 'idle',
+    'error': None,
+    'elapsed': None
+}
 analysis_config = {
     'engine_path': '',
     'pose_model_path': '',
@@ -54,35 +88,31 @@ analysis_config = {
     'source_value': '',
     'think_time': 2000,
     'analysis_interval': 3,  # 秒
+    'preview_interval': 0.5,  # 预览推送间隔（秒）
+    'stream_backend': 'opencv',  # opencv, ffmpeg
+    'stream_size': None,  # ffmpeg后端的输出尺寸 [宽, 高]，为空保持原始分辨率
+    'stream_pool_size': 2,  # 多路流共享的分析器数量
+    'stream_process': False,  # 在独立进程中解码，帧经共享内存传回
+    'upload_workers': 1,  # 上传图片分析任务的工作线程（分析器）数量
+    'upload_max_jobs': 8,  # 排队加运行中的上传任务上限
+    'upload_cache_size': 128,  # 缓存的上传分析结果数（0 表示不缓存）
+    'batch_max_images': 200,  # 批量上传单批最多分析的图片数
+    'screen_auto_roi': True,  # 屏幕截图自动定位棋盘，之后只截取棋盘区域
+    'metrics_public': False,  # /metrics 不登录也可访问（供 Prometheus 抓取），默认需要登录
     'users': {}  # 用户管理
 }
 
-def safe_float(value, default=0.0):
-    """确保值是浮点数"""
-    if value is None:
-        return default
-    if isinstance(value, (int, float)):
-        return float(value)
-    if isinstance(value, str):
-        match = re.search(r'(\d+\.?\d*)', value)
-        return float(match.group(1)) if match else default
-    if isinstance(value, (list, tuple)) and len(value) == 1:  # 可能是单元素数组
-        return safe_float(value[0], default)
-    return default
-
-def make_json_serializable(obj):
-    """转换所有 numpy 类型为 JSON 可序列化"""
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()  # 转换为嵌套列表
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {k: make_json_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, (list, tuple)):
-        return [make_json_serializable(item) for item in obj]
-    return obj
+# 决定上传分析结果的配置项，改变时清空结果缓存
+UPLOAD_RESULT_INPUTS = ('engine_path', 'pose_model_path', 'classifier_model_path', 'think_time')
+# 批量上传的压缩包中按扩展名识别的图片
+BATCH_IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+# 批量上传时任务队列被其他请求占满，单张图片最多等待空位的时间（秒）
+BATCH_SUBMIT_TIMEOUT = 30.0
+# 压缩包的限制（按条目头中记录的解压后大小检查，解压时也不会超过该大小）：
+# 单张图片解压后的大小、所有图片解压后的总大小、条目数（含非图片文件）
+BATCH_MAX_IMAGE_BYTES = 20 * 1024 * 1024
+BATCH_MAX_ARCHIVE_BYTES = 512 * 1024 * 1024
+BATCH_MAX_ARCHIVE_MEMBERS = 1000
 
 # 用户管理
 class UserManager:
@@ -210,7 +240,16 @@ def get_status():
         'source_type': analysis_config['source_type'],
         'source_value': analysis_config['source_value'],
         'active_users': user_manager.get_active_user_count(),
-        'max_users': user_manager.max_users
+        'max_users': user_manager.max_users,
+        'readiness': warmup_state,
+        'stream': stream_processor.get_health() if stream_processor else None,
+        'pipeline': pipeline_stats,
+        'preview': preview_broadcaster.get_stats(),
+        'mjpeg': mjpeg_source.get_stats(),
+        'jobs': job_queue.get_stats() if job_queue else None,
+        'upload_cache': upload_cache.get_stats(),
+        'images': image_store.get_stats(),
+        'subscriptions': subscriptions.get_stats()
     })
 
 @app.route('/api/config', methods=['POST'])
@@ -222,6 +261,8 @@ def update_config():
     
     try:
         data = request.get_json()
+        result_inputs = [analysis_config.get(key) for key in UPLOAD_RESULT_INPUTS]
+        paths = _analyzer_paths()
         
         # 更新配置
         if 'engine_path' in data:
@@ -238,6 +279,36 @@ def update_config():
             analysis_config['think_time'] = int(data['think_time'])
         if 'analysis_interval' in data:
             analysis_config['analysis_interval'] = int(data['analysis_interval'])
+        if 'preview_interval' in data:
+            analysis_config['preview_interval'] = safe_float(data['preview_interval'], 0.5)
+        if 'stream_backend' in data:
+            analysis_config['stream_backend'] = data['stream_backend']
+        if 'stream_size' in data:
+            analysis_config['stream_size'] = data['stream_size']
+        if 'stream_process' in data:
+            analysis_config['stream_process'] = bool(data['stream_process'])
+        if 'screen_auto_roi' in data:
+            analysis_config['screen_auto_roi'] = bool(data['screen_auto_roi'])
+        if 'metrics_public' in data:
+            analysis_config['metrics_public'] = bool(data['metrics_public'])
+        if 'stream_pool_size' in data:
+            analysis_config['stream_pool_size'] = int(data['stream_pool_size'])
+        if 'upload_max_jobs' in data:
+            analysis_config['upload_max_jobs'] = int(data['upload_max_jobs'])
+            if job_queue:
+                job_queue.max_jobs = analysis_config['upload_max_jobs']
+        if 'upload_cache_size' in data:
+            analysis_config['upload_cache_size'] = int(data['upload_cache_size'])
+            upload_cache.max_entries = analysis_config['upload_cache_size']
+        
+        # 模型、引擎或思考时间改变后，缓存的结果不再对应当前配置
+        if result_inputs != [analysis_config.get(key) for key in UPLOAD_RESULT_INPUTS]:
+            upload_cache.clear()
+        # 模型或引擎路径改变后，工作线程的分析器按新配置重建
+        if paths != _analyzer_paths():
+            for pool in (job_queue, stream_supervisor):
+                if pool:
+                    pool.reset_analyzers()
         
         logger.info(f"配置已更新: {analysis_config}")
         return jsonify({'success': True, 'config': analysis_config})
@@ -249,7 +320,7 @@ def update_config():
 @app.route('/api/start', methods=['POST'])
 def start_analysis():
     """开始分析"""
-    global running, analyzer, capture_thread, analysis_thread
+    global running, capture_thread, analysis_thread
     
     session_id = session.get('session_id')
     if not session_id or not user_manager.is_logged_in(session_id):
@@ -263,12 +334,11 @@ def start_analysis():
         if not analysis_config['engine_path']:
             return jsonify({'error': '请先设置Pikafish引擎路径'}), 400
         
-        # 初始化分析器
-        analyzer = XiangqiAnalyzer(
-            engine_path=analysis_config['engine_path'],
-            pose_model_path=analysis_config.get('pose_model_path', ''),
-            classifier_model_path=analysis_config.get('classifier_model_path', '')
-        )
+        # 初始化分析器（预热完成且配置未变时直接复用）
+        ensure_analyzer()
+        analyzer.reset_frames()
+        frame_slot.clear()
+        pipeline_stats.update(captured=0, previewed=0, analyzed=0)
         
         running = True
         
@@ -308,13 +378,55 @@ def get_latest_result():
         return jsonify({'error': '未登录'}), 401
     
     if latest_result:
-        return jsonify(latest_result)
+        return json_response(result_summary(latest_result))
     else:
         return jsonify({'error': '暂无分析结果'}), 404
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus 指标（文本格式）：各阶段耗时直方图、引擎崩溃/重启、缓存命中率、队列深度、客户端数"""
+    if not analysis_config.get('metrics_public'):
+        session_id = session.get('session_id')
+        if not session_id or not user_manager.is_logged_in(session_id):
+            return jsonify({'error': '未登录'}), 401
+    
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def collect_metrics():
+    """把各对象自己维护的统计同步到指标（每次输出 /metrics 前调用）"""
+    stats = upload_cache.get_stats()
+    record_cache('upload', stats['hits'], stats['misses'])
+    record_cache('frame_result', CACHE_REQUESTS.get(cache='frame_result', result='hit'),
+                 CACHE_REQUESTS.get(cache='frame_result', result='miss'))
+    
+    jobs = job_queue.get_stats() if job_queue else {'queued': 0, 'running': 0}
+    QUEUE_DEPTH.set(jobs['queued'], queue='upload_jobs')
+    QUEUE_DEPTH.set(jobs['running'], queue='upload_jobs_running')
+    # 多路流：有新帧等待工作线程的流数、正在分析的流数（实时流水线的各级队列由 src/pipeline.py 同步）
+    streams = stream_supervisor.get_queue_depth() if stream_supervisor else {'pending': 0, 'running': 0}
+    QUEUE_DEPTH.set(streams['pending'], queue='stream_frames')
+    QUEUE_DEPTH.set(streams['running'], queue='stream_frames_running')
+    
+    CLIENTS.set(subscriptions.client_count(), kind='socketio')
+    CLIENTS.set(subscriptions.count(LIVE_ROOM), kind='live')
+    CLIENTS.set(mjpeg_source.viewers, kind='mjpeg')
+
+REGISTRY.add_collector(collect_metrics)
+
+@app.route('/api/preview.mjpg')
+def preview_mjpeg():
+    """MJPEG 实时预览（可直接用作 <img> 的 src），跟随采集线程的最新帧"""
+    session_id = session.get('session_id')
+    if not session_id or not user_manager.is_logged_in(session_id):
+        return jsonify({'error': '未登录'}), 401
+    
+    return Response(mjpeg_source.stream(lambda: running),
+                    mimetype=f'multipart/x-mixed-replace; boundary={mjpeg_source.boundary}',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/api/upload', methods=['POST'])
 def upload_image():
-    """上传图片进行分析"""
+    """上传图片进行分析：立即返回任务ID，分析在后台任务队列中进行"""
     session_id = session.get('session_id')
     if not session_id or not user_manager.is_logged_in(session_id):
         return jsonify({'error': '未登录'}), 401
@@ -327,43 +439,461 @@ def upload_image():
         if file.filename == '':
             return jsonify({'error': '未选择图片'}), 400
         
-        # 读取图片
-        image_data = file.read()
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
+        cached, image, keys = prepare_upload(file.read())
+        if cached is not None:
+            return json_response({'job_id': None, 'state': 'done', 'cached': True, 'result': cached})
         if image is None:
             return jsonify({'error': '无法读取图片'}), 400
         
-        # 分析图片
-        if not analyzer:
-            return jsonify({'error': '分析器未初始化'}), 500
+        # 提交任务；结果通过 job_result 事件推送给指定的连接（sid），未指定时推送给该会话的所有连接
+        queue = ensure_job_queue()
+        job = queue.submit({'image': image, 'keys': keys}, owner=session_sid(session_id) or session_room(session_id))
+        if job is None:
+            return jsonify({'error': '分析任务过多，请稍后再试', 'jobs': queue.get_stats()}), 429
         
-        result = analyzer.analyze_image(image, analysis_config['think_time'])
+        return json_response(queue.status(job), 202)
+            
+    except Exception as e:
+        logger.error(f"上传图片分析失败: {e}")
+        return jsonify({'error': str(e)}), 500
 
-        if result:
-            # 第一步：转换所有 numpy 类型
-            serializable_result = make_json_serializable(result)
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    批量上传分析：多张图片（image 字段可重复）或 zip 压缩包（archive 字段）
 
-            # 第二步：确保关键字段是数字（修复前端 toFixed 错误）
-            serializable_result['detect_time'] = safe_float(serializable_result.get('detect_time'), 0.0)
-            serializable_result['confidence'] = safe_float(serializable_result.get('confidence'), 0.0)
+    响应为 NDJSON 流，每张图片分析完成（按完成顺序）输出一行，最后一行为汇总；
+    带上 Socket.IO 的 sid 时，每张图片的结果同时以 batch_result 事件推送。
+    """
+    session_id = session.get('session_id')
+    if not session_id or not user_manager.is_logged_in(session_id):
+        return jsonify({'error': '未登录'}), 401
+    
+    files = [f for f in request.files.getlist('image') if f.filename]
+    archive = request.files.get('archive')
+    if not files and not (archive and archive.filename):
+        return jsonify({'error': '未上传图片'}), 400
+    
+    # 视图返回后上传的文件会被关闭，响应流还要继续读取：先转存到临时文件（在磁盘上，不占内存）
+    spooled = [spool_upload(f) for f in ([archive] if archive and archive.filename else files)]
+    if archive and archive.filename:
+        try:
+            items = iter_archive_images(spooled[0], analysis_config.get('batch_max_images', 200))
+        except zipfile.BadZipFile:
+            spooled[0].close()
+            return jsonify({'error': '无法读取压缩包'}), 400
+        except ValueError as e:
+            spooled[0].close()
+            return jsonify({'error': str(e)}), 400
+    else:
+        items = ((f.filename, temp.read) for f, temp in zip(files, spooled))
+    
+    sid = session_sid(session_id)
+    
+    def generate():
+        try:
+            yield from batch_results(items, ensure_job_queue(), sid)
+        finally:
+            for temp in spooled:
+                temp.close()
+    
+    return Response(generate(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache'})
 
-            # 第三步：转换图像为 base64（用原始 result 中的数组）
-            for img_key in ['original_with_keypoints', 'transformed_board']:
-                if img_key in result:
-                    _, buffer = cv2.imencode('.jpg', result[img_key])
-                    img_base64 = base64.b64encode(buffer).decode()
-                    serializable_result[img_key] = f"data:image/jpeg;base64,{img_base64}"
+def session_sid(session_id: str):
+    """
+    请求携带的 Socket.IO 连接ID（表单 sid 字段）
 
-            return jsonify(serializable_result)
-        else:
-            return jsonify({'error': '分析失败'}), 500
+    只接受属于当前会话的连接（连接时按服务端会话加入了会话房间），
+    不能把结果推送到其他会话的连接；不属于当前会话或未携带时返回 None
+    """
+    sid = request.form.get('sid')
+    if sid and session_room(session_id) in subscriptions.rooms_of(sid):
+        return sid
+    return None
+
+def spool_upload(file):
+    """把上传的文件转存到临时文件，返回已回到开头的文件对象"""
+    temp = tempfile.TemporaryFile()
+    shutil.copyfileobj(file.stream, temp)
+    temp.seek(0)
+    return temp
+
+def iter_archive_images(stream, max_images: int):
+    """
+    逐个列出 zip 压缩包中的图片
+
+    提交任务前先检查条目数、图片数和解压后的总大小，超过上限时拒绝整个压缩包；
+    单张图片解压后超过 BATCH_MAX_IMAGE_BYTES 时，读取函数抛出 ValueError（该张记为失败）。
+
+    Args:
+        stream: 压缩包文件对象
+        max_images: 图片数上限
+
+    Returns:
+        (文件名, 读取函数) 的迭代器；读取函数被调用时才解压该图片
+
+    Raises:
+        zipfile.BadZipFile: 不是有效的压缩包
+        ValueError: 超过条目数、图片数或总大小上限
+    """
+    archive = zipfile.ZipFile(stream)
+    infos = archive.infolist()
+    if len(infos) > BATCH_MAX_ARCHIVE_MEMBERS:
+        raise ValueError(f'压缩包条目超过 {BATCH_MAX_ARCHIVE_MEMBERS} 个的上限')
+    
+    members = [info for info in infos
+               if not info.is_dir() and Path(info.filename).suffix.lower() in BATCH_IMAGE_SUFFIXES]
+    if len(members) > max_images:
+        raise ValueError(f'压缩包中的图片超过单批 {max_images} 张的上限')
+    if sum(info.file_size for info in members) > BATCH_MAX_ARCHIVE_BYTES:
+        raise ValueError(f'压缩包中的图片解压后超过 {BATCH_MAX_ARCHIVE_BYTES // (1024 * 1024)} MB 的上限')
+    
+    def read(info):
+        if info.file_size > BATCH_MAX_IMAGE_BYTES:
+            raise ValueError(f'图片解压后超过 {BATCH_MAX_IMAGE_BYTES // (1024 * 1024)} MB 的上限')
+        return archive.read(info)
+    
+    return ((info.filename, lambda info=info: read(info)) for info in members)
+
+def batch_results(items, queue: JobQueue, sid=None):
+    """
+    批量分析的 NDJSON 行生成器
+
+    图片按需读取和解码，进行中的任务不超过工作线程数的两倍，内存中不会同时保留整批图片；
+    缓存命中和无法读取的图片立即输出，其余的在任务完成时按完成顺序输出。
+
+    Args:
+        items: (文件名, 读取函数) 的迭代器
+        queue: 上传任务队列
+        sid: Socket.IO 连接ID，不为空时同时推送 batch_result 事件
+    """
+    start = time.time()
+    max_images = analysis_config.get('batch_max_images', 200)
+    window = queue.workers * 2
+    pending = []
+    counts = {'total': 0, 'done': 0, 'failed': 0, 'cached': 0}
+    items = iter(items)
+    exhausted = False
+    
+    def line(record):
+        counts['done' if record['state'] == 'done' else 'failed'] += 1
+        if record.get('cached'):
+            counts['cached'] += 1
+        if sid:
+            socketio.emit('batch_result', record, to=sid)
+        return dumps(record) + b'\n'
+    
+    while not exhausted or pending:
+        # 补充任务直到窗口填满
+        while not exhausted and len(pending) < window:
+            try:
+                name, read = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            index = counts['total']
+            counts['total'] += 1
+            record = {'index': index, 'name': name}
+            if index >= max_images:
+                yield line({**record, 'state': 'failed', 'error': f'超过单批 {max_images} 张的上限'})
+                continue
+            
+            try:
+                data = read()
+            except ValueError as e:
+                yield line({**record, 'state': 'failed', 'error': str(e)})
+                continue
             
+            cached, image, keys = prepare_upload(data)
+            if cached is not None:
+                yield line({**record, 'state': 'done', 'cached': True, 'result': cached})
+                continue
+            if image is None:
+                yield line({**record, 'state': 'failed', 'error': '无法读取图片'})
+                continue
+            
+            job, error = submit_batch_job(queue, {'image': image, 'keys': keys})
+            if job is None:
+                yield line({**record, 'state': 'failed', 'error': error})
+                continue
+            pending.append((record, job))
+        
+        if not pending:
+            continue
+        # 等待最早的任务，同时输出其间完成的其他任务
+        pending[0][1].wait(0.05)
+        for entry in [entry for entry in pending if entry[1].finished]:
+            pending.remove(entry)
+            record, job = entry
+            status = queue.status(job)
+            status.pop('submitted_at', None)
+            yield line({**record, **status})
+    
+    yield dumps({'summary': True, **counts, 'elapsed': round(time.time() - start, 3)}) + b'\n'
+
+def submit_batch_job(queue: JobQueue, payload: dict, timeout: float = BATCH_SUBMIT_TIMEOUT):
+    """
+    提交批量上传中的一张图片
+
+    队列被其他请求占满时等待空位而不是拒绝整批，但最多等待 timeout 秒；队列停止时立即放弃。
+
+    Returns:
+        (任务, None) 或 (None, 错误信息)
+    """
+    deadline = time.time() + timeout
+    while True:
+        if queue.stopped:
+            return None, '任务队列已停止'
+        job = queue.submit(payload)
+        if job is not None:
+            return job, None
+        if time.time() >= deadline:
+            return None, f'任务队列已满，等待 {timeout:g} 秒后仍无空位'
+        time.sleep(0.1)
+
+def prepare_upload(image_data: bytes):
+    """
+    查找上传图片的缓存结果，未命中时解码
+
+    先用原始字节的哈希查找，命中时不必解码；再用解码后像素的哈希查找，
+    字节不同但像素相同（重新保存过的同一截图）也命中。
+
+    Returns:
+        (缓存的结果, 解码后的图像, 缓存键)；命中时图像为 None，无法解码时结果和图像都为 None
+    """
+    keys = [bytes_key(image_data)]
+    cached = upload_cache.lookup(keys, count_miss=False, valid=images_available)
+    if cached is not None:
+        return cached, None, keys
+    
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None, None, keys
+    
+    keys.insert(0, pixels_key(image))
+    cached = upload_cache.lookup(keys, valid=images_available)
+    return cached, image, keys
+
+def images_available(cached: dict) -> bool:
+    """缓存的响应引用的图像是否仍在 image_store 中（已被淘汰的结果不再可用，需要重新分析）"""
+    return not cached.get('image_id') or image_store.has(cached['image_id'])
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """查询上传任务：排队位置和预计完成时间，或分析结果"""
+    session_id = session.get('session_id')
+    if not session_id or not user_manager.is_logged_in(session_id):
+        return jsonify({'error': '未登录'}), 401
+    
+    job = job_queue.get(job_id) if job_queue else None
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    return json_response(job_queue.status(job))
+
+def upload_response(result: dict) -> dict:
+    """把分析结果转换为上传接口的响应：文本字段 + 图像地址（图像登记到 image_store，按需获取）"""
+    with STAGE_SECONDS.time(stage='serialize'):
+        response = result_summary(result)
+        image_id = image_store.add(result)
+    if image_id:
+        response['image_id'] = image_id
+        # 在任务队列的工作线程中调用，没有请求上下文，不能用 url_for
+        response['images'] = {name: f'/api/images/{image_id}/{name}'
+                              for name in IMAGE_FIELDS if result.get(name) is not None}
+    return response
+
+def json_response(data, status: int = 200) -> Response:
+    """用 result_codec 的快速编码器生成 JSON 响应"""
+    with STAGE_SECONDS.time(stage='serialize'):
+        body = dumps(data)
+    return Response(body, status=status, mimetype='application/json')
+
+@app.route('/api/images/<image_id>/<name>')
+def get_result_image(image_id, name):
+    """获取分析结果中的图像（JPEG），可用 width 参数指定宽度"""
+    session_id = session.get('session_id')
+    if not session_id or not user_manager.is_logged_in(session_id):
+        return jsonify({'error': '未登录'}), 401
+    
+    data = image_store.get(image_id, name, request.args.get('width', type=int))
+    if data is None:
+        return jsonify({'error': '图像不存在或已过期'}), 404
+    # 同一ID同一宽度的图像内容不会改变
+    return Response(data, mimetype='image/jpeg',
+                    headers={'Cache-Control': 'private, max-age=86400, immutable'})
+
+def run_upload_job(job_analyzer, payload):
+    """任务队列工作线程中分析一张上传的图片，结果（含已编码的图像）放入缓存"""
+    result = job_analyzer.analyze_image(payload['image'], analysis_config['think_time'])
+    if not result:
+        return None
+    response = upload_response(result)
+    upload_cache.put(payload['keys'], response)
+    return response
+
+def ensure_job_queue() -> JobQueue:
+    """创建（首次调用时）上传任务队列，每个工作线程有自己的分析器（见 lease_analyzer）"""
+    global job_queue
+    
+    if job_queue is None:
+        job_queue = JobQueue(
+            analyzer_factory=lease_analyzer,
+            handler=run_upload_job,
+            workers=analysis_config.get('upload_workers', 1),
+            max_jobs=analysis_config.get('upload_max_jobs', 8),
+            on_finish=emit_job_result,
+            initial_estimate=analysis_config['think_time'] / 1000 + 1
+        )
+    return job_queue
+
+def emit_job_result(job):
+    """任务结束时把结果推送给提交者"""
+    if job.owner:
+        socketio.emit('job_result', job_queue.status(job), to=job.owner)
+
+@app.route('/api/streams', methods=['GET'])
+def list_streams():
+    """多路流状态（每路的延迟和分析器池是否满负荷）"""
+    session_id = session.get('session_id')
+    if not session_id or not user_manager.is_logged_in(session_id):
+        return jsonify({'error': '未登录'}), 401
+    
+    if not stream_supervisor:
+        return jsonify({'pool_size': 0, 'streams': [], 'at_capacity': False})
+    return jsonify(stream_supervisor.get_status())
+
+@app.route('/api/streams', methods=['POST'])
+def add_stream():
+    """添加一路监控流: {"id": "table1", "url": "rtmp://..."}"""
+    session_id = session.get('session_id')
+    if not session_id or not user_manager.is_logged_in(session_id):
+        return jsonify({'error': '未登录'}), 401
+    
+    data = request.get_json() or {}
+    stream_id, url = data.get('id'), data.get('url')
+    if not stream_id or not url:
+        return jsonify({'error': '缺少 id 或 url'}), 400
+    
+    try:
+        if not ensure_supervisor().add_stream(stream_id, url):
+            return jsonify({'error': f'无法添加流 {stream_id}'}), 400
+        return jsonify({'success': True})
     except Exception as e:
-        logger.error(f"上传图片分析失败: {e}")
+        logger.error(f"添加流失败: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/streams/<stream_id>', methods=['DELETE'])
+def remove_stream(stream_id):
+    """移除一路监控流"""
+    session_id = session.get('session_id')
+    if not session_id or not user_manager.is_logged_in(session_id):
+        return jsonify({'error': '未登录'}), 401
+    
+    if not stream_supervisor or not stream_supervisor.remove_stream(stream_id):
+        return jsonify({'error': f'流不存在: {stream_id}'}), 404
+    return jsonify({'success': True})
+
+# 分析器管理
+def _analyzer_paths() -> tuple:
+    """当前配置对应的模型/引擎路径"""
+    return (
+        analysis_config['engine_path'],
+        analysis_config.get('pose_model_path', ''),
+        analysis_config.get('classifier_model_path', '')
+    )
+
+def ensure_analyzer():
+    """确保分析器已按当前配置创建，配置变化时重建"""
+    global analyzer, analyzer_paths
+    
+    with analyzer_lock:
+        paths = _analyzer_paths()
+        if analyzer is not None and analyzer_paths == paths:
+            return analyzer
+        
+        if analyzer is not None:
+            analyzer.quit()
+        
+        analyzer = XiangqiAnalyzer(
+            engine_path=paths[0],
+            pose_model_path=paths[1],
+            classifier_model_path=paths[2]
+        )
+        analyzer_paths = paths
+        return analyzer
+
+class SharedAnalyzer:
+    """
+    借用的全局分析器
+
+    已预热的全局分析器不必重新加载模型、启动引擎；借用方与实时分析循环通过 analyzer_use_lock
+    互斥使用。每次调用都经 ensure_analyzer 取当前分析器，配置变化重建后自动用上新的。
+    """
+    
+    def analyze_image(self, image, think_time: int = 2000):
+        with analyzer_use_lock:
+            return ensure_analyzer().analyze_image(image, think_time)
+    
+    def analyze_frame(self, frame, think_time: int = 2000, state=None):
+        with analyzer_use_lock:
+            return ensure_analyzer().analyze_frame(frame, think_time, state=state)
+    
+    def quit(self):
+        """归还借用（全局分析器继续供实时分析使用，不关闭）"""
+        global analyzer_leased
+        with analyzer_lock:
+            analyzer_leased = False
+
+def lease_analyzer():
+    """任务队列和多路流调度器工作线程的分析器工厂：全局分析器未被借用时借给第一个线程，其余线程按当前配置新建"""
+    global analyzer_leased
+    
+    with analyzer_lock:
+        if not analyzer_leased:
+            analyzer_leased = True
+            return SharedAnalyzer()
+    return XiangqiAnalyzer(*_analyzer_paths())
+
+def ensure_supervisor():
+    """创建（首次调用时）并启动多路流调度器，每个工作线程有自己的分析器（见 lease_analyzer）"""
+    global stream_supervisor
+    
+    if stream_supervisor is None:
+        stream_supervisor = StreamSupervisor(
+            analyzer_factory=lease_analyzer,
+            pool_size=analysis_config.get('stream_pool_size', 2),
+            analysis_interval=analysis_config['analysis_interval'],
+            think_time=analysis_config['think_time'],
+            on_result=emit_stream_result,
+            processor_factory=lambda url, **kwargs: open_stream(url, analysis_config['analysis_interval'])
+        )
+        stream_supervisor.start()
+    return stream_supervisor
+
+def emit_stream_result(stream_id: str, result: dict):
+    """把某一路流的分析结果推送给前端"""
+    emit_to_room('stream_result', stream_room(stream_id), lambda: {'stream_id': stream_id, **text_result(result)})
+
+def warm_up():
+    """后台预热线程：创建检测器、启动引擎并完成首次推理"""
+    warmup_state.update({'state': 'warming', 'error': None, 'elapsed': None})
+    start = time.time()
+    
+    try:
+        ensure_analyzer().warm_up()
+        warmup_state['state'] = 'ready'
+    except Exception as e:
+        logger.error(f"预热失败: {e}")
+        warmup_state.update({'state': 'failed', 'error': str(e)})
+    finally:
+        warmup_state['elapsed'] = round(time.time() - start, 3)
+
+def start_warmup():
+    """启动后台预热（不阻塞Web服务器）"""
+    if warmup_state['state'] == 'warming':
+        return
+    threading.Thread(target=warm_up, daemon=True, name='warmup').start()
+
 # SocketIO事件
 @socketio.on('connect')
 def handle_connect():
@@ -373,107 +903,177 @@ def handle_connect():
         return False  # 拒绝连接
     
     logger.info(f"客户端已连接: {request.sid}")
+    subscribe_client(request.sid, session_room(session_id))
+    # 连接地址的 subscribe 参数指定初始订阅（逗号分隔），默认订阅实时画面
+    for room in request.args.get('subscribe', LIVE_ROOM).split(','):
+        if is_source_room(room):
+            subscribe_client(request.sid, room)
     emit('status', {'running': running, 'config': analysis_config})
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    """处理客户端断开"""
+    """处理客户端断开（Socket.IO 自动离开房间，这里只清理订阅记录）"""
+    subscriptions.remove_client(request.sid)
+    preview_broadcaster.remove_client(request.sid)
     logger.info(f"客户端已断开: {request.sid}")
 
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """订阅信号源：{'room': 'live'} 或 {'room': 'stream:<流ID>'}，返回当前订阅的房间"""
+    room = (data or {}).get('room', '')
+    if not is_source_room(room):
+        return {'error': f'无效的房间: {room}'}
+    subscribe_client(request.sid, room)
+    return {'rooms': subscriptions.rooms_of(request.sid)}
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    """取消订阅信号源，返回当前订阅的房间"""
+    room = (data or {}).get('room', '')
+    if is_source_room(room) and subscriptions.unsubscribe(request.sid, room):
+        socketio.server.leave_room(request.sid, room, namespace='/')
+        if room == LIVE_ROOM:
+            preview_broadcaster.remove_client(request.sid)
+    return {'rooms': subscriptions.rooms_of(request.sid)}
+
+def subscribe_client(sid: str, room: str):
+    """把客户端加入 Socket.IO 房间并记录订阅；订阅实时画面的客户端同时接收自适应预览"""
+    if subscriptions.subscribe(sid, room):
+        socketio.server.enter_room(sid, room, namespace='/')
+        if room == LIVE_ROOM:
+            preview_broadcaster.add_client(sid)
+
+def emit_to_room(event: str, room: str, build) -> bool:
+    """
+    向房间的订阅者发送事件
+
+    房间没有订阅者时不调用 build，负载不会被构造和序列化；
+    有订阅者时负载只构造一次，Socket.IO 对房间广播只编码一次数据包。
+
+    Args:
+        event: 事件名
+        room: 房间名
+        build: 无参函数，返回负载
+
+    Returns:
+        是否发送
+    """
+    if not subscriptions.count(room):
+        return False
+    socketio.emit(event, build(), to=room)
+    return True
+
 # 后台线程
+def open_stream(url: str, interval: float):
+    """按配置的后端创建流处理器，每 interval 秒取一帧"""
+    separate_process = analysis_config.get('stream_process', False)
+    if analysis_config.get('stream_backend') == 'ffmpeg':
+        size = analysis_config.get('stream_size')
+        return create_stream_processor(url, backend='ffmpeg', separate_process=separate_process,
+                                       output_size=tuple(size) if size else None,
+                                       output_fps=1 / interval)
+    return create_stream_processor(url, separate_process=separate_process, sample_interval=interval)
+
+def capture_interval() -> float:
+    """采集间隔：满足预览和分析中更频繁的一方"""
+    return min(safe_float(analysis_config.get('preview_interval'), 0.5),
+               safe_float(analysis_config['analysis_interval'], 3))
+
+def grab_frame(last_stream_seq: int) -> tuple:
+    """
+    从当前数据源取一帧
+
+    Returns:
+        (帧, 采集时间, 流帧序号)；没有新帧时帧为 None
+    """
+    global stream_processor, emulator_capture, screen_capture
+    
+    if analysis_config['source_type'] == 'stream':
+        if not stream_processor or not stream_processor.is_running():
+            if analysis_config['source_value']:
+                # 只解码采集间隔需要的帧
+                stream_processor = open_stream(analysis_config['source_value'], capture_interval())
+                stream_processor.start()
+        
+        if stream_processor and stream_processor.is_running():
+            frame, seq, captured_at = stream_processor.get_latest()
+            if seq != last_stream_seq:
+                return frame, captured_at, seq
+        return None, 0.0, last_stream_seq
+    
+    captured_at = time.time()
+    frame = None
+    if analysis_config['source_type'] == 'emulator':
+        if not emulator_capture:
+            emulator_capture = EmulatorCapture(analysis_config.get('emulator_name', 'MuMu'))
+        frame = emulator_capture.capture()
+    
+    elif analysis_config['source_type'] == 'screen':
+        if not screen_capture:
+            screen_capture = create_screen_capture(analysis_config.get('screen_auto_roi', True))
+        frame = screen_capture.capture_window(region=analysis_config.get('screen_region'))
+    
+    return frame, captured_at, last_stream_seq
+
+def emit_preview(frame, seq: int):
+    """推送预览（二进制JPEG，按客户端链路自适应；画面未变化时不推送），seq 与分析结果的 frame_seq 对应"""
+    interval = safe_float(analysis_config.get('preview_interval'), 0.5)
+    if preview_broadcaster.publish(frame, seq, interval):
+        pipeline_stats['previewed'] += 1
+
 def capture_loop():
-    """捕获循环"""
-    global stream_processor, emulator_capture
+    """采集循环：唯一的取帧者，发布到 frame_slot，并按预览间隔推送预览"""
+    last_preview = 0.0
+    stream_seq = 0
     
     while running:
         try:
-            frame = None
-            
-            if analysis_config['source_type'] == 'stream':
-                if not stream_processor or not stream_processor.is_running():
-                    if analysis_config['source_value']:
-                        stream_processor = RTMPStreamProcessor(analysis_config['source_value'])
-                        stream_processor.start()
-                
-                if stream_processor and stream_processor.is_running():
-                    frame = stream_processor.get_latest_frame()
-            
-            elif analysis_config['source_type'] == 'emulator':
-                if not emulator_capture:
-                    emulator_capture = EmulatorCapture(analysis_config.get('emulator_name', 'MuMu'))
-                
-                frame = emulator_capture.capture()
-            
-            elif analysis_config['source_type'] == 'screen':
-                if 'screen_capture' not in globals():
-                    global screen_capture
-                    screen_capture = create_screen_capture()
-                
-                region = analysis_config.get('screen_region')
-                if region:
-                    frame = screen_capture.capture_window(region=region)
-                else:
-                    frame = screen_capture.capture_window()
+            frame, captured_at, stream_seq = grab_frame(stream_seq)
             
-            # 如果有新帧，可以通过socket发送给前端预览
             if frame is not None:
-                # 压缩并发送预览
-                small_frame = cv2.resize(frame, (320, 240))
-                _, buffer = cv2.imencode('.jpg', small_frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-                img_base64 = base64.b64encode(buffer).decode()
+                seq = frame_slot.publish(frame, captured_at)
+                pipeline_stats['captured'] += 1
                 
-                socketio.emit('preview', {
-                    'image': f"data:image/jpeg;base64,{img_base64}",
-                    'timestamp': datetime.now().isoformat()
-                })
+                now = time.time()
+                if now - last_preview >= safe_float(analysis_config.get('preview_interval'), 0.5):
+                    last_preview = now
+                    emit_preview(frame, seq)
             
-            time.sleep(0.5)  # 控制捕获频率
+            time.sleep(capture_interval())
             
         except Exception as e:
             logger.error(f"捕获循环出错: {e}")
             time.sleep(1)
 
+def text_result(result: dict) -> dict:
+    """转换为可通过Socket发送的格式：只保留文本信息，不含图像数据"""
+    with STAGE_SECONDS.time(stage='serialize'):
+        return result_summary(result)
+
 def analysis_loop():
-    """分析循环"""
+    """分析循环：从采集线程发布的帧中取最新一帧分析，不单独取帧"""
     global latest_result
     
+    seq = frame_slot.latest()[1]
     while running:
         try:
-            # 获取最新帧
-            frame = None
-            
-            if analysis_config['source_type'] == 'stream' and stream_processor:
-                frame = stream_processor.get_latest_frame()
-            elif analysis_config['source_type'] == 'emulator' and emulator_capture:
-                frame = emulator_capture.capture()
-            elif analysis_config['source_type'] == 'screen':
-                global screen_capture
-                if 'screen_capture' in globals():
-                    region = analysis_config.get('screen_region')
-                    frame = screen_capture.capture_window(region=region)
+            # 等待采集线程发布新帧（带超时，以便及时响应停止）
+            frame, seq, captured_at = frame_slot.wait_newer(seq, timeout=1.0)
             
             # 分析帧
             if frame is not None and analyzer:
-                result = analyzer.analyze_image(frame, analysis_config['think_time'])
+                with analyzer_use_lock:
+                    result = analyzer.analyze_frame(frame, analysis_config['think_time'])
+                pipeline_stats['analyzed'] += 1
                 
                 if result:
-                    latest_result = result
-                    
-                    # 转换为可序列化格式并通过Socket发送
-                    serializable_result = result.copy()
-                    
-                    # 移除图像数据，只发送文本信息
-                    serializable_result.pop('original_with_keypoints', None)
-                    serializable_result.pop('transformed_board', None)
-                    
-                    # 转换numpy类型
-                    serializable_result['detect_time'] = float(serializable_result['detect_time'])
-                    serializable_result['confidence'] = float(serializable_result['confidence'])
-                    
-                    socketio.emit('analysis_result', serializable_result)
-            
-            # 等待下一个分析周期
-            time.sleep(analysis_config['analysis_interval'])
+                    # 记录采集到出结果的延迟，frame_seq 与预览的 seq 对应
+                    latest_result = dict(result, frame_seq=seq,
+                                         capture_latency=round(time.time() - captured_at, 3))
+                    emit_to_room('analysis_result', LIVE_ROOM, lambda: text_result(latest_result))
+                
+                # 等待下一个分析周期
+                time.sleep(analysis_config['analysis_interval'])
             
         except Exception as e:
             logger.error(f"分析循环出错: {e}")
@@ -507,14 +1107,20 @@ def init_app():
     submodule_root = project_root / "Chinese_Chess_Recognition"
     core_init = submodule_root / "core" / "__init__.py"
 
-    # 确保 __init__.py 存在
-    if not (submodule_root / "__init__.py").exists():
-        (submodule_root / "__init__.py").touch()
-        logger.info("✅ 已创建 Chinese_Chess_Recognition/__init__.py")
+    # 确保 __init__.py 存在（子模块未检出时交给后台预热报告失败，不阻塞启动）
+    if not core_init.parent.exists():
+        logger.warning("Chinese_Chess_Recognition 子模块未检出，请执行 git submodule update --init")
+    else:
+        if not (submodule_root / "__init__.py").exists():
+            (submodule_root / "__init__.py").touch()
+            logger.info("✅ 已创建 Chinese_Chess_Recognition/__init__.py")
+
+        if not core_init.exists():
+            core_init.touch()
+            logger.info("✅ 已创建 Chinese_Chess_Recognition/core/__init__.py")
 
-    if not core_init.exists():
-        core_init.touch()
-        logger.info("✅ 已创建 Chinese_Chess_Recognition/core/__init__.py")
+    # 后台预热检测器和引擎，Web服务器无需等待
+    start_warmup()
 
     logger.info("应用初始化完成")
     logger.info("默认用户:")